@@ -13,6 +13,7 @@ python manage.py collectstatic --noinput
 
 # Run migrations
 python manage.py migrate
+python manage.py createcachetable
 
 # Load fixtures (to maintain data!)
 #python manage.py loaddata initial_data.json || true
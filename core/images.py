@@ -0,0 +1,236 @@
+"""
+responsive image variants.
+
+the uploaded images listed in IMAGE_VARIANT_FIELDS (profile pictures, lesson infographics,
+badge icons) also get smaller WebP and JPEG copies at a few fixed widths, never wider than
+the original, with the EXIF orientation applied and the metadata dropped. a variant is named
+after the sha256 of the source bytes, so the same image uploaded twice is encoded once and
+the urls never change content (they can be cached forever).
+
+the variants are listed in a JSON field next to the image (<field>_variants) together with
+the name of the file they were made from. a new upload makes them stale at once, the
+serializers then list none until the new ones are stored. they are made after the upload is
+committed on a small thread pool (IMAGE_VARIANT_WORKERS, 0 = right away, in the request) and
+the generate_image_variants command backfills existing media on a process pool.
+"""
+import hashlib
+import io
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import Signal
+from PIL import ExifTags, Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_VERSION = 1
+VARIANT_DIR = 'variants'
+BACKFILL_BATCH_SIZE = 200
+
+# format -> (extension, Image.save options)
+FORMATS = {
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True}),
+}
+
+# 'app_label.Model' -> {image field: widths}
+IMAGE_FIELDS = getattr(settings, 'IMAGE_VARIANT_FIELDS', {})
+WORKERS = getattr(settings, 'IMAGE_VARIANT_WORKERS', 2)
+
+# sent by store_variants with the model as sender, pk= and field=, once new variants are listed
+variants_stored = Signal()
+
+
+def variants_field(field):
+    return f'{field}_variants'
+
+
+def is_current(stored, name):
+    return bool(stored) and stored.get('source') == name and stored.get('version') == VARIANT_VERSION
+
+
+def variants(instance, field):
+    """[{'format', 'width', 'height', 'url'}] of the image currently in the field, [] if there are none (yet)"""
+    image = getattr(instance, field)
+    stored = getattr(instance, variants_field(field))
+    if not image or not is_current(stored, image.name):
+        return []
+    return [
+        {'format': variant['format'], 'width': variant['width'], 'height': variant['height'],
+         'url': image.storage.url(variant['name'])}
+        for variant in stored['variants']
+    ]
+
+
+# encoding
+
+def _upright_size(image):
+    size = image.size
+    return size[::-1] if image.getexif().get(ExifTags.Base.Orientation) in (5, 6, 7, 8) else size
+
+
+def _decode(image, largest):
+    """the image upright, in RGB or RGBA, decoded at a reduced scale when that is still big enough"""
+    width, _ = _upright_size(image)
+    scale = largest / width
+    # jpegs are decoded at 1/2, 1/4 or 1/8 scale if the result is at least the requested size
+    image.draft('RGB', (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+    image = ImageOps.exif_transpose(image)
+    alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if alpha else 'RGB')
+
+
+def _flatten(image):
+    if image.mode == 'RGB':
+        return image
+    background = Image.new('RGB', image.size, 'white')
+    background.paste(image, mask=image.getchannel('A'))
+    return background
+
+
+def generate_variants(storage, name, widths):
+    """
+    encodes the variants of one stored image, the ones already in storage are not made again.
+    returns [{'format', 'width', 'height', 'name'}], [] if the file can't be read as an image
+    """
+    try:
+        with storage.open(name, 'rb') as source:
+            data = source.read()
+        digest = hashlib.sha256(b'%d:' % VARIANT_VERSION + data).hexdigest()[:32]
+        # only the header is read here, the pixels are decoded if a variant is missing
+        image = Image.open(io.BytesIO(data))
+        upright = _upright_size(image)
+        sizes = sorted(width for width in widths if width < upright[0]) or [upright[0]]
+        made = [
+            {'format': kind, 'width': width, 'height': max(1, round(upright[1] * width / upright[0])),
+             'name': f'{VARIANT_DIR}/{digest[:2]}/{digest}-{width}w.{extension}'}
+            for width in sizes for kind, (extension, _) in FORMATS.items()
+        ]
+        missing = [variant for variant in made if not storage.exists(variant['name'])]
+        if missing:
+            image = _decode(image, max(variant['width'] for variant in missing))
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        logger.warning("no variants for %s: %s", name, error)
+        return []
+
+    resized = {}
+    for variant in missing:
+        size = (variant['width'], variant['height'])
+        if size not in resized:
+            resized[size] = image.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        buffer = io.BytesIO()
+        (_flatten(resized[size]) if variant['format'] == 'jpeg' else resized[size]).save(
+            buffer, **FORMATS[variant['format']][1]
+        )
+        variant['name'] = storage.save(variant['name'], ContentFile(buffer.getvalue()))
+    return made
+
+
+def _generate(label, field, name):
+    """pool task...everything but the database"""
+    storage = apps.get_model(label)._meta.get_field(field).storage
+    return generate_variants(storage, name, IMAGE_FIELDS[label][field])
+
+
+def store_variants(label, pk, field, name, made):
+    """lists the variants on the row, unless its image was replaced meanwhile. True if it was updated"""
+    model = apps.get_model(label)
+    stored = {'source': name, 'version': VARIANT_VERSION, 'variants': made}
+    if not model.objects.filter(pk=pk, **{field: name}).update(**{variants_field(field): stored}):
+        return False
+    variants_stored.send(sender=model, pk=pk, field=field)
+    return True
+
+
+# after an upload
+
+_executor = None
+
+
+def _process(label, pk, field, name):
+    try:
+        store_variants(label, pk, field, name, _generate(label, field, name))
+    except Exception:
+        logger.exception("could not make the variants of %s", name)
+    finally:
+        if WORKERS > 0:
+            # the pool thread has its own connection, don't leave it open between uploads
+            connection.close()
+
+
+def _submit(label, pk, field, name):
+    global _executor
+    if WORKERS <= 0:
+        _process(label, pk, field, name)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='image variants')
+    _executor.submit(_process, label, pk, field, name)
+
+
+def schedule_variants(sender, instance, **kwargs):
+    """post_save of the models in IMAGE_VARIANT_FIELDS"""
+    label = sender._meta.label
+    for field in IMAGE_FIELDS[label]:
+        name = getattr(instance, field).name
+        if name and not is_current(getattr(instance, variants_field(field)), name):
+            transaction.on_commit(
+                lambda field=field, name=name: _submit(label, instance.pk, field, name), robust=True
+            )
+
+
+def connect_signals():
+    for label in IMAGE_FIELDS:
+        post_save.connect(schedule_variants, sender=label, dispatch_uid=f'image variants {label}')
+
+
+# backfill
+
+def _stale(label, field, batch_size):
+    """(pk, image name) of the rows whose variants are missing or out of date, paged on the pk"""
+    rows = (
+        apps.get_model(label).objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        .order_by('pk').values_list('pk', field, variants_field(field))
+    )
+    last = None
+    while True:
+        page = list((rows if last is None else rows.filter(pk__gt=last))[:batch_size])
+        if not page:
+            return
+        last = page[-1][0]
+        stale = [(pk, name) for pk, name, stored in page if not is_current(stored, name)]
+        if stale:
+            yield stale
+
+
+def backfill(labels=None, workers=None, batch_size=BACKFILL_BATCH_SIZE):
+    """
+    makes the missing or out of date variants of every image, the encoding on `workers`
+    processes (1 = in process). returns {'app_label.Model.field': images processed}
+    """
+    counts = {}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        for label, fields in IMAGE_FIELDS.items():
+            if labels and label not in labels:
+                continue
+            for field in fields:
+                processed = 0
+                for batch in _stale(label, field, batch_size):
+                    names = [name for _, name in batch]
+                    args = ([label] * len(batch), [field] * len(batch), names)
+                    results = pool.map(_generate, *args) if pool else map(_generate, *args)
+                    for (pk, name), made in zip(batch, results):
+                        processed += store_variants(label, pk, field, name, made)
+                counts[f'{label}.{field}'] = processed
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return counts
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_auto_20250908_0650'),
+        ('kyl', '0006_governors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='county',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='kyl.county'),
+        ),
+    ]
@@ -10,6 +10,9 @@ class User(AbstractUser):
     """
     email = models.EmailField(unique=True)
     profile_picture = models.ImageField(upload_to='profiles/', blank=True, null=True)
+    # resized copies of the picture, made after upload (core/images.py)
+    profile_picture_variants = models.JSONField(default=dict, blank=True, editable=False)
+    county = models.ForeignKey('kyl.County', null=True, blank=True, on_delete=models.SET_NULL, related_name='users')
     
 
     REQUIRED_FIELDS = ['username'] 
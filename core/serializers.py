@@ -2,6 +2,8 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 
+from . import images
+
 User = get_user_model()
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -26,13 +28,32 @@ class RegisterSerializer(serializers.ModelSerializer):
         user.save()
         return user
 
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """the resized copies of an image field, [{'format', 'width', 'height', 'url'}]...absolute urls with a request"""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        found = images.variants(instance, self.image_field)
+        if request is not None:
+            found = [{**variant, 'url': request.build_absolute_uri(variant['url'])} for variant in found]
+        return found
+
+
 class ProfileSerializer(serializers.ModelSerializer):
+    profile_picture_variants = ImageVariantsField('profile_picture')
+
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'profile_picture')
+        fields = ('id', 'username', 'email', 'profile_picture', 'profile_picture_variants', 'county')
         read_only_fields = ('id', 'username', 'email')
 
     def update(self, instance, validated_data):
         instance.profile_picture = validated_data.get('profile_picture', instance.profile_picture)
+        instance.county = validated_data.get('county', instance.county)
         instance.save()
         return instance
\ No newline at end of file
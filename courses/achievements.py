@@ -0,0 +1,106 @@
+"""
+per-user achievement summary.
+
+UserAchievementSummary holds the dashboard totals. writes shift them with F() updates in the
+same transaction as the change (bump_summary); a user without a row gets one computed from
+scratch the first time it is needed, and rebuild_summaries() recomputes rows in bulk.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import (
+    LessonProgress, ModuleProgress, CourseEnrollment, DailyActivity, PointsLedgerEntry, UserAchievementSummary,
+)
+
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def streak_from_days(days):
+    """(current_streak, last_active_date) from a user's active days, newest first"""
+    days = iter(days)
+    last = next(days, None)
+    if last is None:
+        return 0, None
+    streak, expected = 1, last - timedelta(days=1)
+    for day in days:
+        if day != expected:
+            break
+        streak += 1
+        expected -= timedelta(days=1)
+    return streak, last
+
+
+def compute_summaries(user_ids):
+    """{user_id: {field: value}} recounted from the source tables with one grouped query per field"""
+    totals = {
+        user_id: {**dict.fromkeys(UserAchievementSummary.COUNTER_FIELDS, 0), 'current_streak': 0, 'last_active_date': None}
+        for user_id in user_ids
+    }
+
+    def fill(field, rows):
+        for user_id, value in rows:
+            totals[user_id][field] = value or 0
+
+    # the points ledger is the history of every point change, its sum is the total (points.py)
+    fill('total_points', PointsLedgerEntry.objects.filter(user_id__in=user_ids)
+         .values('user_id').annotate(n=Sum('delta')).values_list('user_id', 'n'))
+    fill('lessons_completed', LessonProgress.objects.filter(user_id__in=user_ids, completed=True)
+         .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n'))
+    fill('modules_completed', ModuleProgress.objects.filter(user_id__in=user_ids, completed=True)
+         .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n'))
+    fill('courses_enrolled', CourseEnrollment.objects.filter(user_id__in=user_ids, active=True)
+         .values('user_id').annotate(n=Count('id')).values_list('user_id', 'n'))
+
+    days_by_user = {}
+    for user_id, day in DailyActivity.objects.filter(user_id__in=user_ids).order_by('user_id', '-date') \
+            .values_list('user_id', 'date').iterator():
+        days_by_user.setdefault(user_id, []).append(day)
+    for user_id, days in days_by_user.items():
+        totals[user_id]['current_streak'], totals[user_id]['last_active_date'] = streak_from_days(days)
+    return totals
+
+
+def get_summary(user_id):
+    summary = UserAchievementSummary.objects.filter(user_id=user_id).first()
+    if summary is not None:
+        return summary
+    try:
+        with transaction.atomic():
+            return UserAchievementSummary.objects.create(user_id=user_id, **compute_summaries([user_id])[user_id])
+    except IntegrityError:
+        # someone else built it in the meantime
+        return UserAchievementSummary.objects.get(user_id=user_id)
+
+
+def bump_summary(user_id, **deltas):
+    """shifts the user's totals, e.g. bump_summary(user.id, total_points=3, lessons_completed=1)"""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if not changes:
+        return
+    if not UserAchievementSummary.objects.filter(user_id=user_id).update(**changes):
+        # no row yet...building it now counts the change that triggered this call already
+        get_summary(user_id)
+
+
+def rebuild_summaries(user_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """recomputes summaries for the given users (default: every user with a summary or any progress)"""
+    if user_ids is None:
+        user_ids = set(UserAchievementSummary.objects.values_list('user_id', flat=True))
+        user_ids |= set(LessonProgress.objects.values_list('user_id', flat=True).distinct())
+        user_ids |= set(CourseEnrollment.objects.values_list('user_id', flat=True).distinct())
+        user_ids |= set(DailyActivity.objects.values_list('user_id', flat=True).distinct())
+    user_ids = sorted(user_ids)
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        totals = compute_summaries(batch)
+        UserAchievementSummary.objects.bulk_create(
+            [UserAchievementSummary(user_id=user_id, **fields) for user_id, fields in totals.items()],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[*UserAchievementSummary.COUNTER_FIELDS, *UserAchievementSummary.STREAK_FIELDS, 'updated_at'],
+        )
+    return len(user_ids)
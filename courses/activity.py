@@ -0,0 +1,225 @@
+"""
+learning activity recording and rollups.
+
+views call record_activity(), which only appends the event to an in-process buffer. the
+buffer is written with one bulk_create when it reaches ACTIVITY_BUFFER_SIZE events or is
+older than ACTIVITY_FLUSH_INTERVAL seconds (a daemon thread takes care of idle workers), and
+once more when the worker exits. a caller that finds the buffer full flushes it itself, so a
+slow database slows the producers down instead of growing the buffer without bound.
+
+every event is counted into DailyActivity (one row per user per day) and advances the user's
+current streak stored on UserAchievementSummary. apply_daily_activity() takes the counts of a
+whole batch of events at once.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.timezone import localdate
+
+from .achievements import get_summary, rebuild_summaries
+from .models import DailyActivity, LearningActivity, UserAchievementSummary
+
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK_SIZE = 500
+
+
+def _count_day(user_id, day, count):
+    if DailyActivity.objects.filter(user_id=user_id, date=day).update(activity_count=F('activity_count') + count):
+        return
+    try:
+        with transaction.atomic():
+            DailyActivity.objects.create(user_id=user_id, date=day, activity_count=count)
+    except IntegrityError:
+        DailyActivity.objects.filter(user_id=user_id, date=day).update(activity_count=F('activity_count') + count)
+
+
+def _advance_streak(user_id, days):
+    get_summary(user_id)
+    summary = UserAchievementSummary.objects.select_for_update().only(
+        'id', 'current_streak', 'last_active_date'
+    ).get(user_id=user_id)
+    streak, last = summary.current_streak, summary.last_active_date
+    for day in sorted(days):
+        if last is not None and day <= last:
+            # same day, or a late event for an older day (the backfill deals with those)
+            continue
+        streak = streak + 1 if last == day - timedelta(days=1) else 1
+        last = day
+    if (streak, last) != (summary.current_streak, summary.last_active_date):
+        UserAchievementSummary.objects.filter(pk=summary.pk).update(current_streak=streak, last_active_date=last)
+
+
+def apply_daily_activity(counts):
+    """counts is {(user_id, date): number of events}"""
+    days_by_user = defaultdict(set)
+    with transaction.atomic():
+        for (user_id, day), count in counts.items():
+            _count_day(user_id, day, count)
+            days_by_user[user_id].add(day)
+        for user_id, days in days_by_user.items():
+            _advance_streak(user_id, days)
+
+
+def record_daily_activity(activity):
+    apply_daily_activity({(activity.user_id, localdate(activity.timestamp)): 1})
+
+
+def activity_calendar(user_id, start, end):
+    """[{'date', 'activity_count'}] for the user's active days in [start, end]"""
+    return list(
+        DailyActivity.objects.filter(user_id=user_id, date__range=(start, end))
+        .order_by('date').values('date', 'activity_count')
+    )
+
+
+def backfill_daily_activity(user_ids=None, chunk_size=BACKFILL_CHUNK_SIZE):
+    """
+    rebuilds DailyActivity and the streaks from LearningActivity, chunk_size users at a time
+    (one grouped query per chunk). only the days still covered by the live table are replaced.
+    returns (users, days) processed
+    """
+    if user_ids is None:
+        user_ids = LearningActivity.objects.values_list('user_id', flat=True).distinct()
+    user_ids = sorted(set(user_ids))
+    total_days = 0
+
+    # days before the oldest live event were archived (retention.py)...their rollup rows stay
+    oldest = LearningActivity.objects.aggregate(oldest=Min('timestamp'))['oldest']
+    if oldest is None:
+        return len(user_ids), 0
+    since = localdate(oldest)
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        rows = (
+            LearningActivity.objects.filter(user_id__in=chunk)
+            .annotate(day=TruncDate('timestamp')).values('user_id', 'day')
+            .annotate(n=Count('id')).order_by('user_id', 'day')
+        )
+        days = [DailyActivity(user_id=row['user_id'], date=row['day'], activity_count=row['n']) for row in rows]
+
+        with transaction.atomic():
+            DailyActivity.objects.filter(user_id__in=chunk, date__gte=since).delete()
+            DailyActivity.objects.bulk_create(days, batch_size=1000)
+            # recomputes the streaks (and the other totals) of the chunk from the fresh rows
+            rebuild_summaries(chunk)
+        total_days += len(days)
+
+    return len(user_ids), total_days
+
+
+def write_activities(activities):
+    """inserts a batch of unsaved LearningActivity rows and rolls them up, in one transaction"""
+    if not activities:
+        return
+    counts = defaultdict(int)
+    for activity in activities:
+        counts[(activity.user_id, localdate(activity.timestamp))] += 1
+    with transaction.atomic():
+        # bulk_create sends no post_save, so the rollup is applied here for the whole batch
+        LearningActivity.objects.bulk_create(activities, batch_size=500)
+        apply_daily_activity(counts)
+
+
+class ActivityBuffer:
+    """
+    in-process buffer of rows written in batches by write (LearningActivity rows by default).
+    thread safe; rows that fail to write are
+    kept for the next flush until max_pending is reached, after which the oldest are dropped
+    """
+
+    def __init__(self, size, interval, max_pending=None, write=None, label='learning activity event'):
+        self.size = size
+        self.interval = interval
+        self.max_pending = max_pending or size * 10
+        self.write = write or write_activities
+        self.label = label
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, activity):
+        with self._lock:
+            self._events.append(activity)
+            full = len(self._events) >= self.size
+            self._start_timer()
+        if full:
+            # backpressure...the producer that fills the buffer pays for the write
+            self.flush()
+
+    def flush(self):
+        """writes everything buffered so far. returns the number of rows written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._events = self._events, []
+                self._last_flush = time.monotonic()
+            if not batch:
+                return 0
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception("could not write %d %s(s)", len(batch), self.label)
+                with self._lock:
+                    self._events[:0] = batch
+                    dropped = len(self._events) - self.max_pending
+                    if dropped > 0:
+                        del self._events[:dropped]
+                        logger.error("dropped %d %s(s), the buffer is full", dropped, self.label)
+                return 0
+            return len(batch)
+
+    def _start_timer(self):
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Thread(target=self._run_timer, name=f'{self.label} buffer', daemon=True)
+            self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(self.interval)
+            if time.monotonic() - self._last_flush >= self.interval and self._events:
+                self.flush()
+                # the thread has its own connection, don't leave it open between flushes
+                connection.close()
+
+
+activity_buffer = ActivityBuffer(
+    size=getattr(settings, 'ACTIVITY_BUFFER_SIZE', 200),
+    interval=getattr(settings, 'ACTIVITY_FLUSH_INTERVAL', 5),
+    max_pending=getattr(settings, 'ACTIVITY_BUFFER_MAX_PENDING', None),
+)
+atexit.register(activity_buffer.flush)
+
+
+def record_activity(user, action, lesson=None, metadata=None):
+    """
+    records a LearningActivity event, e.g. record_activity(request.user, 'view_lesson', lesson).
+    with ACTIVITY_BUFFER_SIZE <= 1 the row is written right away
+    """
+    activity = LearningActivity(
+        user_id=getattr(user, 'pk', user),
+        action=action,
+        lesson_id=getattr(lesson, 'pk', lesson),
+        timestamp=timezone.now(),
+        metadata=metadata,
+    )
+    if activity_buffer.size <= 1:
+        write_activities([activity])
+    else:
+        activity_buffer.add(activity)
+    return activity
@@ -1,4 +1,4 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from .models import (
     Course,
     CourseEnrollment,
@@ -7,14 +7,18 @@ from .models import (
     ModuleProgress,
     Lesson,
     LearningActivity,
+    QuizAttempt,
     LessonProgress,
     Role,
     LessonResource,
     Badge,
     UserBadge,
     Question,
-    Answer
+    Answer,
+    PointsLedgerEntry,
+    PlatformDailyStats,
 )
+from .exports import progress_response
 # Register your models here.
 
 @admin.register(Course)
@@ -30,17 +34,86 @@ admin.site.register(CourseProgress)
 admin.site.register(Module)
 admin.site.register(ModuleProgress)
 
-admin.site.register(Lesson)
+@admin.register(Lesson)
+class LessonAdmin(admin.ModelAdmin):
+    actions = ['regrade']
+
+    @admin.action(description="Regrade stored quiz attempts against the current answers")
+    def regrade(self, request, queryset):
+        # a regrade goes through every stored attempt of the lesson, far too long for an admin
+        # request...it's left to the command, which prints the same report
+        lesson_ids = sorted(queryset.values_list('pk', flat=True))
+        attempts = QuizAttempt.objects.filter(lesson_id__in=lesson_ids).count()
+        self.message_user(
+            request,
+            f"{len(lesson_ids)} lesson(s) with {attempts} stored attempt(s) selected. Regrade them with: "
+            f"python manage.py regrade_lesson {' '.join(map(str, lesson_ids))}",
+            messages.INFO,
+        )
+
 admin.site.register(LearningActivity)
-admin.site.register(LessonProgress)
+
+
+@admin.register(LessonProgress)
+class LessonProgressAdmin(admin.ModelAdmin):
+    list_display = ('user', 'lesson', 'completed', 'score', 'attempts', 'date_completed')
+    list_filter = ('completed',)
+    list_select_related = ('user', 'lesson__module__course')
+    raw_id_fields = ('user', 'lesson')
+    actions = ['export_csv']
+
+    @admin.action(description="Export selected progress as CSV")
+    def export_csv(self, request, queryset):
+        # streamed straight from the database, see exports.py
+        return progress_response('csv', 'lesson-progress', queryset=queryset)
+
 admin.site.register(LessonResource)
 
 @admin.register(Role)
 class RoleAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name', 'description')
+    raw_id_fields = ('members',)
 
 admin.site.register(Badge)
 admin.site.register(UserBadge)
 admin.site.register(Question)
-admin.site.register(Answer)
\ No newline at end of file
+admin.site.register(Answer)
+
+
+@admin.register(PointsLedgerEntry)
+class PointsLedgerEntryAdmin(admin.ModelAdmin):
+    """the ledger is append-only, the admin only shows it"""
+    list_display = ('user', 'lesson', 'delta', 'reason', 'timestamp')
+    list_filter = ('reason',)
+    search_fields = ('user__email', 'user__username')
+    raw_id_fields = ('user', 'lesson')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+
+@admin.register(PlatformDailyStats)
+class PlatformDailyStatsAdmin(admin.ModelAdmin):
+    """filled by the rollup_platform_stats command, read only here"""
+    list_display = (
+        'date', 'enrollments', 'lesson_completions', 'course_completions', 'active_users',
+        'quiz_attempts', 'quiz_passes', 'pass_rate', 'computed_at',
+    )
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
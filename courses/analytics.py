@@ -0,0 +1,243 @@
+"""
+quiz item analysis.
+
+the stored attempts (QuizAttempt) of a lesson, module or course are pulled as plain tuples and
+their selections flattened into NumPy arrays once; everything after that is array work per
+lesson, graded against the current answer key:
+
+- difficulty: the p-value, share of attempts that got the question right
+- discrimination: point-biserial correlation between getting the question right and the score
+  on the rest of the quiz (the question itself left out, so it doesn't correlate with itself)
+- selection rate of every answer, i.e. how attractive each distractor is
+- attempts to pass: per user, which attempt was the first passing one (or never)
+"""
+import csv
+import json
+from collections import defaultdict
+
+import numpy as np
+from django.db.models import TextField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import Answer, Lesson, Question, QuizAttempt
+
+
+ANALYTICS_CHUNK_SIZE = 5000
+
+CSV_COLUMNS = [
+    'lesson_id', 'question_id', 'question', 'attempts', 'difficulty', 'discrimination',
+    'answer_id', 'answer', 'is_correct', 'selection_rate',
+]
+
+
+def lessons_in_scope(lesson_id=None, module_id=None, course_id=None):
+    lessons = Lesson.objects.all()
+    if lesson_id is not None:
+        lessons = lessons.filter(pk=lesson_id)
+    elif module_id is not None:
+        lessons = lessons.filter(module_id=module_id)
+    elif course_id is not None:
+        lessons = lessons.filter(module__course_id=course_id)
+    else:
+        raise ValueError("A lesson, module or course is required.")
+    return list(lessons.order_by('module__order', 'order', 'pk').values_list('pk', flat=True))
+
+
+def _float(value):
+    return None if value is None or np.isnan(value) else round(float(value), 4)
+
+
+class _LessonItems:
+    """questions and answers of one lesson, indexed for the arrays"""
+
+    def __init__(self, lesson_id, questions, answers):
+        self.lesson_id = lesson_id
+        self.questions = questions
+        self.question_col = {question['id']: col for col, question in enumerate(questions)}
+        self.allow_multiple = np.array([question['allow_multiple_answers'] for question in questions], dtype=bool)
+        self.answers = answers
+        self.answer_col = np.array([self.question_col[answer['question_id']] for answer in answers], dtype=np.int64)
+        self.answer_correct = np.array([answer['is_correct'] for answer in answers], dtype=bool)
+        self.correct_per_question = np.bincount(
+            self.answer_col[self.answer_correct], minlength=len(questions)
+        ) if answers else np.zeros(len(questions), dtype=np.int64)
+
+
+def _load_items(lesson_ids):
+    questions = defaultdict(list)
+    for question in Question.objects.filter(lesson_id__in=lesson_ids).order_by('order', 'pk').values(
+        'id', 'lesson_id', 'text', 'allow_multiple_answers'
+    ):
+        questions[question['lesson_id']].append(question)
+    answers = defaultdict(list)
+    for answer in Answer.objects.filter(question__lesson_id__in=lesson_ids).order_by('order', 'pk').values(
+        'id', 'question_id', 'question__lesson_id', 'text', 'is_correct'
+    ):
+        answers[answer['question__lesson_id']].append(answer)
+    return {
+        lesson_id: _LessonItems(lesson_id, questions[lesson_id], answers[lesson_id])
+        for lesson_id in lesson_ids
+    }
+
+
+def _extract(items, attempts):
+    """
+    flattens the attempts of one lesson (ordered by user, then time) into arrays:
+    users and passed per attempt, and one entry per selected answer (attempt row, question
+    column, answer index or -1, whether the question was answered with a list)
+    """
+    users = np.fromiter((attempt[0] for attempt in attempts), dtype=np.int64, count=len(attempts))
+    passed = np.fromiter((attempt[2] for attempt in attempts), dtype=bool, count=len(attempts))
+    # the answers come as json text and are decoded in one go, much cheaper than row by row
+    decoded = json.loads('[' + ','.join(attempt[1] or '{}' for attempt in attempts) + ']')
+
+    question_col = {str(question['id']): col for col, question in enumerate(items.questions)}.get
+    entries = [
+        (row, col, answer_id, is_list)
+        for row, answers in enumerate(decoded)
+        for question_id, selected in answers.items()
+        for col in (question_col(question_id, -1),)
+        for is_list in (selected.__class__ is list,)
+        for answer_id in (selected if is_list else (selected,))
+    ]
+    entries = np.array(entries, dtype=np.int64).reshape(-1, 4)
+    entries = entries[entries[:, 1] >= 0]
+
+    # answer ids -> position in items.answers, -1 for answers that no longer exist
+    answer_ids = np.full(len(entries), -1, dtype=np.int64)
+    if items.answers:
+        known_ids = np.array([answer['id'] for answer in items.answers], dtype=np.int64)
+        order = np.argsort(known_ids)
+        position = np.minimum(np.searchsorted(known_ids[order], entries[:, 2]), len(known_ids) - 1)
+        found = known_ids[order][position] == entries[:, 2]
+        answer_ids[found] = order[position[found]]
+    return users, passed, entries[:, 0], entries[:, 1], answer_ids, entries[:, 3].astype(bool)
+
+
+def _correct_matrix(items, n_attempts, rows, cols, answer_ids, listed):
+    """attempts x questions, True where the answer matches the key (same rules as grading.is_correct)"""
+    shape = (n_attempts, len(items.questions))
+    selected = np.zeros(shape, dtype=np.int64)
+    selected_correct = np.zeros(shape, dtype=np.int64)
+    as_list = np.zeros(shape, dtype=bool)
+
+    np.add.at(selected, (rows, cols), 1)
+    known = answer_ids >= 0
+    hits = np.zeros(len(answer_ids), dtype=bool)
+    # an answer counts only for its own question and when it is a correct one
+    hits[known] = items.answer_correct[answer_ids[known]] & (items.answer_col[answer_ids[known]] == cols[known])
+    np.add.at(selected_correct, (rows[hits], cols[hits]), 1)
+    as_list[rows[listed], cols[listed]] = True
+
+    needed = items.correct_per_question[None, :]
+    multiple = (selected == selected_correct) & (selected_correct == needed) & (needed > 0)
+    single = ~as_list & (selected == 1) & (selected_correct == 1)
+    return np.where(items.allow_multiple[None, :], multiple, single)
+
+
+def _point_biserial(correct):
+    """per column correlation of the 0/1 item with the rest score of the attempt"""
+    x = correct.astype(np.float64)
+    rest = x.sum(axis=1, keepdims=True) - x
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = ((x - x.mean(axis=0)) * (rest - rest.mean(axis=0))).mean(axis=0)
+        return covariance / (x.std(axis=0) * rest.std(axis=0))
+
+
+def _attempts_to_pass(users, passed):
+    """{'1': users passing on their first attempt, '2': ..., 'never': users not passed yet}"""
+    if not len(users):
+        return {}
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(users)]))
+    position = np.arange(len(users)) - starts[group] + 1
+    first_pass = np.minimum.reduceat(np.where(passed, position, np.iinfo(np.int64).max), starts)
+    never = first_pass == np.iinfo(np.int64).max
+    counts = np.bincount(first_pass[~never]) if (~never).any() else np.array([], dtype=np.int64)
+    distribution = {str(attempt): int(n) for attempt, n in enumerate(counts) if n}
+    distribution['never'] = int(never.sum())
+    return distribution
+
+
+def _analyse_lesson(items, attempts):
+    users, passed, rows, cols, answer_ids, listed = _extract(items, attempts)
+    n_attempts = len(attempts)
+    lesson = {
+        'lesson_id': items.lesson_id,
+        'attempts': n_attempts,
+        'users': int(len(np.unique(users))),
+        'attempts_to_pass': _attempts_to_pass(users, passed),
+    }
+    if not items.questions:
+        return lesson, []
+
+    if n_attempts:
+        correct = _correct_matrix(items, n_attempts, rows, cols, answer_ids, listed)
+        difficulty = correct.mean(axis=0)
+        discrimination = _point_biserial(correct)
+        known = answer_ids >= 0
+        selection_rate = np.bincount(answer_ids[known], minlength=len(items.answers)) / n_attempts
+    else:
+        difficulty = discrimination = np.full(len(items.questions), np.nan)
+        selection_rate = np.full(len(items.answers), np.nan)
+
+    answers_by_col = defaultdict(list)
+    for index, answer in enumerate(items.answers):
+        answers_by_col[items.answer_col[index]].append({
+            'answer_id': answer['id'],
+            'text': answer['text'],
+            'is_correct': answer['is_correct'],
+            'selection_rate': _float(selection_rate[index]),
+        })
+    questions = [
+        {
+            'question_id': question['id'],
+            'lesson_id': items.lesson_id,
+            'text': question['text'],
+            'attempts': n_attempts,
+            'difficulty': _float(difficulty[col]),
+            'discrimination': _float(discrimination[col]),
+            'answers': answers_by_col[col],
+        }
+        for col, question in enumerate(items.questions)
+    ]
+    return lesson, questions
+
+
+def item_analysis(lesson_id=None, module_id=None, course_id=None, chunk_size=ANALYTICS_CHUNK_SIZE):
+    """item statistics for every question of the lesson, module or course (see the module docstring)"""
+    lesson_ids = lessons_in_scope(lesson_id, module_id, course_id)
+    items = _load_items(lesson_ids)
+    lessons, questions = [], []
+
+    for current in lesson_ids:
+        attempts = list(
+            QuizAttempt.objects.filter(lesson_id=current)
+            .order_by('user_id', 'submitted_at', 'pk')
+            .values_list('user_id', Cast('answers', TextField()), 'passed')
+            .iterator(chunk_size=chunk_size)
+        )
+        lesson, lesson_questions = _analyse_lesson(items[current], attempts)
+        lessons.append(lesson)
+        questions.extend(lesson_questions)
+
+    return {
+        'generated_at': timezone.now(),
+        'attempts': sum(lesson['attempts'] for lesson in lessons),
+        'lessons': lessons,
+        'questions': questions,
+    }
+
+
+def write_item_analysis_csv(analysis, stream):
+    """one row per answer, the question statistics repeated on each of its answers"""
+    writer = csv.writer(stream)
+    writer.writerow(CSV_COLUMNS)
+    for question in analysis['questions']:
+        for answer in question['answers'] or [{}]:
+            writer.writerow([
+                question['lesson_id'], question['question_id'], question['text'], question['attempts'],
+                question['difficulty'], question['discrimination'],
+                answer.get('answer_id'), answer.get('text'), answer.get('is_correct'), answer.get('selection_rate'),
+            ])
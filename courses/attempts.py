@@ -0,0 +1,76 @@
+"""
+quiz attempt history.
+
+every graded submission is kept as a QuizAttempt with the selected answers encoded as
+{"<question id>": answer id or [answer ids]}. unlike the learning activity events the attempt is
+a record of graded work, so it is written with one INSERT in the submit transaction, next to the
+score and points it explains: it is in "my last attempts" right away, can't be lost with a
+worker, and regrade_lesson sees every attempt whichever worker took it.
+
+the start of an attempt is the moment the quiz was opened (LessonProgressByLessonView), kept in
+the cache until the submission picks it up.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+
+from .grading import selected_answer_ids, submitted_for
+from .models import QuizAttempt
+
+
+QUIZ_START_TIMEOUT = 60 * 60 * 6
+RECENT_ATTEMPTS = 10
+MAX_RECENT_ATTEMPTS = 100
+
+
+def quiz_start_key(user_id, lesson_id):
+    return f'courses:quiz-start:{user_id}:{lesson_id}'
+
+
+def mark_quiz_started(user_id, lesson_id):
+    # add() keeps the first opening if the quiz page is reloaded
+    cache.add(quiz_start_key(user_id, lesson_id), timezone.now(), QUIZ_START_TIMEOUT)
+
+
+def pop_quiz_start(user_id, lesson_id):
+    key = quiz_start_key(user_id, lesson_id)
+    started_at = cache.get(key)
+    cache.delete(key)
+    return started_at
+
+
+def encode_answers(answer_key, raw_answers):
+    """
+    {"<question id>": answer id or sorted answer ids} for the questions of the key that got an
+    answer. a single id stays a single id, so grading.grade() gives the same result on the
+    encoded answers as on the submission (regrade.py relies on that)
+    """
+    encoded = {}
+    for question_id in answer_key:
+        submitted = submitted_for(raw_answers, question_id)
+        selected = sorted(selected_answer_ids(submitted))
+        if not selected:
+            continue
+        encoded[str(question_id)] = selected if isinstance(submitted, (list, tuple)) else selected[0]
+    return encoded
+
+
+def record_attempt(user_id, lesson_id, answer_key, raw_answers, score, passed):
+    """stores the graded attempt...call it in the transaction that records the score"""
+    return QuizAttempt.objects.create(
+        user_id=user_id,
+        lesson_id=lesson_id,
+        answers=encode_answers(answer_key, raw_answers),
+        score=score,
+        total_questions=len(answer_key),
+        passed=passed,
+        started_at=pop_quiz_start(user_id, lesson_id),
+        submitted_at=timezone.now(),
+    )
+
+
+def recent_attempts(user_id, lesson_id=None, limit=RECENT_ATTEMPTS):
+    """the user's last attempts, newest first...served by the (user[, lesson], -submitted_at) indexes"""
+    attempts = QuizAttempt.objects.filter(user_id=user_id)
+    if lesson_id is not None:
+        attempts = attempts.filter(lesson_id=lesson_id)
+    return attempts.order_by('-submitted_at')[:limit]
@@ -0,0 +1,142 @@
+"""
+cache helpers for the course catalog.
+
+entries are versioned: a content change bumps a version number instead of deleting
+keys. an entry is stored together with the version it was built for, under a key that
+doesn't change, and is read in the same round trip as the version key (get_many), so a
+hit costs one cache call. an entry built for an older version is a miss and gets overwritten.
+"""
+import time
+
+from django.core.cache import cache
+
+
+CATALOG_VERSION_KEY = 'courses:catalog:version'
+CATALOG_TIMEOUT = 60 * 60 * 24
+
+
+def _fresh_version():
+    """
+    starting value for a version key that is missing (first use or evicted).
+    based on the clock so it never collides with a version handed out before
+    """
+    return int(time.time() * 1000)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        version = cache.get(key, _fresh_version())
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _fresh_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_versioned_many(entries):
+    """
+    {key: (current version, value cached for that version or None)} for {key: version key},
+    everything in one get_many
+    """
+    found = cache.get_many([*set(entries.values()), *entries])
+    result = {}
+    for key, version_key in entries.items():
+        version = found.get(version_key)
+        if version is None:
+            version = get_version(version_key)
+        entry = found.get(key)
+        result[key] = (version, entry[1] if entry is not None and entry[0] == version else None)
+    return result
+
+
+def get_versioned(key, version_key):
+    """(current version, value cached for that version or None)"""
+    return get_versioned_many({key: version_key})[key]
+
+
+def set_versioned(key, version, value, timeout):
+    cache.set(key, (version, value), timeout)
+
+
+def set_versioned_many(entries, timeout):
+    """entries: {key: (version, value)}"""
+    if entries:
+        cache.set_many(entries, timeout)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def catalog_cache_key(role_id=None):
+    """key for the serialized published catalog, optionally narrowed to one role"""
+    return f'courses:catalog:role:{role_id or "all"}'
+
+
+def get_catalog(role_id=None):
+    """(catalog version, cached catalog or None)"""
+    return get_versioned(catalog_cache_key(role_id), CATALOG_VERSION_KEY)
+
+
+def set_catalog(role_id, version, data):
+    set_versioned(catalog_cache_key(role_id), version, data, CATALOG_TIMEOUT)
+
+
+# per-course content. a change to a course's modules or lessons bumps its content version
+
+SEQUENCE_TIMEOUT = 60 * 60 * 24
+
+
+def content_version_key(course_id):
+    return f'courses:content:{course_id}:version'
+
+
+def get_content_version(course_id):
+    return get_version(content_version_key(course_id))
+
+
+def bump_content_version(course_id):
+    return bump_version(content_version_key(course_id))
+
+
+def build_lesson_sequence(course_id):
+    """
+    flattens the lessons of a course in module order then lesson order into
+    {lesson_id: {'module_id', 'title', 'previous', 'next'}}
+    """
+    from .models import Lesson
+
+    rows = list(
+        Lesson.objects.filter(module__course_id=course_id)
+        .order_by('module__order', 'module_id', 'order', 'pk')
+        .values_list('pk', 'module_id', 'title')
+    )
+    sequence = {}
+    for position, (lesson_id, module_id, title) in enumerate(rows):
+        sequence[lesson_id] = {
+            'module_id': module_id,
+            'title': title,
+            'previous': rows[position - 1][0] if position else None,
+            'next': rows[position + 1][0] if position + 1 < len(rows) else None,
+        }
+    return sequence
+
+
+def get_lesson_sequence(course_id):
+    key = f'courses:lesson-sequence:{course_id}'
+    version, sequence = get_versioned(key, content_version_key(course_id))
+    if sequence is None:
+        sequence = build_lesson_sequence(course_id)
+        set_versioned(key, version, sequence, SEQUENCE_TIMEOUT)
+    return sequence
@@ -0,0 +1,305 @@
+"""
+course funnels and weekly cohort retention for staff.
+
+both reports pull their source rows as flat columns (user ids, module ids, week numbers) with
+one query per table, the database doing the DISTINCT, and count with NumPy:
+
+- funnel of a course: enrolled -> completed a first lesson -> completed each module (in course
+  order) -> got the certificate, as users reaching each stage among the enrolled
+- retention: users are grouped into cohorts by the week of their first enrollment (in the
+  course, or anywhere for the platform report); a cell is the share of a cohort with learning
+  activity n weeks later
+
+results are kept in AnalyticsSnapshot (and the cache) with the time they were computed.
+incremental refreshes only look at rows newer than the snapshot's watermark: a funnel keeps
+the ids of the users at each stage and adds the enrolled users with newer rows (a passing
+retake moves date_completed, so a count alone would take them twice), and retention
+recomputes the weeks from the watermark's week on and keeps the older cells as they were
+(which also keeps them once the raw activity is archived, see retention.py). rows that are
+deleted or un-completed are only noticed by a full refresh.
+"""
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .models import (
+    AnalyticsSnapshot, Certificate, CourseEnrollment, LearningActivity, LessonProgress, Module,
+    ModuleProgress,
+)
+
+
+RETENTION_WEEKS = 12
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+LOOKUP_CHUNK_SIZE = 2000
+
+
+def snapshot_key(kind, course_id=None):
+    return f'{kind}:course:{course_id}' if course_id is not None else f'{kind}:global'
+
+
+def _cache_key(key):
+    return f'courses:analytics:{key}'
+
+
+def load_snapshot(key):
+    """{'data', 'computed_at', 'watermark'} or None"""
+    snapshot = cache.get(_cache_key(key))
+    if snapshot is None:
+        snapshot = AnalyticsSnapshot.objects.filter(key=key).values('data', 'computed_at', 'watermark').first()
+        if snapshot is not None:
+            cache.set(_cache_key(key), snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def save_snapshot(key, data, computed_at, watermark):
+    snapshot = {'data': data, 'computed_at': computed_at, 'watermark': watermark}
+    AnalyticsSnapshot.objects.update_or_create(key=key, defaults=snapshot)
+    cache.set(_cache_key(key), snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _ids(values):
+    return np.unique(np.fromiter(values, dtype=np.int64))
+
+
+def _week(moment):
+    """monday based week number...date(1, 1, 1) was a monday"""
+    day = timezone.localtime(moment).date() if hasattr(moment, 'hour') else moment
+    return (day.toordinal() - 1) // 7
+
+
+def _week_start(week):
+    return date.fromordinal(week * 7 + 1)
+
+
+# funnel
+
+def _funnel(course_id, state):
+    """
+    the funnel payload from state = {'enrolled': [user ids], 'reached': {stage: [user ids]}},
+    modules in their current course order. the state is kept in the payload for the next refresh
+    """
+    stages = [
+        {'stage': 'enrolled', 'label': "Enrolled"},
+        {'stage': 'first_lesson', 'label': "Completed a lesson"},
+    ]
+    for module_id, title in Module.objects.filter(course_id=course_id).order_by('order').values_list('id', 'title'):
+        stages.append({'stage': f'module:{module_id}', 'label': f"Completed {title}"})
+    stages.append({'stage': 'certificate', 'label': "Certificate"})
+
+    enrolled = len(state['enrolled'])
+    for index, stage in enumerate(stages):
+        stage['users'] = enrolled if not index else len(state['reached'].get(stage['stage'], ()))
+        previous = stages[index - 1]['users'] if index else stage['users']
+        stage['rate'] = round(stage['users'] / enrolled, 4) if enrolled else None
+        stage['step_rate'] = round(stage['users'] / previous, 4) if previous else None
+    return {'course_id': course_id, 'state': state, 'stages': stages}
+
+
+def _stage_sources(course_id):
+    """{stage: (completed rows of the stage, their time field)} for every stage after enrolled"""
+    sources = {
+        'first_lesson': (
+            LessonProgress.objects.filter(lesson__module__course_id=course_id, completed=True), 'date_completed'
+        ),
+        'certificate': (Certificate.objects.filter(course_id=course_id), 'issued_date'),
+    }
+    for module_id in Module.objects.filter(course_id=course_id).values_list('id', flat=True):
+        sources[f'module:{module_id}'] = (
+            ModuleProgress.objects.filter(module_id=module_id, completed=True), 'date_completed'
+        )
+    return sources
+
+
+def compute_funnel(course_id):
+    enrolled = _ids(CourseEnrollment.objects.filter(course_id=course_id).values_list('user_id', flat=True))
+    reached = {}
+
+    def among_enrolled(user_ids):
+        user_ids = _ids(user_ids)
+        return user_ids[np.isin(user_ids, enrolled, assume_unique=True)].tolist()
+
+    reached['first_lesson'] = among_enrolled(
+        LessonProgress.objects.filter(lesson__module__course_id=course_id, completed=True)
+        .values_list('user_id', flat=True).distinct()
+    )
+
+    pairs = np.array(
+        list(ModuleProgress.objects.filter(module__course_id=course_id, completed=True).values_list('module_id', 'user_id')),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    pairs = pairs[np.isin(pairs[:, 1], enrolled)]
+    pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+    module_ids, starts = np.unique(pairs[:, 0], return_index=True)
+    for module_id, users in zip(module_ids.tolist(), np.split(pairs[:, 1], starts[1:])):
+        reached[f'module:{module_id}'] = users.tolist()
+
+    reached['certificate'] = among_enrolled(Certificate.objects.filter(course_id=course_id).values_list('user_id', flat=True))
+    return _funnel(course_id, {'enrolled': enrolled.tolist(), 'reached': reached})
+
+
+def _user_ids_among(rows, user_ids):
+    """the distinct user ids of rows that are in user_ids, looked up in chunks"""
+    found = [np.empty(0, dtype=np.int64)]
+    for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE):
+        chunk = user_ids[start:start + LOOKUP_CHUNK_SIZE].tolist()
+        found.append(_ids(rows.filter(user_id__in=chunk).values_list('user_id', flat=True)))
+    return np.unique(np.concatenate(found))
+
+
+def update_funnel(course_id, data, since):
+    """
+    folds the rows newer than since into a stored funnel. the candidates for a stage are the
+    users with a newer row, plus the users enrolled since then (their older rows didn't count
+    before); the ones enrolled and not counted yet are added
+    """
+    state = data['state']
+    enrolled_since = _ids(
+        CourseEnrollment.objects.filter(course_id=course_id, enrolled_at__gt=since).values_list('user_id', flat=True)
+    )
+    enrolled = np.union1d(np.array(state['enrolled'], dtype=np.int64), enrolled_since)
+    reached = {}
+    for stage, (rows, field) in _stage_sources(course_id).items():
+        candidates = np.union1d(
+            _ids(rows.filter(**{f'{field}__gt': since}).values_list('user_id', flat=True)),
+            _user_ids_among(rows, enrolled_since),
+        )
+        candidates = candidates[np.isin(candidates, enrolled, assume_unique=True)]
+        reached[stage] = np.union1d(np.array(state['reached'].get(stage, []), dtype=np.int64), candidates).tolist()
+    return _funnel(course_id, {'enrolled': enrolled.tolist(), 'reached': reached})
+
+
+def refresh_funnel(course_id, full=False):
+    key = snapshot_key('funnel', course_id)
+    now = timezone.now()
+    snapshot = None if full else load_snapshot(key)
+    if snapshot is not None and snapshot['watermark'] and 'state' in snapshot['data']:
+        return save_snapshot(key, update_funnel(course_id, snapshot['data'], snapshot['watermark']), now, now)
+    return save_snapshot(key, compute_funnel(course_id), now, now)
+
+
+# cohort retention
+
+def _first_enrollments(course_id=None, user_ids=None, since=None):
+    """(user ids, cohort week numbers) from the first enrollment of each user"""
+    enrollments = CourseEnrollment.objects.all()
+    if course_id is not None:
+        enrollments = enrollments.filter(course_id=course_id)
+    rows = enrollments.values('user_id').annotate(first=Min('enrolled_at'))
+    if since is not None:
+        rows = rows.filter(first__gte=since)
+
+    if user_ids is None:
+        found = list(rows.values_list('user_id', 'first'))
+    else:
+        found = []
+        for start in range(0, len(user_ids), LOOKUP_CHUNK_SIZE):
+            found += rows.filter(user_id__in=user_ids[start:start + LOOKUP_CHUNK_SIZE].tolist()).values_list('user_id', 'first')
+    users = np.fromiter((user_id for user_id, _ in found), dtype=np.int64, count=len(found))
+    weeks = np.fromiter((_week(first) for _, first in found), dtype=np.int64, count=len(found))
+    order = np.argsort(users)
+    return users[order], weeks[order]
+
+
+def _active_weeks(course_id=None, since=None):
+    """(user ids, week numbers), one entry per user per week with any learning activity"""
+    events = LearningActivity.objects.all()
+    if course_id is not None:
+        events = events.filter(lesson__module__course_id=course_id)
+    if since is not None:
+        events = events.filter(timestamp__gte=since)
+    pairs = list(events.annotate(week=TruncWeek('timestamp')).order_by().values_list('user_id', 'week').distinct())
+    users = np.fromiter((user_id for user_id, _ in pairs), dtype=np.int64, count=len(pairs))
+    weeks = np.fromiter((_week(week) for _, week in pairs), dtype=np.int64, count=len(pairs))
+    return users, weeks
+
+
+def _retention_cells(course_id, since):
+    """{(cohort week, activity week): active users} for the activity weeks from since on"""
+    users, weeks = _active_weeks(course_id, since)
+    if not len(users):
+        return {}
+    cohort_users, cohort_weeks = _first_enrollments(course_id, user_ids=np.unique(users))
+    position = np.minimum(np.searchsorted(cohort_users, users), max(len(cohort_users) - 1, 0))
+    known = (cohort_users[position] == users) if len(cohort_users) else np.zeros(len(users), dtype=bool)
+    cohort = cohort_weeks[position[known]]
+    weeks = weeks[known]
+    keep = weeks >= cohort
+    cells, counts = np.unique(np.stack([cohort[keep], weeks[keep]], axis=1), axis=0, return_counts=True)
+    return {(int(c), int(w)): int(n) for (c, w), n in zip(cells, counts)}
+
+
+def _render_retention(state, current_week, max_weeks):
+    cohorts = []
+    for cohort, size in sorted((int(week), size) for week, size in state['cohorts'].items()):
+        active = state['active'].get(str(cohort), {})
+        span = min(max_weeks, current_week - cohort)
+        counts = [active.get(str(cohort + offset), 0) for offset in range(span + 1)]
+        cohorts.append({
+            'week': _week_start(cohort).isoformat(),
+            'users': size,
+            'active': counts,
+            'retention': [round(n / size, 4) if size else None for n in counts],
+        })
+    return cohorts
+
+
+def refresh_retention(course_id=None, full=False):
+    """
+    state keeps {'cohorts': {week: size}, 'active': {cohort week: {activity week: users}}} with
+    week numbers as string keys (json)
+    """
+    key = snapshot_key('retention', course_id)
+    now = timezone.now()
+    snapshot = None if full else load_snapshot(key)
+    state = {'cohorts': {}, 'active': {}}
+    since_week = since = None
+    if snapshot is not None and snapshot['watermark']:
+        state = snapshot['data']['state']
+        since_week = _week(snapshot['watermark'])
+        start = _week_start(since_week)
+        since = timezone.make_aware(datetime.combine(start, time.min))
+
+    # cohorts from since_week on can still grow, older ones are final
+    state['cohorts'] = {week: size for week, size in state['cohorts'].items() if since_week is None or int(week) < since_week}
+    _, cohort_weeks = _first_enrollments(course_id, since=since)
+    for week, size in zip(*np.unique(cohort_weeks, return_counts=True)):
+        state['cohorts'][str(int(week))] = int(size)
+
+    active = {
+        cohort: {week: n for week, n in weeks.items() if since_week is None or int(week) < since_week}
+        for cohort, weeks in state['active'].items()
+    }
+    for (cohort, week), n in _retention_cells(course_id, since).items():
+        active.setdefault(str(cohort), {})[str(week)] = n
+    state['active'] = active
+
+    data = {
+        'course_id': course_id,
+        'state': state,
+        'cohorts': _render_retention(state, _week(now), RETENTION_WEEKS),
+    }
+    return save_snapshot(key, data, now, now)
+
+
+def _is_stale(snapshot):
+    return snapshot is None or timezone.now() - snapshot['computed_at'] > timedelta(seconds=settings.ANALYTICS_MAX_AGE)
+
+
+def get_funnel(course_id, refresh=False):
+    snapshot = load_snapshot(snapshot_key('funnel', course_id))
+    if refresh or _is_stale(snapshot):
+        snapshot = refresh_funnel(course_id, full=refresh)
+    return snapshot
+
+
+def get_retention(course_id=None, refresh=False):
+    snapshot = load_snapshot(snapshot_key('retention', course_id))
+    if refresh or _is_stale(snapshot):
+        snapshot = refresh_retention(course_id, full=refresh)
+    return snapshot
@@ -0,0 +1,111 @@
+"""
+stored content counters on Course and Module.
+
+the counters are shifted with F() updates from the lesson/module/question signals, so a
+catalog read never has to count rows. rebuild_counters() recomputes them in bulk in case
+they ever drift (raw sql, bulk_create imports...). bulk_update sends no signals, so the rebuild
+bumps the catalog and content versions of the courses itself once it is committed.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from . import cache as course_cache
+from .models import Course, Module, Lesson, Question
+
+
+REBUILD_BATCH_SIZE = 500
+
+
+def _shift(lessons=0, questions=0, duration=None):
+    changes = {}
+    if lessons:
+        changes['lesson_count'] = F('lesson_count') + lessons
+    if questions:
+        changes['question_count'] = F('question_count') + questions
+    if duration:
+        changes['total_duration'] = F('total_duration') + duration
+    return changes
+
+
+def shift_module_counters(module_id, lessons=0, questions=0, duration=None):
+    """moves the counters of a module and of its course by the given deltas"""
+    changes = _shift(lessons, questions, duration)
+    if not changes or module_id is None:
+        return
+    Module.objects.filter(pk=module_id).update(**changes)
+    Course.objects.filter(modules=module_id).update(**changes)
+
+
+def shift_course_counters(course_id, modules=0, lessons=0, questions=0, duration=None):
+    changes = _shift(lessons, questions, duration)
+    if modules:
+        changes['module_count'] = F('module_count') + modules
+    if changes and course_id is not None:
+        Course.objects.filter(pk=course_id).update(**changes)
+
+
+def module_id_for_lesson(lesson_id):
+    return Lesson.objects.filter(pk=lesson_id).values_list('module_id', flat=True).first()
+
+
+def rebuild_counters(course_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    recomputes the stored counters from the content tables with grouped queries,
+    batch_size courses at a time. returns the number of courses rebuilt
+    """
+    courses = Course.objects.order_by('pk')
+    if course_ids is not None:
+        courses = courses.filter(pk__in=course_ids)
+    ids = list(courses.values_list('pk', flat=True))
+
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+
+        lesson_totals = {
+            row['module_id']: row
+            for row in Lesson.objects.filter(module__course_id__in=batch)
+            .values('module_id').annotate(n=Count('id'), duration=Sum('estimated_duration'))
+        }
+        question_totals = dict(
+            Question.objects.filter(lesson__module__course_id__in=batch)
+            .values('lesson__module_id').annotate(n=Count('id'))
+            .values_list('lesson__module_id', 'n')
+        )
+
+        course_map = {pk: Course(pk=pk) for pk in batch}
+        for course in course_map.values():
+            course.module_count = course.lesson_count = course.question_count = 0
+            course.total_duration = timedelta()
+
+        modules = list(Module.objects.filter(course_id__in=batch).only('id', 'course_id'))
+        for module in modules:
+            totals = lesson_totals.get(module.pk, {})
+            module.lesson_count = totals.get('n', 0)
+            module.question_count = question_totals.get(module.pk, 0)
+            module.total_duration = totals.get('duration') or timedelta()
+
+            course = course_map[module.course_id]
+            course.module_count += 1
+            course.lesson_count += module.lesson_count
+            course.question_count += module.question_count
+            course.total_duration += module.total_duration
+
+        Module.objects.bulk_update(
+            modules, ['lesson_count', 'question_count', 'total_duration'], batch_size=batch_size
+        )
+        Course.objects.bulk_update(
+            course_map.values(), ['module_count', 'lesson_count', 'question_count', 'total_duration'],
+            batch_size=batch_size
+        )
+
+    if ids:
+        transaction.on_commit(lambda: _invalidate(ids))
+    return len(ids)
+
+
+def _invalidate(course_ids):
+    course_cache.bump_catalog_version()
+    for course_id in course_ids:
+        course_cache.bump_content_version(course_id)
@@ -0,0 +1,98 @@
+"""
+bulk enrollment of a cohort in a course.
+
+the users come from a list (ids and/or emails) or from a role's members. they are processed
+chunk_size at a time with a fixed number of queries per chunk, never per user: resolve the
+entries that exist, read which of them are enrolled already, reactivate the inactive
+enrollments, bulk_create the rest with ignore_conflicts (an enrollment made concurrently just
+counts as existing) and count again to know how many rows were really added. every chunk
+commits on its own, so a failed run can simply be started again.
+
+bulk_create and update skip the enrollment signal, so the courses_enrolled totals of the new
+and reactivated users are shifted with one update per chunk instead.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from . import achievements
+from .models import CourseEnrollment, Role, User, UserAchievementSummary
+
+
+ENROLL_CHUNK_SIZE = 5000
+
+
+def _chunks(values, size):
+    chunk = []
+    for value in values:
+        chunk.append(value)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _listed_users(user_ids, emails, chunk_size):
+    """(existing user ids, number of entries not found) per chunk of the list"""
+    for chunk in _chunks(dict.fromkeys(user_ids or []), chunk_size):
+        found = set(User.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        yield [user_id for user_id in chunk if user_id in found], len(chunk) - len(found)
+    for chunk in _chunks(dict.fromkeys(email.strip() for email in emails or []), chunk_size):
+        found = list(User.objects.filter(email__in=chunk).values_list('pk', flat=True))
+        yield found, len(chunk) - len(found)
+
+
+def _role_members(role, chunk_size):
+    """the members of the role by user id, paged on the id so no cursor stays open while we write"""
+    members = Role.members.through.objects.filter(role=role).order_by('user_id').values_list('user_id', flat=True)
+    last = 0
+    while True:
+        chunk = list(members.filter(user_id__gt=last)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk, 0
+        last = chunk[-1]
+
+
+def enroll_users(course, user_ids=None, emails=None, role=None, chunk_size=ENROLL_CHUNK_SIZE):
+    """
+    enrolls the listed users, or every member of the role, in the course.
+    returns {'requested', 'enrolled', 'already_enrolled', 'unknown'}
+    """
+    if role is not None:
+        chunks = _role_members(role, chunk_size)
+    else:
+        chunks = _listed_users(user_ids, emails, chunk_size)
+
+    report = dict.fromkeys(('requested', 'enrolled', 'already_enrolled', 'unknown'), 0)
+    for chunk, unknown in chunks:
+        report['requested'] += len(chunk) + unknown
+        report['unknown'] += unknown
+        if not chunk:
+            continue
+
+        enrolled = CourseEnrollment.objects.filter(course=course, user_id__in=chunk)
+        with transaction.atomic():
+            existing = set(enrolled.values_list('user_id', flat=True))
+            inactive = list(enrolled.filter(active=False).select_for_update().values_list('user_id', flat=True))
+            if inactive:
+                enrolled.filter(user_id__in=inactive).update(active=True)
+            new = [user_id for user_id in chunk if user_id not in existing]
+            CourseEnrollment.objects.bulk_create(
+                [CourseEnrollment(user_id=user_id, course=course) for user_id in new],
+                ignore_conflicts=True,
+                batch_size=1000,
+            )
+            added = enrolled.count() - len(existing)
+            if added == len(new):
+                # users without a summary row get theirs counted from scratch when first read
+                UserAchievementSummary.objects.filter(user_id__in=new + inactive).update(
+                    courses_enrolled=F('courses_enrolled') + 1
+                )
+            else:
+                # someone else enrolled some of them meanwhile, we don't know which rows are ours
+                achievements.rebuild_summaries(new + inactive)
+
+        report['enrolled'] += added + len(inactive)
+        report['already_enrolled'] += len(chunk) - added - len(inactive)
+    return report
@@ -0,0 +1,84 @@
+"""
+quiz grading against a compiled answer key.
+
+the key of a lesson is {question_id: (frozenset of correct answer ids, allow_multiple_answers)},
+loaded with one query on a cache miss and dropped whenever a question or answer of the
+lesson changes (see signals.py). grading itself is plain set work in memory.
+"""
+from django.core.cache import cache
+
+from .models import Question
+
+
+ANSWER_KEY_TIMEOUT = 60 * 60 * 24
+
+
+def answer_key_cache_key(lesson_id):
+    return f'courses:answer-key:{lesson_id}'
+
+
+def build_answer_key(lesson_id):
+    rows = Question.objects.filter(lesson_id=lesson_id).values_list(
+        'id', 'allow_multiple_answers', 'answers__id', 'answers__is_correct'
+    )
+    correct = {}
+    multiple = {}
+    for question_id, allow_multiple, answer_id, is_correct in rows:
+        multiple[question_id] = allow_multiple
+        answers = correct.setdefault(question_id, set())
+        if answer_id is not None and is_correct:
+            answers.add(answer_id)
+    return {question_id: (frozenset(correct[question_id]), multiple[question_id]) for question_id in correct}
+
+
+def get_answer_key(lesson_id):
+    key = answer_key_cache_key(lesson_id)
+    answer_key = cache.get(key)
+    if answer_key is None:
+        answer_key = build_answer_key(lesson_id)
+        cache.set(key, answer_key, ANSWER_KEY_TIMEOUT)
+    return answer_key
+
+
+def invalidate_answer_key(lesson_id):
+    cache.delete(answer_key_cache_key(lesson_id))
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def selected_answer_ids(submitted):
+    """the answer ids picked for one question...accepts a list or a single id, drops junk"""
+    if submitted is None:
+        return set()
+    if not isinstance(submitted, (list, tuple)):
+        submitted = [submitted]
+    return {answer_id for answer_id in map(_as_int, submitted) if answer_id is not None}
+
+
+def submitted_for(raw_answers, question_id):
+    """answers come in keyed by question id as a string (json) or, from python callers, as an int"""
+    submitted = raw_answers.get(str(question_id))
+    return submitted if submitted is not None else raw_answers.get(question_id)
+
+
+def is_correct(answer_key_entry, submitted):
+    correct, allow_multiple = answer_key_entry
+    if allow_multiple:
+        return bool(correct) and selected_answer_ids(submitted) == correct
+    if isinstance(submitted, (list, tuple)):
+        return False
+    answer_id = _as_int(submitted)
+    return bool(answer_id) and answer_id in correct
+
+
+def grade(answer_key, raw_answers):
+    """number of questions answered correctly"""
+    return sum(
+        1 for question_id, entry in answer_key.items()
+        if is_correct(entry, submitted_for(raw_answers, question_id))
+    )
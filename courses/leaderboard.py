@@ -0,0 +1,277 @@
+"""
+points leaderboards: global, per course and per county.
+
+LeaderboardEntry keeps one row per user per board, shifted with F() updates whenever a
+graded attempt changes the user's points (add_points), in the same transaction as the
+change. a top-N page is a range scan of the (scope, -points, user) index. for "my rank",
+LeaderboardScore keeps how many users of each board have each score, moved in the same
+transactions as the entries, so a rank is one sum over the distinct scores above mine.
+
+the trade-off: a rank costs O(distinct scores above mine), not O(1). that is bounded by the
+score range of the board (at most 100 points a lesson, so a few thousand values for a long
+course history) and not by the number of users, where counting the entries above a mid-table
+user reads half the board. if boards ever spread over far more distinct scores, bucketed
+cumulative counts on top of the histogram would be the next step.
+
+when a lesson is deleted its points are taken off the boards (remove_points), and a deleted
+course's board is dropped as a whole (drop_scope).
+
+rebuild() recomputes the boards from LessonProgress in small per-user batches. each batch
+locks only the entries of its own users, so readers never wait on it and a point change
+racing with the rebuild is applied after the recount instead of being overwritten.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import LeaderboardEntry, LeaderboardScore, LessonProgress, Module, User
+
+
+REBUILD_BATCH_SIZE = 500
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def scopes_for(user_id, course_id=None, county_id=None):
+    scopes = [LeaderboardEntry.GLOBAL]
+    if course_id is not None:
+        scopes.append(LeaderboardEntry.course_scope(course_id))
+    if county_id is not None:
+        scopes.append(LeaderboardEntry.county_scope(county_id))
+    return scopes
+
+
+def count_scores(changes):
+    """
+    applies {(scope, points): change in users} to the score histogram. the rows are taken in
+    sorted order, so two transactions moving the same scores can't lock them the other way round
+    """
+    for (scope, points), delta in sorted(changes.items()):
+        if not delta:
+            continue
+        scores = LeaderboardScore.objects.filter(scope=scope, points=points)
+        if scores.update(users=F('users') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                LeaderboardScore.objects.create(scope=scope, points=points, users=delta)
+        except IntegrityError:
+            scores.update(users=F('users') + delta)
+
+
+def _locked_points(scope, user_id):
+    return (
+        LeaderboardEntry.objects.select_for_update().filter(scope=scope, user_id=user_id)
+        .values_list('points', flat=True).first()
+    )
+
+
+def _shift(scope, user_id, delta, scores, create=True):
+    """moves one entry by delta (creating it if needed) and records the score change in scores"""
+    points = _locked_points(scope, user_id)
+    if points is None:
+        if not create:
+            return
+        try:
+            with transaction.atomic():
+                LeaderboardEntry.objects.create(scope=scope, user_id=user_id, points=delta)
+            scores[(scope, delta)] += 1
+            return
+        except IntegrityError:
+            points = _locked_points(scope, user_id)
+    LeaderboardEntry.objects.filter(scope=scope, user_id=user_id).update(points=points + delta)
+    scores[(scope, points)] -= 1
+    scores[(scope, points + delta)] += 1
+
+
+def add_points(user_id, lesson_id, delta):
+    """moves the user's entries on the global, course and county boards by delta points"""
+    if not delta:
+        return
+    course_id = Module.objects.filter(lessons=lesson_id).values_list('course_id', flat=True).first()
+    county_id = User.objects.filter(pk=user_id).values_list('county_id', flat=True).first()
+    with transaction.atomic():
+        scores = Counter()
+        for scope in scopes_for(user_id, course_id, county_id):
+            _shift(scope, user_id, delta, scores)
+        count_scores(scores)
+
+
+def move_county(user_id, old_county_id, new_county_id):
+    """the user changed county...their global points move to the new county board"""
+    with transaction.atomic():
+        scores = Counter()
+        if old_county_id is not None:
+            old_scope = LeaderboardEntry.county_scope(old_county_id)
+            old_points = _locked_points(old_scope, user_id)
+            if old_points is not None:
+                LeaderboardEntry.objects.filter(scope=old_scope, user_id=user_id).delete()
+                scores[(old_scope, old_points)] -= 1
+        points = _locked_points(LeaderboardEntry.GLOBAL, user_id)
+        if new_county_id is not None and points is not None:
+            new_scope = LeaderboardEntry.county_scope(new_county_id)
+            current = _locked_points(new_scope, user_id)
+            if current is None:
+                LeaderboardEntry.objects.create(scope=new_scope, user_id=user_id, points=points)
+            else:
+                LeaderboardEntry.objects.filter(scope=new_scope, user_id=user_id).update(points=points)
+                scores[(new_scope, current)] -= 1
+            scores[(new_scope, points)] += 1
+        count_scores(scores)
+
+
+def remove_user(user_id):
+    """takes the user's entries out of the score histogram, before the user (and the entries) are deleted"""
+    scores = Counter()
+    for scope, points in (
+        LeaderboardEntry.objects.select_for_update().filter(user_id=user_id).values_list('scope', 'points')
+    ):
+        scores[(scope, points)] -= 1
+    count_scores(scores)
+
+
+def remove_points(course_id, points):
+    """
+    {user_id: points} taken off the global, course and county entries of the users (the lesson
+    that awarded them is being deleted). users without an entry are left alone
+    """
+    counties = dict(User.objects.filter(pk__in=points).values_list('pk', 'county_id'))
+    with transaction.atomic():
+        scores = Counter()
+        for user_id in sorted(points):
+            for scope in scopes_for(user_id, course_id, counties.get(user_id)):
+                _shift(scope, user_id, -points[user_id], scores, create=False)
+        count_scores(scores)
+
+
+def drop_scope(scope):
+    """deletes a whole board, entries and score histogram"""
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(scope=scope).delete()
+        LeaderboardScore.objects.filter(scope=scope).delete()
+
+
+def rank_of(scope, points):
+    """competition rank (1224) of a score on a board...sums one histogram row per distinct score above"""
+    above = LeaderboardScore.objects.filter(scope=scope, points__gt=points).aggregate(n=Sum('users'))['n']
+    return (above or 0) + 1
+
+
+def user_rank(scope, user_id):
+    """{'rank', 'points'} of the user on the board, None if they are not on it"""
+    points = LeaderboardEntry.objects.filter(scope=scope, user_id=user_id).values_list('points', flat=True).first()
+    if points is None:
+        return None
+    return {'rank': rank_of(scope, points), 'points': points}
+
+
+def top(scope, limit=PAGE_SIZE, offset=0):
+    """one page of the board, best first: [{'rank', 'user_id', 'username', 'points'}]"""
+    rows = list(
+        LeaderboardEntry.objects.filter(scope=scope)
+        .order_by('-points', 'user_id')
+        .values('user_id', 'user__username', 'points')[offset:offset + limit]
+    )
+    if not rows:
+        return []
+
+    # the first rank costs one sum, the rest follow from the positions and the ties on the page
+    rank = rank_of(scope, rows[0]['points'])
+    position = offset + 1
+    page = []
+    for index, row in enumerate(rows):
+        if index and row['points'] != rows[index - 1]['points']:
+            rank = position
+        page.append({
+            'rank': rank,
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'points': row['points'],
+        })
+        position += 1
+    return page
+
+
+def compute_entries(user_ids):
+    """{(scope, user_id): points} recounted from LessonProgress"""
+    progress = LessonProgress.objects.filter(user_id__in=user_ids)
+    totals = dict(progress.values('user_id').annotate(n=Sum('points_awarded')).values_list('user_id', 'n'))
+    entries = {(LeaderboardEntry.GLOBAL, user_id): points or 0 for user_id, points in totals.items()}
+
+    for user_id, course_id, points in (
+        progress.values('user_id', 'lesson__module__course_id')
+        .annotate(n=Sum('points_awarded'))
+        .values_list('user_id', 'lesson__module__course_id', 'n')
+    ):
+        entries[(LeaderboardEntry.course_scope(course_id), user_id)] = points or 0
+
+    for user_id, county_id in User.objects.filter(pk__in=totals, county__isnull=False).values_list('pk', 'county_id'):
+        entries[(LeaderboardEntry.county_scope(county_id), user_id)] = totals[user_id] or 0
+    return entries
+
+
+def rebuild(user_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    recomputes every board for the given users (default: everyone with progress or an entry,
+    and then the score histogram is recounted as well)
+    """
+    everyone = user_ids is None
+    if everyone:
+        user_ids = set(LessonProgress.objects.values_list('user_id', flat=True).distinct())
+        user_ids |= set(LeaderboardEntry.objects.values_list('user_id', flat=True).distinct())
+    user_ids = sorted(user_ids)
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            # lock first, count second...a concurrent add_points either committed before the
+            # lock (and is in the count) or waits for it and lands on top of the new value
+            current = {
+                (scope, user_id): (pk, points)
+                for pk, scope, user_id, points in LeaderboardEntry.objects.select_for_update()
+                .filter(user_id__in=batch).values_list('pk', 'scope', 'user_id', 'points')
+            }
+            entries = compute_entries(batch)
+
+            scores = Counter()
+            stale = []
+            for (scope, user_id), (pk, points) in current.items():
+                if (scope, user_id) not in entries:
+                    stale.append(pk)
+                    scores[(scope, points)] -= 1
+            for (scope, user_id), points in entries.items():
+                if (scope, user_id) in current:
+                    scores[(scope, current[(scope, user_id)][1])] -= 1
+                scores[(scope, points)] += 1
+            if stale:
+                LeaderboardEntry.objects.filter(pk__in=stale).delete()
+            LeaderboardEntry.objects.bulk_create(
+                [LeaderboardEntry(scope=scope, user_id=user_id, points=points)
+                 for (scope, user_id), points in entries.items()],
+                update_conflicts=True,
+                unique_fields=['scope', 'user'],
+                update_fields=['points', 'updated_at'],
+                batch_size=1000,
+            )
+            count_scores(scores)
+    if everyone:
+        rebuild_scores()
+    return len(user_ids)
+
+
+def rebuild_scores():
+    """
+    recounts the score histogram from the entries, for when it has drifted (raw sql, entries
+    deleted with their user). like the other repair commands, meant for a quiet moment
+    """
+    with transaction.atomic():
+        LeaderboardScore.objects.all().delete()
+        LeaderboardScore.objects.bulk_create(
+            [
+                LeaderboardScore(scope=scope, points=points, users=users)
+                for scope, points, users in LeaderboardEntry.objects.order_by()
+                .values_list('scope', 'points').annotate(n=Count('id')).iterator()
+            ],
+            batch_size=1000,
+        )
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.retention import archive_old_activity, ARCHIVE_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Move LearningActivity months older than the retention window to gzipped NDJSON archive files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.ACTIVITY_RETENTION_MONTHS,
+                            help="calendar months to keep in the database (the current month included)")
+        parser.add_argument('--output-dir', default=settings.ACTIVITY_ARCHIVE_DIR)
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['months'] < 1:
+            raise CommandError("--months must be at least 1.")
+
+        archived = archive_old_activity(
+            months=options['months'], directory=options['output_dir'], batch_size=options['batch_size']
+        )
+        for month, moved in archived:
+            self.stdout.write(f"{month:%Y-%m}: {moved} event(s)")
+        total = sum(moved for _, moved in archived)
+        self.stdout.write(self.style.SUCCESS(f"Archived {total} event(s) from {len(archived)} month(s)."))
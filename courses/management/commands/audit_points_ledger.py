@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from courses.points import audit, AUDIT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Check the points ledger sums against the stored per-user point totals"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=AUDIT_BATCH_SIZE)
+        parser.add_argument('--fix', action='store_true', help="set the stored totals to the ledger sums")
+
+    def handle(self, *args, **options):
+        mismatches, checked = audit(batch_size=options['batch_size'], fix=options['fix'])
+        for user_id, ledger_total, stored_total in mismatches:
+            self.stdout.write(f"user {user_id}: ledger {ledger_total}, stored {stored_total}")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f"All {checked} user total(s) match the ledger."))
+        elif options['fix']:
+            self.stdout.write(self.style.WARNING(f"Fixed {len(mismatches)} of {checked} user total(s)."))
+        else:
+            self.stdout.write(self.style.ERROR(f"{len(mismatches)} of {checked} user total(s) don't match the ledger."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from courses.activity import backfill_daily_activity, BACKFILL_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyActivity rollup and the streaks from the LearningActivity log"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="only backfill this user id (can be repeated)")
+        parser.add_argument('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        users, days = backfill_daily_activity(user_ids=options['users'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {days} active day(s) for {users} user(s)."))
@@ -0,0 +1,60 @@
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.activity import ActivityBuffer
+from courses.models import LearningActivity
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare writing LearningActivity one row per request with the buffered, batched writer. "
+        "Runs on throwaway users in one transaction that is rolled back, nothing is kept"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=20, help="spread the events over this many throwaway users")
+        parser.add_argument('--buffer-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        events = options['events']
+        with transaction.atomic():
+            per_request, buffered = self.measure(events, options['users'], options['buffer_size'])
+            # the users, the events and whatever their signals wrote all go away
+            transaction.set_rollback(True)
+
+        for label, seconds in (('per request', per_request), ('buffered', buffered)):
+            self.stdout.write(f"{label:>12}: {seconds:.3f}s  ({events / seconds:,.0f} events/s)")
+        self.stdout.write(self.style.SUCCESS(f"Buffered writes were {per_request / buffered:.1f}x faster."))
+        self.stdout.write(
+            "Both runs share one transaction (a savepoint per request instead of a commit), "
+            "so the per request numbers are on the optimistic side."
+        )
+
+    def measure(self, events, users, buffer_size):
+        run = uuid.uuid4().hex[:8]
+        user_ids = [
+            get_user_model().objects.create(username=f'benchmark-{run}-{i}', email=f'benchmark-{run}-{i}@example.com').pk
+            for i in range(max(users, 1))
+        ]
+
+        def event(i, mode):
+            return dict(user_id=user_ids[i % len(user_ids)], action='view_lesson', metadata={'benchmark': mode})
+
+        started = time.perf_counter()
+        for i in range(events):
+            with transaction.atomic():
+                LearningActivity.objects.create(**event(i, 'per_request'))
+        per_request = time.perf_counter() - started
+
+        buffer = ActivityBuffer(size=buffer_size, interval=3600)
+        started = time.perf_counter()
+        for i in range(events):
+            buffer.add(LearningActivity(**event(i, 'buffered')))
+        buffer.flush()
+        buffered = time.perf_counter() - started
+        return per_request, buffered
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.enrollment import enroll_users, ENROLL_CHUNK_SIZE
+from courses.models import Course, Role
+
+
+class Command(BaseCommand):
+    help = "Enroll a list of users, or every member of a role, in a course"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', type=int, help="course id")
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--role', help="role id or name")
+        source.add_argument('--file', help="text file with one user id or email per line")
+        parser.add_argument('--chunk-size', type=int, default=ENROLL_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        course = Course.objects.filter(pk=options['course']).first()
+        if course is None:
+            raise CommandError(f"Course {options['course']} not found.")
+
+        if options['role']:
+            lookup = {'pk': int(options['role'])} if options['role'].isdigit() else {'name': options['role']}
+            role = Role.objects.filter(**lookup).first()
+            if role is None:
+                raise CommandError(f"Role {options['role']!r} not found.")
+            report = enroll_users(course, role=role, chunk_size=options['chunk_size'])
+        else:
+            try:
+                with open(options['file'], encoding='utf-8') as stream:
+                    entries = [line.strip() for line in stream if line.strip()]
+            except OSError as error:
+                raise CommandError(str(error))
+            report = enroll_users(
+                course,
+                user_ids=[int(entry) for entry in entries if entry.isdigit()],
+                emails=[entry for entry in entries if not entry.isdigit()],
+                chunk_size=options['chunk_size'],
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['enrolled']} newly enrolled, {report['already_enrolled']} enrolled already, "
+            f"{report['unknown']} not found (of {report['requested']})."
+        ))
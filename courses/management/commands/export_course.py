@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Course
+from courses.transfer import export_course, EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Write a course with its modules, lessons, resources, questions and answers as NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help="course id or slug")
+        parser.add_argument('--output', '-o', default='-', help="file to write, - for stdout (default)")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        lookup = {'pk': int(options['course'])} if options['course'].isdigit() else {'slug': options['course']}
+        course = Course.objects.filter(**lookup).first()
+        if course is None:
+            raise CommandError(f"Course {options['course']!r} not found.")
+
+        if options['output'] == '-':
+            counts = export_course(course, self.stdout, chunk_size=options['chunk_size'])
+        else:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                counts = export_course(course, stream, chunk_size=options['chunk_size'])
+        summary = ', '.join(f"{n} {kind}(s)" for kind, n in counts.items())
+        # the summary goes to stderr, stdout may be the export itself
+        self.stderr.write(self.style.SUCCESS(f"Exported {course.slug}: {summary}."))
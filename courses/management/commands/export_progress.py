@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.exports import progress_lines, EXPORT_CHUNK_SIZE, OUTPUT_FORMATS
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Stream every learner's lesson progress in a course as CSV or NDJSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', type=int, help="course id")
+        parser.add_argument('--output', '-o', default='-', help="file to write, - for stdout (default)")
+        parser.add_argument('--output-format', choices=list(OUTPUT_FORMATS), default='csv')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if not Course.objects.filter(pk=options['course']).exists():
+            raise CommandError(f"Course {options['course']} not found.")
+
+        lines = progress_lines(options['output_format'], course_id=options['course'], chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        written = 0
+        with open(options['output'], 'w', encoding='utf-8', newline='') as stream:
+            for line in lines:
+                stream.write(line)
+                written += 1
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} line(s) to {options['output']}."))
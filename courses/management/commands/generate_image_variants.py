@@ -0,0 +1,21 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from core.images import backfill, BACKFILL_BATCH_SIZE, IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = "Make the missing or out of date WebP/JPEG variants of uploaded images (IMAGE_VARIANT_FIELDS)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', action='append', dest='models', choices=list(IMAGE_FIELDS),
+                            help="only this model, e.g. courses.Lesson (can be repeated)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="processes doing the encoding (1 encodes in this process)")
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        counts = backfill(labels=options['models'], workers=options['workers'], batch_size=options['batch_size'])
+        summary = ', '.join(f"{n} {field}" for field, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Processed {summary or 'nothing'}."))
@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.transfer import CourseImportError, import_course, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Create a course from an NDJSON file written by export_course (all or nothing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="file to read, - for stdin")
+        parser.add_argument('--slug', help="slug for the new course instead of the exported one")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            if options['input'] == '-':
+                result = import_course(sys.stdin, slug=options['slug'], batch_size=options['batch_size'])
+            else:
+                with open(options['input'], encoding='utf-8') as stream:
+                    result = import_course(stream, slug=options['slug'], batch_size=options['batch_size'])
+        except (CourseImportError, OSError) as error:
+            raise CommandError(f"Import failed, nothing was saved: {error}")
+
+        course, counts, unknown_roles = result
+        if unknown_roles:
+            self.stdout.write(self.style.WARNING(f"Roles not found here, not linked: {', '.join(unknown_roles)}"))
+        summary = ', '.join(f"{n} {kind}(s)" for kind, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Imported {course.slug} (id {course.pk}): {summary}."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from courses.counters import rebuild_counters, REBUILD_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored module/lesson/question/duration counters on courses and modules"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help="only rebuild this course id (can be repeated)")
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_counters(course_ids=options['courses'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {rebuilt} course(s)."))
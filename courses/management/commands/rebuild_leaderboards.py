@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from courses.leaderboard import rebuild, REBUILD_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Recompute the global, course and county leaderboards from the lesson progress points"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="only rebuild this user id (can be repeated)")
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(user_ids=options['users'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt leaderboard entries for {rebuilt} user(s)."))
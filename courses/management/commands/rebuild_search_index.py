@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from courses.search import rebuild, INDEX_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rewrite the search documents of every course, lesson, lesson resource and article"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        counts = rebuild(batch_size=options['batch_size'])
+        summary = ', '.join(f"{n} {kind}(s)" for kind, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Indexed {summary}."))
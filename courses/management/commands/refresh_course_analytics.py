@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from courses import cohorts
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = "Bring the course funnels and the cohort retention reports up to date"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', dest='courses',
+                            help="only refresh this course id (can be repeated)")
+        parser.add_argument('--full', action='store_true', help="recompute from scratch instead of incrementally")
+
+    def handle(self, *args, **options):
+        course_ids = options['courses'] or list(Course.objects.order_by('pk').values_list('pk', flat=True))
+        for course_id in course_ids:
+            cohorts.refresh_funnel(course_id, full=options['full'])
+            cohorts.refresh_retention(course_id, full=options['full'])
+        if not options['courses']:
+            cohorts.refresh_retention(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f"Refreshed analytics for {len(course_ids)} course(s)."))
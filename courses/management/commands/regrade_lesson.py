@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from courses.models import Lesson
+from courses.regrade import regrade_lesson, REGRADE_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Regrade every stored quiz attempt of a lesson against its current answer key"
+
+    def add_arguments(self, parser):
+        parser.add_argument('lessons', nargs='+', type=int, metavar='lesson_id')
+        parser.add_argument('--chunk-size', type=int, default=REGRADE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        for lesson_id in options['lessons']:
+            try:
+                report = regrade_lesson(lesson_id, chunk_size=options['chunk_size'])
+            except Lesson.DoesNotExist:
+                raise CommandError(f"Lesson {lesson_id} does not exist.")
+            self.stdout.write(self.style.SUCCESS(
+                f"Lesson {lesson_id}: {report['attempts']} attempt(s) of {report['users']} user(s) regraded, "
+                f"{report['attempts_changed']} attempt(s) and {report['progress_changed']} progress row(s) changed, "
+                f"{report['newly_passed']} now passing, {report['newly_failed']} now failing."
+            ))
@@ -0,0 +1,24 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from courses.rendering import render_lessons, RENDER_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Render and sanitize the content of lessons whose stored HTML is missing or out of date"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lesson', type=int, action='append', dest='lessons',
+                            help="only render this lesson id (can be repeated)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="processes doing the rendering (1 renders in this process)")
+        parser.add_argument('--batch-size', type=int, default=RENDER_BATCH_SIZE)
+        parser.add_argument('--force', action='store_true', help="render every lesson, even up to date ones")
+
+    def handle(self, *args, **options):
+        rendered = render_lessons(
+            lesson_ids=options['lessons'], workers=options['workers'],
+            batch_size=options['batch_size'], force=options['force'],
+        )
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} lesson(s)."))
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.timezone import localdate
+
+from courses import platform_stats
+
+
+class Command(BaseCommand):
+    help = "Count the platform wide daily statistics of the newest days (safe to run again)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="recount from this day (YYYY-MM-DD) instead of the last stored one")
+        parser.add_argument('--days', type=int, help="recount the last N days (today included)")
+
+    def handle(self, *args, **options):
+        start = None
+        if options['since']:
+            try:
+                start = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError("--since must be a YYYY-MM-DD date.")
+        elif options['days'] is not None:
+            if options['days'] < 1:
+                raise CommandError("--days must be at least 1.")
+            start = localdate() - timedelta(days=options['days'] - 1)
+
+        written = platform_stats.refresh(start=start)
+        self.stdout.write(self.style.SUCCESS(f"Counted platform stats for {written} day(s)."))
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:20
+
+import datetime
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_counters(apps, schema_editor):
+    Course = apps.get_model('courses', 'Course')
+    Module = apps.get_model('courses', 'Module')
+    Lesson = apps.get_model('courses', 'Lesson')
+    Question = apps.get_model('courses', 'Question')
+
+    lessons = {
+        row['module_id']: row
+        for row in Lesson.objects.values('module_id').annotate(n=Count('id'), duration=Sum('estimated_duration'))
+    }
+    questions = dict(
+        Question.objects.values('lesson__module_id').annotate(n=Count('id')).values_list('lesson__module_id', 'n')
+    )
+
+    courses = {}
+    modules = list(Module.objects.all())
+    for module in modules:
+        row = lessons.get(module.pk, {})
+        module.lesson_count = row.get('n', 0)
+        module.question_count = questions.get(module.pk, 0)
+        module.total_duration = row.get('duration') or datetime.timedelta()
+
+        totals = courses.setdefault(module.course_id, [0, 0, 0, datetime.timedelta()])
+        totals[0] += 1
+        totals[1] += module.lesson_count
+        totals[2] += module.question_count
+        totals[3] += module.total_duration
+    Module.objects.bulk_update(modules, ['lesson_count', 'question_count', 'total_duration'], batch_size=500)
+
+    for course_id, (module_count, lesson_count, question_count, total_duration) in courses.items():
+        Course.objects.filter(pk=course_id).update(
+            module_count=module_count, lesson_count=lesson_count,
+            question_count=question_count, total_duration=total_duration,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_certificate_course_is_free_course_price_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='module_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='total_duration',
+            field=models.DurationField(default=datetime.timedelta, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='lesson_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='question_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='total_duration',
+            field=models.DurationField(default=datetime.timedelta, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_content_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseOutline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_version', models.BigIntegerField(default=0)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('data', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outline', to='courses.course')),
+            ],
+        ),
+    ]
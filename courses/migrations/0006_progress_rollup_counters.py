@@ -0,0 +1,86 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:27
+
+import uuid
+
+from django.db import migrations, models
+from django.db.models import Count, F
+from django.utils import timezone
+
+
+BATCH_SIZE = 1000
+
+
+def _upsert(model, rows, parent, counter):
+    """creates the progress rows (nothing made them before the rollup) or sets the counter of existing ones"""
+    batch = []
+    for user_id, parent_id, n in rows:
+        batch.append(model(user_id=user_id, **{f'{parent}_id': parent_id, counter: n}))
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_create(batch, update_conflicts=True, unique_fields=['user', parent], update_fields=[counter])
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch, update_conflicts=True, unique_fields=['user', parent], update_fields=[counter])
+
+
+def fill_progress_counters(apps, schema_editor):
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    ModuleProgress = apps.get_model('courses', 'ModuleProgress')
+    CourseProgress = apps.get_model('courses', 'CourseProgress')
+    UserBadge = apps.get_model('courses', 'UserBadge')
+    Certificate = apps.get_model('courses', 'Certificate')
+    now = timezone.now()
+
+    lessons = (
+        LessonProgress.objects.filter(completed=True).order_by()
+        .values_list('user_id', 'lesson__module_id').annotate(n=Count('id'))
+    )
+    _upsert(ModuleProgress, lessons.iterator(), 'module', 'lessons_completed')
+    # modules whose lessons were all done already are completed now, with their badges
+    ModuleProgress.objects.filter(
+        completed=False, module__lesson_count__gt=0, lessons_completed__gte=F('module__lesson_count')
+    ).update(completed=True, date_completed=now)
+    badges = ModuleProgress.objects.filter(completed=True, module__badge__isnull=False).values_list(
+        'user_id', 'module__badge__id'
+    )
+    UserBadge.objects.bulk_create(
+        [UserBadge(user_id=user_id, badge_id=badge_id) for user_id, badge_id in badges.iterator()],
+        ignore_conflicts=True, batch_size=BATCH_SIZE,
+    )
+
+    modules = (
+        ModuleProgress.objects.filter(completed=True).order_by()
+        .values_list('user_id', 'module__course_id').annotate(n=Count('id'))
+    )
+    _upsert(CourseProgress, modules.iterator(), 'course', 'modules_completed')
+    # same for the courses, each with its certificate
+    finished = CourseProgress.objects.filter(
+        completed=False, course__module_count__gt=0, modules_completed__gte=F('course__module_count')
+    )
+    for progress in list(finished):
+        progress.completed, progress.date_completed, progress.certificate_issued = True, now, True
+        progress.certificate_code = progress.certificate_code or uuid.uuid4().hex
+        progress.save(update_fields=['completed', 'date_completed', 'certificate_issued', 'certificate_code'])
+        Certificate.objects.get_or_create(
+            user_id=progress.user_id, course_id=progress.course_id, defaults={'code': progress.certificate_code}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_course_outline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseprogress',
+            name='modules_completed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='moduleprogress',
+            name='lessons_completed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_progress_counters, migrations.RunPython.noop),
+    ]
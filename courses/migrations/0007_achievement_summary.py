@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_progress_rollup_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserAchievementSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_points', models.IntegerField(default=0)),
+                ('lessons_completed', models.PositiveIntegerField(default=0)),
+                ('modules_completed', models.PositiveIntegerField(default=0)),
+                ('courses_enrolled', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='achievement_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_daily_activity'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='learningactivity',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
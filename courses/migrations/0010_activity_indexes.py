@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_activity_timestamp_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='learningactivity',
+            index=models.Index(fields=['user', '-timestamp'], name='courses_lea_user_id_95b8d5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='learningactivity',
+            index=models.Index(fields=['timestamp'], name='courses_lea_timesta_b6e3d2_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:35
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def build_leaderboards(apps, schema_editor):
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    LeaderboardEntry = apps.get_model('courses', 'LeaderboardEntry')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    totals = dict(
+        LessonProgress.objects.values('user_id').annotate(n=Sum('points_awarded')).values_list('user_id', 'n')
+    )
+    entries = [LeaderboardEntry(scope='global', user_id=user_id, points=points or 0) for user_id, points in totals.items()]
+    entries += [
+        LeaderboardEntry(scope=f'course:{course_id}', user_id=user_id, points=points or 0)
+        for user_id, course_id, points in LessonProgress.objects.values('user_id', 'lesson__module__course_id')
+        .annotate(n=Sum('points_awarded')).values_list('user_id', 'lesson__module__course_id', 'n')
+    ]
+    entries += [
+        LeaderboardEntry(scope=f'county:{county_id}', user_id=user_id, points=totals[user_id] or 0)
+        for user_id, county_id in User.objects.filter(pk__in=totals, county__isnull=False).values_list('pk', 'county_id')
+    ]
+    LeaderboardEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_activity_indexes'),
+        ('core', '0004_user_county'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32)),
+                ('points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['scope', '-points', 'user'], name='courses_lea_scope_00bd66_idx')],
+                'constraints': [models.UniqueConstraint(fields=('scope', 'user'), name='unique_leaderboard_entry')],
+            },
+        ),
+        migrations.RunPython(build_leaderboards, migrations.RunPython.noop),
+    ]
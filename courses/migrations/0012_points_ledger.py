@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:36
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_balances(apps, schema_editor):
+    """one opening entry per scored lesson so the ledger sums match the existing totals"""
+    LessonProgress = apps.get_model('courses', 'LessonProgress')
+    PointsLedgerEntry = apps.get_model('courses', 'PointsLedgerEntry')
+    rows = LessonProgress.objects.exclude(points_awarded=0).values_list('user_id', 'lesson_id', 'points_awarded')
+    batch = []
+    for user_id, lesson_id, points in rows.iterator(chunk_size=2000):
+        batch.append(PointsLedgerEntry(user_id=user_id, lesson_id=lesson_id, delta=points, reason='backfill'))
+        if len(batch) >= 2000:
+            PointsLedgerEntry.objects.bulk_create(batch)
+            batch = []
+    PointsLedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_leaderboard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('quiz_attempt', 'Quiz attempt'), ('backfill', 'Opening balance'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lesson', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='points_ledger', to='courses.lesson')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+                'indexes': [models.Index(fields=['user', '-timestamp'], name='courses_poi_user_id_356c94_idx')],
+            },
+        ),
+        migrations.RunPython(open_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_points_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answers', models.JSONField(default=dict)),
+                ('score', models.PositiveIntegerField(default=0)),
+                ('total_questions', models.PositiveIntegerField(default=0)),
+                ('passed', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('submitted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lesson', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to='courses.lesson')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quiz_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-submitted_at'],
+                'indexes': [models.Index(fields=['user', 'lesson', '-submitted_at'], name='courses_qui_user_id_fd1d4b_idx'), models.Index(fields=['user', '-submitted_at'], name='courses_qui_user_id_798609_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_quiz_attempts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pointsledgerentry',
+            name='reason',
+            field=models.CharField(choices=[('quiz_attempt', 'Quiz attempt'), ('backfill', 'Opening balance'), ('adjustment', 'Adjustment'), ('regrade', 'Regrade')], max_length=20),
+        ),
+    ]
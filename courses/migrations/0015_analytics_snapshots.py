@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_ledger_regrade_reason'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('data', models.JSONField(default=dict)),
+                ('computed_at', models.DateTimeField()),
+                ('watermark', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
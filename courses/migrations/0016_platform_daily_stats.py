@@ -0,0 +1,53 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_analytics_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('enrollments', models.PositiveIntegerField(default=0)),
+                ('lesson_completions', models.PositiveIntegerField(default=0)),
+                ('course_completions', models.PositiveIntegerField(default=0)),
+                ('active_users', models.PositiveIntegerField(default=0)),
+                ('quiz_attempts', models.PositiveIntegerField(default=0)),
+                ('quiz_passes', models.PositiveIntegerField(default=0)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'platform daily stats',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='courseenrollment',
+            index=models.Index(fields=['enrolled_at'], name='courses_cou_enrolle_89b743_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courseprogress',
+            index=models.Index(fields=['date_completed'], name='courses_cou_date_co_0d2558_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyactivity',
+            index=models.Index(fields=['date'], name='courses_dai_date_d18917_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lessonprogress',
+            index=models.Index(fields=['date_completed'], name='courses_les_date_co_bc3b64_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quizattempt',
+            index=models.Index(fields=['submitted_at'], name='courses_qui_submitt_fef754_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_platform_daily_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='members',
+            field=models.ManyToManyField(blank=True, related_name='course_roles', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
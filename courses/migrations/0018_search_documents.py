@@ -0,0 +1,76 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:58
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+# the text index depends on the database (see courses/search.py), so it is created here by hand
+FTS_TABLE = 'courses_searchdocument_fts'
+
+
+def create_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX courses_searchdocument_vector_idx ON courses_searchdocument USING GIN (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(title, body, tokenize='porter unicode61 remove_diacritics 2')"
+        )
+
+
+def index_existing(apps, schema_editor):
+    # the documents of what exists already, later changes are indexed by the signals
+    from courses import search
+
+    Course = apps.get_model('courses', 'Course')
+    Lesson = apps.get_model('courses', 'Lesson')
+    LessonResource = apps.get_model('courses', 'LessonResource')
+    Post = apps.get_model('articles', 'Post')
+    sources = {
+        'course': Course.objects.all(),
+        'lesson': Lesson.objects.select_related('module__course'),
+        'resource': LessonResource.objects.select_related('lesson__module__course'),
+        'article': Post.objects.all(),
+    }
+    for kind, queryset in sources.items():
+        search.index_queryset(kind, queryset)
+
+
+def drop_text_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS courses_searchdocument_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0017_role_members'),
+        ('articles', '0004_alter_post_options_alter_post_slug_alter_post_title_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course', 'Course'), ('lesson', 'Lesson'), ('resource', 'Lesson resource'), ('article', 'Article')], max_length=20)),
+                ('object_id', models.PositiveIntegerField()),
+                ('course_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('title', models.CharField(max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('published', models.BooleanField(default=False)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_text_index, drop_text_index),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
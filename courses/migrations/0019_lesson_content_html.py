@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:04
+
+from django.db import migrations, models
+
+
+def render_existing(apps, schema_editor):
+    # the lessons that exist already, save() renders the ones written after this
+    from courses.rendering import RENDER_BATCH_SIZE, content_hash, render_content
+
+    Lesson = apps.get_model('courses', 'Lesson')
+    lessons = Lesson.objects.order_by('pk').only('id', 'content_text')
+    last = 0
+    while True:
+        page = list(lessons.filter(pk__gt=last)[:RENDER_BATCH_SIZE])
+        if not page:
+            return
+        last = page[-1].pk
+        for lesson in page:
+            lesson.content_html = render_content(lesson.content_text)
+            lesson.content_hash = content_hash(lesson.content_text)
+        Lesson.objects.bulk_update(page, ['content_html', 'content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0018_search_documents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='content_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_existing, migrations.RunPython.noop),
+    ]
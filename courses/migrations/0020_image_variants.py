@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0019_lesson_content_html'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='icon_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='infographic_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
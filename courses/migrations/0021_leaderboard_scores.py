@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:26
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_scores(apps, schema_editor):
+    LeaderboardEntry = apps.get_model('courses', 'LeaderboardEntry')
+    LeaderboardScore = apps.get_model('courses', 'LeaderboardScore')
+    LeaderboardScore.objects.bulk_create(
+        [
+            LeaderboardScore(scope=scope, points=points, users=users)
+            for scope, points, users in LeaderboardEntry.objects.order_by()
+            .values_list('scope', 'points').annotate(n=Count('id')).iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32)),
+                ('points', models.IntegerField()),
+                ('users', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'points'), name='unique_leaderboard_score')],
+            },
+        ),
+        migrations.RunPython(count_scores, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,17 @@
 from django.db import models
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.text import slugify
 from django.core.exceptions import ValidationError
 from datetime import timedelta
 import uuid
 
+from django.contrib.postgres.search import SearchVectorField
+
+from .rendering import render_lesson
+
 
 # Create your models here.
 
@@ -25,18 +29,40 @@ class Role(models.Model):
     """
     name = models.CharField(max_length=50, unique=True)  
     description = models.TextField(blank=True,help_text="explain what the role is all about")
+    # the users holding the role, e.g. the agents a partner organisation registered (bulk enrollment by role)
+    members = models.ManyToManyField(User, blank=True, related_name='course_roles')
 
     def __str__(self):
         return self.name
 
 
+class ContentCountersMixin:
+    """
+    for the course content models whose rows feed the stored counters on Course/Module.
+    saves run inside a transaction so the counter updates fired from signals (see counters.py)
+    commit or roll back together with the row, and a plain save() of an existing row never writes
+    the counter columns back...those are only ever changed with F() updates
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if self.counter_fields and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.counter_fields
+            ]
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+
+
 # model we are using for the lms Course-->Modules-->lessons
 
-class Course(models.Model):
+class Course(ContentCountersMixin, models.Model):
     """
     defines a particular course
     got also some functions total_lessons, total_modules,
     slug is generated from title if its available
+    module_count, lesson_count, question_count and total_duration are stored counters kept current by signals
     """
     title = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True)
@@ -48,8 +74,12 @@ class Course(models.Model):
     created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='created_courses')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    module_count = models.PositiveIntegerField(default=0, editable=False)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+    total_duration = models.DurationField(default=timedelta, editable=False)
 
-
+    counter_fields = ('module_count', 'lesson_count', 'question_count', 'total_duration')
 
     class Meta:
         ordering = ['-created_at']
@@ -72,21 +102,27 @@ class Course(models.Model):
         return self.title
 
     def total_lessons(self):
-        """calculate tu the total lessons found in a particula module in this particular course"""
-        return Lesson.objects.filter(module__course=self).count()
+        """total lessons found in all the modules of this particular course"""
+        return self.lesson_count
 
     def total_modules(self):
-        return self.modules.count()
+        return self.module_count
 
 
-class Module(models.Model):
+class Module(ContentCountersMixin, models.Model):
     """
     module -defines just the subsection within courses like module1 module2
+    lesson_count, question_count and total_duration are stored counters kept current by signals
     """
     course = models.ForeignKey(Course, related_name='modules', on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     order = models.PositiveIntegerField(default=0)
+    lesson_count = models.PositiveIntegerField(default=0, editable=False)
+    question_count = models.PositiveIntegerField(default=0, editable=False)
+    total_duration = models.DurationField(default=timedelta, editable=False)
+
+    counter_fields = ('lesson_count', 'question_count', 'total_duration')
 
 
     class Meta:
@@ -96,12 +132,6 @@ class Module(models.Model):
     def __str__(self):
         return f"{self.course.title} — {self.title}"
 
-    def lesson_count(self):
-        """
-        number of lessons in this module
-        """
-        return self.lessons.count()
-
     def all_lessons(self):
         """
         lessons in this module
@@ -109,7 +139,7 @@ class Module(models.Model):
         return self.lessons.order_by('order')
 
 
-class Lesson(models.Model):
+class Lesson(ContentCountersMixin, models.Model):
 
 
     """
@@ -128,8 +158,13 @@ class Lesson(models.Model):
     title = models.CharField(max_length=255,db_index=True)
     slug = models.SlugField(max_length=255)
     content_text = models.TextField(blank=True, help_text="HTML or Markdown content")
+    # content_text rendered and sanitized on save, with the hash of the source it came from (rendering.py)
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     video_url = models.URLField(blank=True, null=True)
     infographic = models.ImageField(upload_to='infographics/', blank=True, null=True)
+    # resized copies of the infographic, made after upload (core/images.py)
+    infographic_variants = models.JSONField(default=dict, blank=True, editable=False)
     lesson_type = models.CharField(max_length=20, choices=LESSON_TYPE_CHOICES, default='reading')
     estimated_duration = models.DurationField(null=True, blank=True)  # e.g., 00:05:00
     has_quiz = models.BooleanField(default=True)
@@ -140,21 +175,41 @@ class Lesson(models.Model):
         ordering = ['order']
         unique_together = ('module', 'order')
 
+    def save(self, *args, **kwargs):
+        if render_lesson(self) and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'content_html', 'content_hash'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.module.course.title} / {self.module.title} / {self.title}"
 
+    def get_sequence(self):
+        """the cached, flattened lesson sequence of this lesson's course
+        {lesson_id: {'module_id', 'title', 'previous', 'next'}}"""
+        from .cache import get_lesson_sequence
+        return get_lesson_sequence(self.module.course_id)
+
+    def get_next_lesson_id(self):
+        return self.get_sequence().get(self.pk, {}).get('next')
+
+    def get_previous_lesson_id(self, same_module=True):
+        """id of the lesson just before this one, by default only if it sits in the same module"""
+        sequence = self.get_sequence()
+        previous_id = sequence.get(self.pk, {}).get('previous')
+        if previous_id is not None and same_module and sequence[previous_id]['module_id'] != self.module_id:
+            return None
+        return previous_id
+
     def get_next_lesson(self):
 
         """This function is for getting next lesson in higher order if its available, if not in that modules it
-          checks the next module in higher order and shows first lesson"""
-        
-        next_lesson = Lesson.objects.filter(module=self.module, order__gt=self.order).order_by('order').first()
-        if next_lesson:
-            return next_lesson
-        next_module = Module.objects.filter(course=self.module.course, order__gt=self.module.order).order_by('order').first()
-        if next_module:
-            return next_module.lessons.order_by('order').first()
-        return None
+          checks the next module in higher order and shows first lesson
+          the order comes from the cached course sequence so only the lesson row itself is queried"""
+
+        next_id = self.get_next_lesson_id()
+        if next_id is None:
+            return None
+        return Lesson.objects.filter(pk=next_id).first()
 
 
 class LessonResource(models.Model):
@@ -178,7 +233,7 @@ class LessonResource(models.Model):
 
 #Question and answerss
 
-class Question(models.Model):
+class Question(ContentCountersMixin, models.Model):
     """
     question model which is for questions also you can tick to allow for multiple answers
     """
@@ -245,6 +300,10 @@ class CourseEnrollment(models.Model):
     class Meta:
         """Ensure no duplicate reregistration of same course"""
         unique_together = ('user', 'course')
+        indexes = [
+            # per day counts of the platform stats rollup (platform_stats.py)
+            models.Index(fields=['enrolled_at']),
+        ]
 
 
 class LessonProgress(models.Model):
@@ -259,9 +318,23 @@ class LessonProgress(models.Model):
 
     MAX_ATTEMPTS = 3
     COOLDOWN_HOURS = 12
+    PASS_PERCENTAGE = 75
 
     class Meta:
         unique_together = ('user', 'lesson')
+        indexes = [
+            models.Index(fields=['date_completed']),
+        ]
+
+    @classmethod
+    def attempt_allowed_q(cls, now=None):
+        """can_attempt() as a filter, so the check and the increment can be one UPDATE"""
+        cutoff = (now or timezone.now()) - timedelta(hours=cls.COOLDOWN_HOURS)
+        return (
+            models.Q(attempts__lt=cls.MAX_ATTEMPTS)
+            | models.Q(last_attempted__isnull=True)
+            | models.Q(last_attempted__lte=cutoff)
+        )
 
     def can_attempt(self):
         """conditions for attempting a quiz.....not have exceeded the maximum attempts and if exceeded
@@ -275,34 +348,59 @@ class LessonProgress(models.Model):
         
         return True
 
-    def mark_completed(self, score, points):
-        """tracks progress invoving score from quiz, points"""
-        if not self.can_attempt():
+    def mark_completed(self, score, points, total=None):
+        """tracks progress invoving score from quiz, points
+        total is the number of questions when the caller already knows it
+
+        safe under concurrent submissions for the same row: the row is locked, then the attempt
+        limit/cooldown check and the attempts increment happen in a single conditional UPDATE
+        with F(), so double taps and retries can neither lose an attempt nor get past MAX_ATTEMPTS.
+        the instance is brought up to date from the locked values (no re-read) and the state
+        before the attempt is returned as a dict, callers use it to spot first completions
+        and points changes"""
+        total=(total if total is not None else self.lesson.questions.count()) or 1
+        passed = (score/total)*100 >= self.PASS_PERCENTAGE
+        now = timezone.now()
+
+        changes = {
+            'score': score,
+            'points_awarded': points,
+            'attempts': models.F('attempts') + 1,
+            'last_attempted': now,
+        }
+        if passed:
+            changes.update(completed=True, date_completed=now)
+
+        rows = LessonProgress.objects.filter(pk=self.pk)
+        with transaction.atomic():
+            previous = rows.select_for_update().values(
+                'completed', 'score', 'points_awarded', 'attempts', 'last_attempted', 'date_completed'
+            ).get()
+            updated = rows.filter(self.attempt_allowed_q(now)).update(**changes)
+
+        if not updated:
+            self.attempts = previous['attempts']
+            self.last_attempted = previous['last_attempted']
             raise ValueError("Max attempts reached. Please try Again later. ")
-        
-        
 
         self.score = score
         self.points_awarded = points
-        self.attempts += 1
-        self.last_attempted = timezone.now()
-
-        total=self.lesson.questions.count() or 1
-        percentage=(score/total)*100
-
-        if percentage >= 75:  
-            self.completed = True
-            self.date_completed = timezone.now()
-        self.save()
+        self.attempts = previous['attempts'] + 1
+        self.last_attempted = now
+        self.completed = previous['completed'] or passed
+        self.date_completed = now if passed else previous['date_completed']
+        return previous
 
 
 class ModuleProgress(models.Model):
-    """progress within the module"""
+    """progress within the module
+    lessons_completed is kept current by the rollup engine (rollup.py) as lessons get completed"""
 
     user = models.ForeignKey(User, related_name='module_progresses', on_delete=models.CASCADE)
     module = models.ForeignKey(Module, related_name='progresses', on_delete=models.CASCADE)
     completed = models.BooleanField(default=False)
     date_completed = models.DateTimeField(null=True, blank=True)
+    lessons_completed = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('user', 'module')
@@ -313,7 +411,8 @@ class ModuleProgress(models.Model):
 
 
     def check_mark_completed(self):
-        """checks if all lessons in that particular module are complete"""
+        """checks if all lessons in that particular module are complete
+        full recount...the rollup engine keeps lessons_completed incrementally, this is the repair path"""
 
         if self.completed:
             return
@@ -323,22 +422,30 @@ class ModuleProgress(models.Model):
             lesson__module=self.module,
             completed=True
            ).count()
+        self.lessons_completed = completed_lessons
 
         if total_lessons == completed_lessons and total_lessons > 0:
            self.mark_completed()
+        else:
+           self.save(update_fields=['lessons_completed'])
 
 
     def mark_completed(self):
-        """marks if a module is complete"""
+        """marks if a module is complete and awards the module's badge if it has one"""
         self.completed=True
         self.date_completed=timezone.now()
         self.save()
 
+        badge_id = Badge.objects.filter(module_id=self.module_id).values_list('id', flat=True).first()
+        if badge_id is not None:
+            UserBadge.objects.get_or_create(user_id=self.user_id, badge_id=badge_id)
+
 
    
 
 class CourseProgress(models.Model):
-    """Tracks user's overall progress in a course"""
+    """Tracks user's overall progress in a course
+    modules_completed is kept current by the rollup engine (rollup.py) as modules get completed"""
 
     user = models.ForeignKey(User, related_name='course_progresses', on_delete=models.CASCADE)
     course = models.ForeignKey(Course, related_name='progresses', on_delete=models.CASCADE)
@@ -346,6 +453,7 @@ class CourseProgress(models.Model):
     date_completed = models.DateTimeField(null=True, blank=True)
     certificate_issued = models.BooleanField(default=False)
     certificate_code = models.CharField(max_length=64, blank=True, null=True)
+    modules_completed = models.PositiveIntegerField(default=0)
 
     class Meta:
         unique_together = ('user', 'course')
@@ -353,10 +461,14 @@ class CourseProgress(models.Model):
         constraints = [
               models.UniqueConstraint(fields=['user', 'course'], name='unique_user_course_progress')
                     ]
+        indexes = [
+            models.Index(fields=['date_completed']),
+        ]
 
 
     def check_and_mark_completed(self):
-        """Check if all modules in this course are complete"""
+        """Check if all modules in this course are complete
+        full recount...the rollup engine keeps modules_completed incrementally, this is the repair path"""
 
         if self.completed:
             return
@@ -367,9 +479,12 @@ class CourseProgress(models.Model):
             module__course=self.course,
             completed=True
         ).count()
+        self.modules_completed = completed_modules
 
         if total_modules == completed_modules and total_modules > 0:
             self.mark_completed_and_issue_certificate()
+        else:
+            self.save(update_fields=['modules_completed'])
 
     def mark_completed_and_issue_certificate(self):
         """Mark course as completed and issue certificate"""
@@ -380,6 +495,10 @@ class CourseProgress(models.Model):
         self.certificate_issued = True
         self.save()
 
+        Certificate.objects.get_or_create(
+            user_id=self.user_id, course_id=self.course_id, defaults={'code': self.certificate_code}
+        )
+
 
 
 
@@ -393,6 +512,7 @@ class Badge(models.Model):
     description = models.TextField(blank=True)
     module = models.OneToOneField(Module, related_name='badge', on_delete=models.CASCADE)
     icon = models.ImageField(upload_to='badge/', null=True, blank=True)
+    icon_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -423,11 +543,18 @@ class LearningActivity(models.Model):
     user = models.ForeignKey(User, related_name='activities', on_delete=models.CASCADE)
     action = models.CharField(max_length=50, choices=ACTION_CHOICE)
     lesson = models.ForeignKey(Lesson, null=True, blank=True, on_delete=models.SET_NULL)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # set when the event happens, not when a buffered batch is written (see activity.py)
+    timestamp = models.DateTimeField(default=timezone.now)
     metadata = models.JSONField(null=True, blank=True) 
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # every user scoped read is "this user, recent first" or "this user, this range"
+            models.Index(fields=['user', '-timestamp']),
+            # month range scans of the retention job (retention.py)
+            models.Index(fields=['timestamp']),
+        ]
 
 
 
@@ -440,3 +567,270 @@ class Certificate(models.Model):
 
     def __str__(self):
         return f"Certificate {self.code} for {self.user.username} - {self.course.title}"
+
+
+
+
+# materialized read models
+
+class CourseOutline(models.Model):
+    """
+    serialized course -> modules -> lessons tree of a course (see outline.py).
+    content_version is the course's content version the snapshot was built against,
+    a snapshot from an older version is never served
+    """
+    course = models.OneToOneField(Course, related_name='outline', on_delete=models.CASCADE)
+    content_version = models.BigIntegerField(default=0)
+    content_hash = models.CharField(max_length=64)
+    data = models.JSONField(default=dict)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Outline of {self.course_id} ({self.content_hash[:12]})"
+
+
+class UserAchievementSummary(models.Model):
+    """
+    per-user totals behind the achievements dashboard, kept current by the progress and
+    enrollment writes (see achievements.py) so the dashboard reads a single row
+    """
+    user = models.OneToOneField(User, related_name='achievement_summary', on_delete=models.CASCADE)
+    total_points = models.IntegerField(default=0)
+    lessons_completed = models.PositiveIntegerField(default=0)
+    modules_completed = models.PositiveIntegerField(default=0)
+    courses_enrolled = models.PositiveIntegerField(default=0)
+    current_streak = models.PositiveIntegerField(default=0)
+    last_active_date = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTER_FIELDS = ('total_points', 'lessons_completed', 'modules_completed', 'courses_enrolled')
+    STREAK_FIELDS = ('current_streak', 'last_active_date')
+
+    def streak_on(self, day):
+        """the streak as seen on day...it only counts while the user has been active that day"""
+        return self.current_streak if self.last_active_date == day else 0
+
+    def __str__(self):
+        return f"Achievements of {self.user_id}"
+
+
+
+class QuizAttempt(models.Model):
+    """
+    one graded submission of a lesson's quiz (see attempts.py). answers is stored compactly as
+    {"<question id>": answer id or [answer ids]}, only for the questions the lesson had when graded
+    """
+    user = models.ForeignKey(User, related_name='quiz_attempts', on_delete=models.CASCADE)
+    lesson = models.ForeignKey(Lesson, related_name='quiz_attempts', on_delete=models.CASCADE)
+    answers = models.JSONField(default=dict)
+    score = models.PositiveIntegerField(default=0)
+    total_questions = models.PositiveIntegerField(default=0)
+    passed = models.BooleanField(default=False)
+    started_at = models.DateTimeField(null=True, blank=True)
+    submitted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-submitted_at']
+        indexes = [
+            models.Index(fields=['user', 'lesson', '-submitted_at']),
+            models.Index(fields=['user', '-submitted_at']),
+            models.Index(fields=['submitted_at']),
+        ]
+
+    @property
+    def duration(self):
+        return self.submitted_at - self.started_at if self.started_at else None
+
+    def __str__(self):
+        return f"{self.user_id} on {self.lesson_id}: {self.score}/{self.total_questions}"
+
+
+class PointsLedgerEntry(models.Model):
+    """
+    append-only history of point changes (see points.py). the sum of a user's deltas is their
+    total...UserAchievementSummary.total_points is the running total kept next to it
+    """
+    QUIZ_ATTEMPT = 'quiz_attempt'
+    BACKFILL = 'backfill'
+    ADJUSTMENT = 'adjustment'
+    REGRADE = 'regrade'
+    REASON_CHOICES = [
+        (QUIZ_ATTEMPT, 'Quiz attempt'),
+        (BACKFILL, 'Opening balance'),
+        (ADJUSTMENT, 'Adjustment'),
+        (REGRADE, 'Regrade'),
+    ]
+
+    user = models.ForeignKey(User, related_name='points_ledger', on_delete=models.CASCADE)
+    lesson = models.ForeignKey(Lesson, null=True, blank=True, related_name='points_ledger', on_delete=models.SET_NULL)
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', '-timestamp']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Points ledger entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Points ledger entries are append-only.")
+
+    def __str__(self):
+        return f"{self.user_id} {self.delta:+d} ({self.reason})"
+
+
+class LeaderboardEntry(models.Model):
+    """
+    one user's points on one leaderboard (see leaderboard.py). scope is 'global', 'course:<id>'
+    or 'county:<id>'...ranks are read off the (scope, points) index instead of summing progress rows
+    """
+    GLOBAL = 'global'
+
+    scope = models.CharField(max_length=32)
+    user = models.ForeignKey(User, related_name='leaderboard_entries', on_delete=models.CASCADE)
+    points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'user'], name='unique_leaderboard_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['scope', '-points', 'user']),
+        ]
+
+    @staticmethod
+    def course_scope(course_id):
+        return f"course:{course_id}"
+
+    @staticmethod
+    def county_scope(county_id):
+        return f"county:{county_id}"
+
+    def __str__(self):
+        return f"{self.scope}: {self.user_id} ({self.points})"
+
+
+class LeaderboardScore(models.Model):
+    """
+    how many users of a board have exactly `points`, kept in step with LeaderboardEntry
+    (see leaderboard.py)...a rank sums the few distinct scores above instead of counting every entry
+    """
+    scope = models.CharField(max_length=32)
+    points = models.IntegerField()
+    users = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'points'], name='unique_leaderboard_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}: {self.users} user(s) with {self.points}"
+
+
+class AnalyticsSnapshot(models.Model):
+    """
+    the last computed result of an analytics report (see cohorts.py), e.g. key 'funnel:course:3'.
+    watermark is the time up to which source rows were processed, the next incremental run
+    starts from there
+    """
+    key = models.CharField(max_length=100, unique=True)
+    data = models.JSONField(default=dict)
+    computed_at = models.DateTimeField()
+    watermark = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.key
+
+
+class DailyActivity(models.Model):
+    """
+    number of LearningActivity events per user per day (see activity.py), so streaks and
+    activity calendars read a handful of rows instead of every event the user ever produced
+    """
+    user = models.ForeignKey(User, related_name='daily_activities', on_delete=models.CASCADE)
+    date = models.DateField()
+    activity_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_user_daily_activity')
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} on {self.date}: {self.activity_count}"
+
+
+
+class PlatformDailyStats(models.Model):
+    """
+    platform wide numbers of one day, filled by the rollup_platform_stats command
+    (platform_stats.py) so the dashboards read one row per day instead of scanning the
+    progress and activity tables
+    """
+    date = models.DateField(unique=True)
+    enrollments = models.PositiveIntegerField(default=0)
+    lesson_completions = models.PositiveIntegerField(default=0)
+    course_completions = models.PositiveIntegerField(default=0)
+    active_users = models.PositiveIntegerField(default=0)
+    quiz_attempts = models.PositiveIntegerField(default=0)
+    quiz_passes = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'platform daily stats'
+
+    @property
+    def pass_rate(self):
+        return round(self.quiz_passes / self.quiz_attempts, 4) if self.quiz_attempts else None
+
+    def __str__(self):
+        return f"Platform stats of {self.date}"
+
+
+
+class SearchDocument(models.Model):
+    """
+    one searchable item (course, lesson, lesson resource or article) as plain text (see search.py).
+    search_vector and its GIN index are only used on PostgreSQL, SQLite searches an FTS5 table
+    kept next to this one
+    """
+    COURSE = 'course'
+    LESSON = 'lesson'
+    RESOURCE = 'resource'
+    ARTICLE = 'article'
+    KIND_CHOICES = [
+        (COURSE, 'Course'),
+        (LESSON, 'Lesson'),
+        (RESOURCE, 'Lesson resource'),
+        (ARTICLE, 'Article'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    course_id = models.PositiveIntegerField(null=True, blank=True)
+    title = models.CharField(max_length=255)
+    body = models.TextField(blank=True)
+    published = models.BooleanField(default=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
@@ -0,0 +1,171 @@
+"""
+course outline snapshots.
+
+the static part of the course/module payloads (course -> modules -> lessons with counts,
+resources and badges) is serialized once into CourseOutline and cached under the course's
+content version, so CourseDetailView, ModuleDetailView and UserEnrolledCoursesView only add
+the per-user numbers on top. the sha256 of the document doubles as an ETag.
+
+a snapshot is built eagerly when a course is saved published, and lazily on the first read
+after any content change (the change bumps the content version, see signals.py).
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Prefetch
+
+from . import cache as course_cache
+from .models import Course, CourseOutline, Lesson, Module
+from .serializers import CourseOutlineSerializer
+
+
+OUTLINE_TIMEOUT = 60 * 60 * 24
+
+COURSE_DETAIL_FIELDS = [
+    'id', 'title', 'slug', 'description', 'roles', 'is_published',
+    'created_by', 'created_at', 'updated_at',
+]
+MODULE_LIST_FIELDS = ['id', 'course', 'title', 'description', 'order', 'lesson_count']
+MODULE_DETAIL_FIELDS = ['id', 'course', 'title', 'description', 'order', 'lessons', 'badge']
+
+
+def outline_cache_key(course_id):
+    return f'courses:outline:{course_id}'
+
+
+def content_hash(data):
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_course_outline(course_id, version=None):
+    """serializes the course tree, stores it in CourseOutline and the cache. None if there is no such course"""
+    if version is None:
+        version = course_cache.get_content_version(course_id)
+
+    course = (
+        Course.objects.filter(pk=course_id)
+        .prefetch_related(
+            'roles',
+            Prefetch('modules', queryset=(
+                Module.objects.select_related('badge').order_by('order').prefetch_related(
+                    Prefetch('lessons', queryset=(
+                        Lesson.objects.annotate(questions_count=Count('questions'))
+                        .prefetch_related('resources').order_by('order')
+                    ))
+                )
+            )),
+        )
+        .first()
+    )
+    if course is None:
+        return None
+
+    data = json.loads(json.dumps(CourseOutlineSerializer(course).data, cls=DjangoJSONEncoder))
+    outline = {'hash': content_hash(data), 'data': data}
+    CourseOutline.objects.update_or_create(
+        course_id=course_id,
+        defaults={'content_version': version, 'content_hash': outline['hash'], 'data': data},
+    )
+    course_cache.set_versioned(outline_cache_key(course_id), version, outline, OUTLINE_TIMEOUT)
+    return outline
+
+
+def get_course_outline(course_id):
+    """{'hash': ..., 'data': {...}} for the current content version of the course, or None"""
+    version, outline = course_cache.get_versioned(
+        outline_cache_key(course_id), course_cache.content_version_key(course_id)
+    )
+    if outline is not None:
+        return outline
+
+    row = CourseOutline.objects.filter(course_id=course_id, content_version=version).values(
+        'content_hash', 'data'
+    ).first()
+    if row is None:
+        return build_course_outline(course_id, version)
+
+    outline = {'hash': row['content_hash'], 'data': row['data']}
+    course_cache.set_versioned(outline_cache_key(course_id), version, outline, OUTLINE_TIMEOUT)
+    return outline
+
+
+def get_course_outlines(course_ids):
+    """
+    {course_id: outline or None} like get_course_outline, with one get_many for the cached ones
+    and one query for the snapshots of the rest
+    """
+    keys = {outline_cache_key(course_id): course_id for course_id in course_ids}
+    found = course_cache.get_versioned_many(
+        {key: course_cache.content_version_key(course_id) for key, course_id in keys.items()}
+    )
+    outlines = {}
+    missing = {}
+    for key, (version, course_outline) in found.items():
+        if course_outline is None:
+            missing[keys[key]] = version
+        else:
+            outlines[keys[key]] = course_outline
+    if not missing:
+        return outlines
+
+    rows = CourseOutline.objects.filter(course_id__in=missing).values_list(
+        'course_id', 'content_version', 'content_hash', 'data'
+    )
+    loaded = {}
+    for course_id, version, digest, data in rows:
+        if missing[course_id] == version:
+            outlines[course_id] = {'hash': digest, 'data': data}
+            loaded[outline_cache_key(course_id)] = (version, outlines[course_id])
+    course_cache.set_versioned_many(loaded, OUTLINE_TIMEOUT)
+    for course_id, version in missing.items():
+        if course_id not in outlines:
+            outlines[course_id] = build_course_outline(course_id, version)
+    return outlines
+
+
+def _absolute(request, url):
+    if url and request is not None and url.startswith('/'):
+        return request.build_absolute_uri(url)
+    return url
+
+
+def course_detail(outline, completed_lessons):
+    """CourseDetailSerializer shaped payload. completed_lessons maps module id -> completed lesson count"""
+    data = outline['data']
+    payload = {field: data[field] for field in COURSE_DETAIL_FIELDS}
+    payload['modules'] = [module_entry(module, completed_lessons) for module in data['modules']]
+    return payload
+
+
+def module_entry(module, completed_lessons):
+    """ModuleListSerializer shaped entry"""
+    entry = {field: module[field] for field in MODULE_LIST_FIELDS}
+    entry['completed_lessons'] = completed_lessons.get(module['id'], 0)
+    return entry
+
+
+def find_module(outline, module_id):
+    return next((module for module in outline['data']['modules'] if module['id'] == module_id), None)
+
+
+def module_detail(module, request=None):
+    """ModuleDetailSerializer shaped payload, file urls made absolute like DRF does with a request"""
+    payload = {field: module[field] for field in MODULE_DETAIL_FIELDS}
+    payload['lessons'] = [
+        {**lesson, 'resources': [
+            {**resource, 'file': _absolute(request, resource['file'])} for resource in lesson['resources']
+        ]}
+        for lesson in module['lessons']
+    ]
+    if payload['badge']:
+        badge = payload['badge']
+        payload['badge'] = {
+            **badge,
+            'icon': _absolute(request, badge['icon']),
+            'icon_variants': [
+                {**variant, 'url': _absolute(request, variant['url'])} for variant in badge.get('icon_variants', [])
+            ],
+        }
+    return payload
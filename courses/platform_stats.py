@@ -0,0 +1,121 @@
+"""
+daily platform statistics.
+
+PlatformDailyStats holds one row per day: new enrollments, lesson and course completions,
+active users (DailyActivity rows of the day) and quiz attempts/passes. refresh() only recounts
+the newest days, from the last stored day (it was probably counted before the day was over)
+up to today, with one grouped query per source table over that range. rows are upserted by
+date, so running it again just recounts the same days.
+
+a day keeps the numbers the tables had when it was last counted; if older rows change (e.g.
+a regrade moves completions) refresh(start=...) recounts from that day on. dashboards read
+the last DASHBOARD_DAYS rows with one query on the date index (recent()).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.timezone import localdate
+
+from .models import (
+    CourseEnrollment, CourseProgress, DailyActivity, LessonProgress, PlatformDailyStats, QuizAttempt,
+)
+
+
+DASHBOARD_DAYS = 90
+MAX_DAYS = 366
+
+STAT_FIELDS = [
+    'enrollments', 'lesson_completions', 'course_completions', 'active_users', 'quiz_attempts', 'quiz_passes',
+]
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _per_day(queryset, field, start, end, **counts):
+    """{date: {name: count}} for the rows whose field falls in [start, end], grouped in the database"""
+    rows = (
+        queryset.filter(**{f'{field}__gte': _day_start(start), f'{field}__lt': _day_start(end + timedelta(days=1))})
+        .annotate(day=TruncDate(field)).order_by().values('day').annotate(**counts)
+    )
+    return {row.pop('day'): row for row in rows}
+
+
+def compute_days(start, end):
+    """a PlatformDailyStats (not saved) for every day from start to end, days without data included"""
+    sources = [
+        _per_day(CourseEnrollment.objects.all(), 'enrolled_at', start, end, enrollments=Count('pk')),
+        _per_day(LessonProgress.objects.filter(completed=True), 'date_completed', start, end,
+                 lesson_completions=Count('pk')),
+        _per_day(CourseProgress.objects.filter(completed=True), 'date_completed', start, end,
+                 course_completions=Count('pk')),
+        _per_day(QuizAttempt.objects.all(), 'submitted_at', start, end,
+                 quiz_attempts=Count('pk'), quiz_passes=Count('pk', filter=Q(passed=True))),
+    ]
+    active = dict(
+        DailyActivity.objects.filter(date__range=(start, end))
+        .order_by().values('date').annotate(users=Count('user_id')).values_list('date', 'users')
+    )
+
+    days = []
+    day = start
+    while day <= end:
+        stats = PlatformDailyStats(date=day, active_users=active.get(day, 0))
+        for source in sources:
+            for name, value in source.get(day, {}).items():
+                setattr(stats, name, value)
+        days.append(stats)
+        day += timedelta(days=1)
+    return days
+
+
+def refresh(start=None, end=None):
+    """
+    recounts the days from start (default: the last stored day, or the dashboard window on the
+    first run) to end (default: today). returns the number of days written
+    """
+    end = end or localdate()
+    if start is None:
+        last = PlatformDailyStats.objects.order_by('-date').values_list('date', flat=True).first()
+        start = last if last is not None else end - timedelta(days=DASHBOARD_DAYS - 1)
+    if start > end:
+        return 0
+
+    days = compute_days(start, end)
+    now = timezone.now()
+    for stats in days:
+        # bulk_create doesn't run auto_now
+        stats.computed_at = now
+    PlatformDailyStats.objects.bulk_create(
+        days,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=STAT_FIELDS + ['computed_at'],
+        batch_size=500,
+    )
+    return len(days)
+
+
+def recent(days=DASHBOARD_DAYS):
+    """the stored rows of the last `days` days (today included), oldest first"""
+    since = localdate() - timedelta(days=days - 1)
+    return list(PlatformDailyStats.objects.filter(date__gte=since).order_by('date'))
+
+
+def as_dict(stats):
+    return {
+        'date': stats.date,
+        **{name: getattr(stats, name) for name in STAT_FIELDS},
+        'pass_rate': stats.pass_rate,
+    }
+
+
+def totals(rows):
+    """sums over a list of rows, active users as the daily average"""
+    summed = {name: sum(getattr(stats, name) for stats in rows) for name in STAT_FIELDS}
+    summed['active_users'] = round(summed['active_users'] / len(rows), 1) if rows else 0
+    summed['pass_rate'] = round(summed['quiz_passes'] / summed['quiz_attempts'], 4) if summed['quiz_attempts'] else None
+    return summed
@@ -0,0 +1,90 @@
+"""
+points ledger.
+
+every change of a user's points is appended to PointsLedgerEntry, and in the same transaction
+the running total on UserAchievementSummary and the leaderboards are shifted by the same delta.
+a total is therefore a single row read, and the ledger keeps the history that
+LessonProgress.points_awarded (only the latest score) doesn't. audit() checks the two agree.
+"""
+from django.db import transaction
+from django.db.models import Sum
+
+from . import achievements
+from . import leaderboard
+from .models import LessonProgress, Module, PointsLedgerEntry, UserAchievementSummary
+
+
+AUDIT_BATCH_SIZE = 1000
+
+
+def award_points(user_id, delta, reason, lesson_id=None):
+    """records a point change and moves the totals. returns the ledger entry, None when delta is 0"""
+    if not delta:
+        return None
+    with transaction.atomic():
+        entry = PointsLedgerEntry.objects.create(user_id=user_id, lesson_id=lesson_id, delta=delta, reason=reason)
+        achievements.bump_summary(user_id, total_points=delta)
+        leaderboard.add_points(user_id, lesson_id, delta)
+    return entry
+
+
+def remove_lesson_points(lesson_id):
+    """
+    takes back the points a lesson awarded, before the lesson (and its progress rows) are deleted:
+    one adjustment per user in the ledger, and the totals and leaderboards moved by the same delta
+    """
+    points = dict(
+        LessonProgress.objects.filter(lesson_id=lesson_id).exclude(points_awarded=0)
+        .values_list('user_id', 'points_awarded')
+    )
+    if not points:
+        return
+    course_id = Module.objects.filter(lessons=lesson_id).values_list('course_id', flat=True).first()
+    with transaction.atomic():
+        # no lesson on the entries...the lesson is about to go
+        PointsLedgerEntry.objects.bulk_create([
+            PointsLedgerEntry(user_id=user_id, delta=-awarded, reason=PointsLedgerEntry.ADJUSTMENT)
+            for user_id, awarded in points.items()
+        ])
+        for user_id, awarded in points.items():
+            achievements.bump_summary(user_id, total_points=-awarded)
+        leaderboard.remove_points(course_id, points)
+
+
+def ledger_totals(user_ids):
+    """{user_id: sum of deltas} for the users that have ledger entries"""
+    return dict(
+        PointsLedgerEntry.objects.filter(user_id__in=user_ids)
+        .values('user_id').annotate(total=Sum('delta')).values_list('user_id', 'total')
+    )
+
+
+def audit(batch_size=AUDIT_BATCH_SIZE, fix=False):
+    """
+    compares ledger sums with the stored totals, batch_size users at a time (two grouped
+    queries per batch). returns ([(user_id, ledger_total, stored_total)], users checked).
+    with fix=True the stored totals are set to the ledger sums
+    """
+    user_ids = set(UserAchievementSummary.objects.values_list('user_id', flat=True))
+    user_ids |= set(PointsLedgerEntry.objects.values_list('user_id', flat=True).distinct())
+    user_ids = sorted(user_ids)
+    mismatches = []
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        ledger = ledger_totals(batch)
+        stored = dict(
+            UserAchievementSummary.objects.filter(user_id__in=batch).values_list('user_id', 'total_points')
+        )
+        wrong = [
+            (user_id, ledger.get(user_id, 0), stored.get(user_id))
+            for user_id in batch if ledger.get(user_id, 0) != stored.get(user_id, 0)
+        ]
+        mismatches += wrong
+        if fix and wrong:
+            with transaction.atomic():
+                for user_id, total, _ in wrong:
+                    if not UserAchievementSummary.objects.filter(user_id=user_id).update(total_points=total):
+                        achievements.get_summary(user_id)
+
+    return mismatches, len(user_ids)
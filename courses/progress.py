@@ -0,0 +1,26 @@
+"""
+per-user progress overlays.
+
+listings are built from shared, cacheable data (the outline snapshot, module rows) and the
+user's own numbers are laid over them afterwards, fetched for every requested module in one
+grouped query instead of one count per module.
+"""
+from django.db.models import Count
+
+from .models import LessonProgress
+
+
+def completed_lessons_by_module(user, module_ids=None, course_ids=None):
+    """module id -> number of lessons the user completed in it, in a single grouped query"""
+    queryset = LessonProgress.objects.filter(user=user, completed=True)
+    if module_ids is not None:
+        if not module_ids:
+            return {}
+        queryset = queryset.filter(lesson__module_id__in=module_ids)
+    if course_ids is not None:
+        if not course_ids:
+            return {}
+        queryset = queryset.filter(lesson__module__course_id__in=course_ids)
+    return dict(
+        queryset.values('lesson__module_id').annotate(n=Count('id')).values_list('lesson__module_id', 'n')
+    )
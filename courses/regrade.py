@@ -0,0 +1,149 @@
+"""
+bulk regrading of a lesson after its answer key was fixed.
+
+the stored attempts of the lesson (QuizAttempt) are streamed ordered by user, chunk_size rows
+at a time, and graded against the current key. per user the latest attempt gives the score and
+points, and the lesson counts as completed if any attempt passes, like mark_completed() does.
+attempts and LessonProgress rows are written back with bulk_update; point changes go to the
+ledger and the totals/leaderboards of the affected users are recounted in bulk.
+
+progress rows without any stored attempt (graded before attempts were kept) can't be
+regraded and are left alone, and a completion earned in an attempt that wasn't kept is never
+taken back.
+"""
+from django.db import transaction
+
+from . import achievements
+from . import grading
+from . import leaderboard
+from . import rollup
+from .models import Lesson, LessonProgress, PointsLedgerEntry, QuizAttempt
+
+
+REGRADE_CHUNK_SIZE = 2000
+
+
+def _passes(score, total):
+    return (score / (total or 1)) * 100 >= LessonProgress.PASS_PERCENTAGE
+
+
+def _grade_user_attempts(answer_key, attempts):
+    """
+    regrades one user's attempts (oldest first) in place.
+    returns (latest score, last passing attempt time, number of attempts)
+    """
+    total = len(answer_key)
+    passed_at = None
+    for attempt in attempts:
+        attempt.score = grading.grade(answer_key, attempt.answers)
+        attempt.total_questions = total
+        attempt.passed = _passes(attempt.score, total)
+        if attempt.passed:
+            passed_at = attempt.submitted_at
+    return attempts[-1].score, passed_at, len(attempts)
+
+
+def _apply(lesson, results, report):
+    """writes back the progress of one chunk of users, results is {user_id: (score, passed_at, attempts)}"""
+    with transaction.atomic():
+        # the same row locks mark_completed() takes, so a submission can't land between the read
+        # of points_awarded and the write of the regraded score (and its ledger delta)
+        progresses = list(
+            LessonProgress.objects.select_for_update().filter(lesson_id=lesson.pk, user_id__in=results)
+            .order_by('pk')
+            .only('id', 'user_id', 'score', 'points_awarded', 'completed', 'date_completed', 'attempts')
+        )
+        changed, ledger, newly_passed, newly_failed = [], [], [], []
+        for progress in progresses:
+            score, passed_at, stored_attempts = results[progress.user_id]
+            if passed_at is None and progress.completed and stored_attempts < progress.attempts:
+                # passed in an attempt from before the history was kept
+                passed_at = progress.date_completed
+            completed = passed_at is not None
+            if (progress.score, progress.completed) == (score, completed):
+                continue
+
+            if score != progress.points_awarded:
+                ledger.append(PointsLedgerEntry(
+                    user_id=progress.user_id, lesson_id=lesson.pk,
+                    delta=score - progress.points_awarded, reason=PointsLedgerEntry.REGRADE,
+                ))
+            if completed and not progress.completed:
+                newly_passed.append(progress.user_id)
+            elif progress.completed and not completed:
+                newly_failed.append(progress.user_id)
+
+            progress.score = progress.points_awarded = score
+            progress.completed = completed
+            progress.date_completed = passed_at
+            changed.append(progress)
+
+        if not changed:
+            return
+        user_ids = [progress.user_id for progress in changed]
+        LessonProgress.objects.bulk_update(changed, ['score', 'points_awarded', 'completed', 'date_completed'])
+        PointsLedgerEntry.objects.bulk_create(ledger)
+        achievements.rebuild_summaries(user_ids)
+        leaderboard.rebuild(user_ids)
+        for user_id in newly_passed:
+            rollup.record_lesson_completion(user_id, lesson)
+        for user_id in newly_failed:
+            rollup.record_lesson_uncompletion(user_id, lesson)
+
+    report['progress_changed'] += len(changed)
+    report['newly_passed'] += len(newly_passed)
+    report['newly_failed'] += len(newly_failed)
+
+
+def regrade_lesson(lesson_id, chunk_size=REGRADE_CHUNK_SIZE):
+    """
+    regrades every stored attempt of the lesson against its current answer key.
+    returns {'attempts', 'attempts_changed', 'users', 'progress_changed', 'newly_passed', 'newly_failed'}
+    """
+    lesson = Lesson.objects.only('id', 'module_id').get(pk=lesson_id)
+    grading.invalidate_answer_key(lesson_id)
+    answer_key = grading.get_answer_key(lesson_id)
+
+    report = dict.fromkeys(
+        ('attempts', 'attempts_changed', 'users', 'progress_changed', 'newly_passed', 'newly_failed'), 0
+    )
+    rows = (
+        QuizAttempt.objects.filter(lesson_id=lesson_id)
+        .order_by('user_id', 'submitted_at', 'pk')
+        .only('id', 'user_id', 'answers', 'score', 'total_questions', 'passed', 'submitted_at')
+        .iterator(chunk_size=chunk_size)
+    )
+    changed_attempts = []
+    results = {}
+    user_attempts = []
+
+    def finish_user():
+        before = [(attempt.score, attempt.total_questions, attempt.passed) for attempt in user_attempts]
+        results[user_attempts[0].user_id] = _grade_user_attempts(answer_key, user_attempts)
+        changed_attempts.extend(
+            attempt for attempt, old in zip(user_attempts, before)
+            if (attempt.score, attempt.total_questions, attempt.passed) != old
+        )
+        report['users'] += 1
+
+    def flush():
+        if changed_attempts:
+            QuizAttempt.objects.bulk_update(changed_attempts, ['score', 'total_questions', 'passed'], batch_size=500)
+            report['attempts_changed'] += len(changed_attempts)
+            changed_attempts.clear()
+        if results:
+            _apply(lesson, results, report)
+            results.clear()
+
+    for attempt in rows:
+        report['attempts'] += 1
+        if user_attempts and attempt.user_id != user_attempts[0].user_id:
+            finish_user()
+            user_attempts = []
+            if len(results) >= chunk_size or len(changed_attempts) >= chunk_size:
+                flush()
+        user_attempts.append(attempt)
+    if user_attempts:
+        finish_user()
+    flush()
+    return report
@@ -0,0 +1,105 @@
+"""
+lesson content rendering.
+
+content_text is Markdown (plain HTML passes through Markdown untouched). it is rendered once
+when the lesson is saved: Markdown -> HTML, then bleach.clean with an allowlist like the one
+the articles use, and stored in content_html together with a hash of the source. clients get
+the stored html and never have to parse or sanitize anything themselves.
+
+the hash covers the source and RENDER_VERSION, so bumping the version (new allowlist, new
+extensions) makes render_lessons() re-render every lesson. rendering is pure text work, the
+backfill spreads it over worker processes.
+"""
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import bleach
+import markdown
+
+
+RENDER_VERSION = 1
+RENDER_BATCH_SIZE = 500
+
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+ALLOWED_TAGS = [
+    'p', 'br', 'hr', 'b', 'i', 'strong', 'em', 'a', 'img', 'ul', 'ol', 'li', 'blockquote',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'pre', 'code', 'table', 'thead', 'tbody', 'tr', 'th', 'td',
+]
+ALLOWED_ATTRIBUTES = {
+    'a': ['href', 'title'],
+    'img': ['src', 'alt', 'title'],
+    'th': ['align'],
+    'td': ['align'],
+}
+ALLOWED_PROTOCOLS = ['http', 'https', 'mailto']
+
+
+def content_hash(text):
+    return hashlib.sha256(f'{RENDER_VERSION}:{text or ""}'.encode()).hexdigest()
+
+
+def render_content(text):
+    html = markdown.markdown(text or '', extensions=MARKDOWN_EXTENSIONS)
+    return bleach.clean(
+        html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, protocols=ALLOWED_PROTOCOLS, strip=True,
+    )
+
+
+def render_lesson(lesson):
+    """refreshes lesson.content_html/content_hash in place if the source changed. returns True if it did"""
+    digest = content_hash(lesson.content_text)
+    if digest == lesson.content_hash:
+        return False
+    lesson.content_html = render_content(lesson.content_text)
+    lesson.content_hash = digest
+    return True
+
+
+def lesson_html(lesson):
+    """
+    the html to serve. save() renders a lesson and migration 0019 rendered the ones from before,
+    so this only renders on the spot for rows written around save() (raw sql, a queryset update)
+    """
+    if lesson.content_hash:
+        return lesson.content_html
+    return render_content(lesson.content_text)
+
+
+def _render_batch(lessons, pool):
+    texts = [lesson.content_text for lesson in lessons]
+    rendered = pool.map(render_content, texts, chunksize=25) if pool else map(render_content, texts)
+    for lesson, html in zip(lessons, rendered):
+        lesson.content_html = html
+        lesson.content_hash = content_hash(lesson.content_text)
+
+
+def render_lessons(lesson_ids=None, workers=None, batch_size=RENDER_BATCH_SIZE, force=False):
+    """
+    renders the lessons whose stored html is missing or out of date (every lesson with force),
+    batch_size at a time, the markdown/bleach work on `workers` processes (1 = in process).
+    returns the number of lessons rendered
+    """
+    from .models import Lesson
+
+    lessons = Lesson.objects.order_by('pk').only('id', 'content_text', 'content_hash')
+    if lesson_ids is not None:
+        lessons = lessons.filter(pk__in=lesson_ids)
+
+    rendered, last = 0, 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        # paged on the id rather than iterator(), so no cursor stays open while we write
+        while True:
+            page = list(lessons.filter(pk__gt=last)[:batch_size])
+            if not page:
+                break
+            last = page[-1].pk
+            batch = [lesson for lesson in page if force or lesson.content_hash != content_hash(lesson.content_text)]
+            if batch:
+                _render_batch(batch, pool)
+                Lesson.objects.bulk_update(batch, ['content_html', 'content_hash'])
+                rendered += len(batch)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return rendered
@@ -0,0 +1,95 @@
+"""
+retention of the LearningActivity event log.
+
+the live table only keeps the last ACTIVITY_RETENTION_MONTHS calendar months. older months are
+moved, one month at a time, into learning_activity-YYYY-MM.ndjson.gz files under
+ACTIVITY_ARCHIVE_DIR: each batch is appended to the file and flushed before its rows are
+deleted, so an interrupted run loses nothing (at worst a batch shows up twice in the archive)
+and memory stays flat whatever the size of the month. streaks and calendars read DailyActivity,
+which is not touched.
+"""
+import gzip
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LearningActivity
+
+
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_FIELDS = ('id', 'user_id', 'action', 'lesson_id', 'timestamp', 'metadata')
+
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(moment, months):
+    index = moment.year * 12 + moment.month - 1 + months
+    return moment.replace(year=index // 12, month=index % 12 + 1)
+
+
+def retention_cutoff(months, now=None):
+    """start of the oldest month that stays in the live table (the current month counts as one)"""
+    return add_months(month_start(timezone.localtime(now)), 1 - months)
+
+
+def archive_path(directory, month):
+    return Path(directory) / f"learning_activity-{month:%Y-%m}.ndjson.gz"
+
+
+def oldest_month_before(cutoff):
+    """first day of the oldest month with live events before cutoff, or None"""
+    first = LearningActivity.objects.filter(timestamp__lt=cutoff).order_by('timestamp').values_list(
+        'timestamp', flat=True
+    ).first()
+    return month_start(timezone.localtime(first)) if first is not None else None
+
+
+def archive_month(month, directory, batch_size=ARCHIVE_BATCH_SIZE):
+    """moves the events of one month to its archive file. returns the number of events moved"""
+    end = add_months(month, 1)
+    rows = LearningActivity.objects.filter(timestamp__gte=month, timestamp__lt=end).order_by('pk')
+    path = archive_path(directory, month)
+    moved = 0
+    last_pk = 0
+
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk).values(*ARCHIVE_FIELDS)[:batch_size])
+        if not batch:
+            return moved
+        if moved == 0:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        # appending adds a gzip member per batch...gzip readers treat the file as one stream
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in batch:
+                archive.write(json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')) + '\n')
+        last_pk = batch[-1]['id']
+        with transaction.atomic():
+            LearningActivity.objects.filter(pk__in=[row['id'] for row in batch]).delete()
+        moved += len(batch)
+
+
+def archive_old_activity(months=None, directory=None, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    """archives every month older than the retention window. returns [(month, events moved)]"""
+    months = settings.ACTIVITY_RETENTION_MONTHS if months is None else months
+    directory = directory or settings.ACTIVITY_ARCHIVE_DIR
+    cutoff = retention_cutoff(months, now)
+    archived = []
+    # months without events are skipped by asking for the oldest remaining one each time
+    month = oldest_month_before(cutoff)
+    while month is not None:
+        archived.append((month, archive_month(month, directory, batch_size)))
+        month = oldest_month_before(cutoff)
+    return archived
+
+
+def read_archive(path):
+    """yields the events of an archive file as dicts"""
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
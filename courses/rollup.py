@@ -0,0 +1,59 @@
+"""
+incremental progress rollup.
+
+when a lesson is completed for the first time the user's ModuleProgress.lessons_completed is
+bumped and compared with the module's stored lesson_count; a module that fills up is completed
+(awarding its badge) and bumps CourseProgress.modules_completed, which is compared with the
+course's module_count in turn (issuing the certificate). every step touches one locked row,
+so a completion costs a small constant number of queries instead of recounting progress rows.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from . import achievements
+from .models import Course, Module, ModuleProgress, CourseProgress
+
+
+def _locked_progress(model, **lookup):
+    model.objects.get_or_create(**lookup)
+    return model.objects.select_for_update().get(**lookup)
+
+
+def record_lesson_completion(user_id, lesson):
+    """
+    rolls a first-time lesson completion up into module and course progress.
+    returns {'module_completed': bool, 'course_completed': bool}
+    """
+    result = {'module_completed': False, 'course_completed': False}
+    module = Module.objects.only('id', 'course_id', 'lesson_count').get(pk=lesson.module_id)
+
+    with transaction.atomic():
+        module_progress = _locked_progress(ModuleProgress, user_id=user_id, module_id=module.pk)
+        module_progress.lessons_completed += 1
+        if module_progress.completed or module_progress.lessons_completed < module.lesson_count:
+            module_progress.save(update_fields=['lessons_completed'])
+            return result
+        module_progress.mark_completed()
+        achievements.bump_summary(user_id, modules_completed=1)
+        result['module_completed'] = True
+
+        module_count = Course.objects.filter(pk=module.course_id).values_list('module_count', flat=True).get()
+        course_progress = _locked_progress(CourseProgress, user_id=user_id, course_id=module.course_id)
+        course_progress.modules_completed += 1
+        if course_progress.completed or course_progress.modules_completed < module_count:
+            course_progress.save(update_fields=['modules_completed'])
+            return result
+        course_progress.mark_completed_and_issue_certificate()
+        result['course_completed'] = True
+
+    return result
+
+
+def record_lesson_uncompletion(user_id, lesson):
+    """
+    a regrade took a completion back (regrade.py)...the module count goes down with it, badges
+    and certificates that were already earned are kept
+    """
+    ModuleProgress.objects.filter(
+        user_id=user_id, module_id=lesson.module_id, lessons_completed__gt=0
+    ).update(lessons_completed=F('lessons_completed') - 1)
@@ -0,0 +1,274 @@
+"""
+full-text search over courses, lessons, lesson resources and articles.
+
+every searchable object has a SearchDocument row with its text (html stripped), the course it
+belongs to and whether it is visible (published, and its course too). the rows are written by
+the save/delete signals with bulk upserts, so bulk paths (import_course, rebuild) use the same
+code. the text index itself depends on the database:
+
+- PostgreSQL: search_vector (title weighted A, body B) with a GIN index, queried with
+  websearch_to_tsquery, ranked with ts_rank and highlighted with ts_headline
+- SQLite (tests, local dev): an FTS5 table with the same ids, ranked with bm25() and
+  highlighted with snippet()
+- anything else: icontains on title and body, unranked
+
+snippets come back from the database with control characters around the matches and are
+escaped here before those become <mark> tags, so the page never gets html from the content.
+"""
+import os
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.html import escape, strip_tags
+
+from articles.models import Post
+from .models import Course, Lesson, LessonResource, SearchDocument
+
+
+FTS_TABLE = 'courses_searchdocument_fts'
+SEARCH_CONFIG = getattr(settings, 'SEARCH_CONFIG', 'english')
+INDEX_BATCH_SIZE = 500
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+SNIPPET_WORDS = 24
+# title matches count ten times as much as body matches (sqlite, postgres uses the A/B weights)
+BM25_WEIGHTS = (10.0, 1.0)
+
+_START, _STOP = '\x02', '\x03'
+
+
+def _text(html):
+    return re.sub(r'\s+', ' ', strip_tags(html or '')).strip()
+
+
+def _course_fields(course):
+    return {
+        'course_id': course.pk, 'title': course.title, 'body': _text(course.description),
+        'published': course.is_published,
+    }
+
+
+def _lesson_fields(lesson):
+    course = lesson.module.course
+    return {
+        'course_id': course.pk, 'title': lesson.title, 'body': _text(lesson.content_text),
+        'published': lesson.is_published and course.is_published,
+    }
+
+
+def _resource_fields(resource):
+    lesson = resource.lesson
+    course = lesson.module.course
+    return {
+        'course_id': course.pk,
+        'title': resource.description or os.path.basename(resource.file.name),
+        'body': resource.description,
+        'published': lesson.is_published and course.is_published,
+    }
+
+
+def _article_fields(post):
+    return {'course_id': None, 'title': post.title, 'body': _text(post.content), 'published': post.published}
+
+
+# kind -> (queryset with the joins the fields need, fields of one object)
+SOURCES = {
+    SearchDocument.COURSE: (lambda: Course.objects.all(), _course_fields),
+    SearchDocument.LESSON: (lambda: Lesson.objects.select_related('module__course'), _lesson_fields),
+    SearchDocument.RESOURCE: (lambda: LessonResource.objects.select_related('lesson__module__course'), _resource_fields),
+    SearchDocument.ARTICLE: (lambda: Post.objects.all(), _article_fields),
+}
+KINDS = list(SOURCES)
+
+
+# indexing
+
+def _documents(kind, object_ids):
+    return SearchDocument.objects.filter(kind=kind, object_id__in=object_ids)
+
+
+def _refresh_text_index(kind, object_ids):
+    documents = _documents(kind, object_ids)
+    if connection.vendor == 'postgresql':
+        documents.update(
+            search_vector=SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('body', weight='B', config=SEARCH_CONFIG)
+        )
+    elif connection.vendor == 'sqlite':
+        rows = list(documents.values_list('id', 'title', 'body'))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)', rows)
+
+
+def index_objects(kind, objects):
+    """writes (or rewrites) the documents of the objects, all of one kind"""
+    if not objects:
+        return 0
+    fields = SOURCES[kind][1]
+    now = timezone.now()
+    documents = []
+    for obj in objects:
+        document = SearchDocument(kind=kind, object_id=obj.pk, updated_at=now, **fields(obj))
+        document.title = document.title[:255]
+        documents.append(document)
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['kind', 'object_id'],
+        update_fields=['course_id', 'title', 'body', 'published', 'updated_at'],
+    )
+    _refresh_text_index(kind, [obj.pk for obj in objects])
+    return len(documents)
+
+
+def index_queryset(kind, queryset, batch_size=INDEX_BATCH_SIZE):
+    batch, indexed = [], 0
+    for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            indexed += index_objects(kind, batch)
+            batch = []
+    return indexed + index_objects(kind, batch)
+
+
+def remove(kind, object_ids):
+    documents = _documents(kind, object_ids)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(pk,) for pk in documents.values_list('id', flat=True)]
+            )
+    documents.delete()
+
+
+def _source(kind):
+    return SOURCES[kind][0]()
+
+
+def reindex_course(course_id, children=True):
+    """the course, and with children its lessons and resources, whose visibility follows the course"""
+    index_objects(SearchDocument.COURSE, list(_source(SearchDocument.COURSE).filter(pk=course_id)))
+    if not children:
+        return
+    index_queryset(SearchDocument.LESSON, _source(SearchDocument.LESSON).filter(module__course_id=course_id))
+    index_queryset(SearchDocument.RESOURCE, _source(SearchDocument.RESOURCE).filter(lesson__module__course_id=course_id))
+
+
+def reindex_module(module_id):
+    index_queryset(SearchDocument.LESSON, _source(SearchDocument.LESSON).filter(module_id=module_id))
+    index_queryset(SearchDocument.RESOURCE, _source(SearchDocument.RESOURCE).filter(lesson__module_id=module_id))
+
+
+def reindex_lesson(lesson):
+    index_objects(SearchDocument.LESSON, [lesson])
+    index_queryset(SearchDocument.RESOURCE, _source(SearchDocument.RESOURCE).filter(lesson=lesson))
+
+
+def rebuild(batch_size=INDEX_BATCH_SIZE):
+    """reindexes everything and drops documents of deleted objects. returns {kind: documents}"""
+    counts = {}
+    for kind in SOURCES:
+        counts[kind] = index_queryset(kind, _source(kind), batch_size)
+        existing = _source(kind).values('pk')
+        stale = list(
+            SearchDocument.objects.filter(kind=kind).exclude(object_id__in=existing).values_list('object_id', flat=True)
+        )
+        if stale:
+            remove(kind, stale)
+    return counts
+
+
+# querying
+
+def _terms(query):
+    return re.findall(r'\w+', query or '')
+
+
+def _highlight(snippet):
+    return escape(snippet or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def _visible(kinds):
+    documents = SearchDocument.objects.filter(published=True)
+    return documents.filter(kind__in=kinds) if kinds else documents
+
+
+def _search_postgresql(query, kinds, limit, offset):
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    documents = _visible(kinds).filter(search_vector=search_query)
+    rows = (
+        documents.annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+            snippet=SearchHeadline(
+                'body', search_query, config=SEARCH_CONFIG, start_sel=_START, stop_sel=_STOP,
+                max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2,
+            ),
+        )
+        .order_by('-rank', 'pk')
+        .values('kind', 'object_id', 'course_id', 'title', 'rank', 'snippet')[offset:offset + limit]
+    )
+    return documents.count(), list(rows)
+
+
+def _search_sqlite(query, kinds, limit, offset):
+    # every word as a quoted string: all of them must match, and the user can't write fts syntax
+    match = ' '.join('"%s"' % term for term in _terms(query))
+    base = (
+        f'FROM {FTS_TABLE} JOIN courses_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+        f'WHERE {FTS_TABLE} MATCH %s AND d.published'
+    )
+    params = [match]
+    if kinds:
+        base += f" AND d.kind IN ({', '.join(['%s'] * len(kinds))})"
+        params += list(kinds)
+    bm25 = f'bm25({FTS_TABLE}, {BM25_WEIGHTS[0]}, {BM25_WEIGHTS[1]})'
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) {base}', params)
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"SELECT d.kind, d.object_id, d.course_id, d.title, -{bm25}, "
+            f"snippet({FTS_TABLE}, -1, %s, %s, '…', %s) {base} ORDER BY {bm25}, d.id LIMIT %s OFFSET %s",
+            [_START, _STOP, SNIPPET_WORDS, *params, limit, offset],
+        )
+        columns = ['kind', 'object_id', 'course_id', 'title', 'rank', 'snippet']
+        return total, [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _search_fallback(query, kinds, limit, offset):
+    documents = _visible(kinds)
+    for term in _terms(query):
+        documents = documents.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    rows = documents.order_by('pk').values('kind', 'object_id', 'course_id', 'title', 'body')[offset:offset + limit]
+    results = []
+    for row in rows:
+        row['snippet'], row['rank'] = row.pop('body')[:SNIPPET_WORDS * 8], None
+        results.append(row)
+    return documents.count(), results
+
+
+def search(query, kinds=None, limit=PAGE_SIZE, offset=0):
+    """
+    published documents matching every word of the query, best first.
+    returns (total matches, [{'type', 'id', 'course_id', 'title', 'snippet', 'rank'}])
+    """
+    if not _terms(query):
+        return 0, []
+    backend = {'postgresql': _search_postgresql, 'sqlite': _search_sqlite}.get(connection.vendor, _search_fallback)
+    total, rows = backend(query, kinds, limit, offset)
+    return total, [
+        {
+            'type': row['kind'],
+            'id': row['object_id'],
+            'course_id': row['course_id'],
+            'title': row['title'],
+            'snippet': _highlight(row['snippet']),
+            'rank': round(row['rank'], 6) if row['rank'] is not None else None,
+        }
+        for row in rows
+    ]
@@ -1,5 +1,14 @@
 from rest_framework import serializers
 from . import models
+from . import achievements
+from . import grading
+from . import rollup
+from .activity import record_activity
+from .attempts import record_attempt
+from .points import award_points
+from .rendering import lesson_html
+from core.serializers import ImageVariantsField
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 
@@ -18,9 +27,11 @@ class RoleSerializer(serializers.ModelSerializer):
 
 class BadgeSerializer(serializers.ModelSerializer):
     """Defines the course module badge"""
+    icon_variants = ImageVariantsField('icon')
+
     class Meta:
         model = models.Badge
-        fields = ['id', 'name', 'description', 'module', 'icon']
+        fields = ['id', 'name', 'description', 'module', 'icon', 'icon_variants']
 
 class CertificateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -119,16 +130,22 @@ class LessonDetailSerializer(serializers.ModelSerializer):
     """detailed view of the lesson contents...caters also for the next lellosn button"""
     resources = LessonResourceSerializer(many=True, read_only=True)
     questions = QuestionSerializer(many=True, read_only=True)
+    # sanitized html rendered at save time, clients can show it as is
+    content_html = serializers.SerializerMethodField()
+    infographic_variants = ImageVariantsField('infographic')
     next_lesson = serializers.SerializerMethodField()
 
     class Meta:
         model = models.Lesson
         fields = [
-            'id', 'module', 'title', 'slug', 'content_text', 'video_url', 'infographic',
-            'lesson_type', 'estimated_duration', 'has_quiz', 'is_published', 'order',
+            'id', 'module', 'title', 'slug', 'content_text', 'content_html', 'video_url', 'infographic',
+            'infographic_variants', 'lesson_type', 'estimated_duration', 'has_quiz', 'is_published', 'order',
             'resources', 'questions', 'next_lesson'
         ]
 
+    def get_content_html(self, obj):
+        return lesson_html(obj)
+
     def get_next_lesson(self, obj):
         next_l = obj.get_next_lesson()
         if not next_l:
@@ -137,6 +154,39 @@ class LessonDetailSerializer(serializers.ModelSerializer):
 
 
 
+class CourseOutlineLessonSerializer(LessonListSerializer):
+    """lesson entry of a course outline snapshot...same as the lesson list minus the per-user completed flag"""
+
+    class Meta(LessonListSerializer.Meta):
+        fields = [
+            'id', 'module', 'title', 'slug', 'lesson_type', 'estimated_duration',
+            'has_quiz', 'is_published', 'order', 'resources', 'questions_count'
+        ]
+
+
+class CourseOutlineModuleSerializer(serializers.ModelSerializer):
+    lessons = CourseOutlineLessonSerializer(many=True, read_only=True)
+    badge = BadgeSerializer(read_only=True)
+
+    class Meta:
+        model = models.Module
+        fields = ['id', 'course', 'title', 'description', 'order', 'lesson_count', 'question_count',
+                  'total_duration', 'lessons', 'badge']
+
+
+class CourseOutlineSerializer(serializers.ModelSerializer):
+    """the static course -> modules -> lessons tree stored in CourseOutline.data"""
+    roles = RoleSerializer(many=True, read_only=True)
+    modules = CourseOutlineModuleSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = models.Course
+        fields = [
+            'id', 'title', 'slug', 'description', 'roles', 'is_published', 'created_by', 'created_at',
+            'updated_at', 'module_count', 'lesson_count', 'question_count', 'total_duration', 'modules'
+        ]
+
+
 class ModuleListSerializer(serializers.ModelSerializer):
     completed_lessons = serializers.SerializerMethodField()
     lesson_count = serializers.IntegerField(read_only=True)  
@@ -146,6 +196,9 @@ class ModuleListSerializer(serializers.ModelSerializer):
         fields = ['id', 'course', 'title', 'description', 'order', 'lesson_count', 'completed_lessons']
 
     def get_completed_lessons(self, obj):
+        # views put the user's counts for every listed module in context (see progress.py)
+        if 'completed_lessons' in self.context:
+            return self.context['completed_lessons'].get(obj.pk, 0)
         user = self.context['request'].user
         return models.LessonProgress.objects.filter(
             user=user,
@@ -171,8 +224,8 @@ class ModuleDetailSerializer(serializers.ModelSerializer):
 
 class CourseListSerializer(serializers.ModelSerializer):
     """List all available course"""
-    total_lessons = serializers.IntegerField(read_only=True)
-    total_modules = serializers.IntegerField(read_only=True)
+    total_lessons = serializers.IntegerField(source='lesson_count', read_only=True)
+    total_modules = serializers.IntegerField(source='module_count', read_only=True)
     roles = RoleSerializer(many=True, read_only=True)
 
     class Meta:
@@ -206,6 +259,19 @@ class CourseEnrollmentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'course', 'enrolled_at']
 
 
+class BulkEnrollmentSerializer(serializers.Serializer):
+    """who to enroll: user ids and/or emails, or everyone holding a role"""
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    emails = serializers.ListField(child=serializers.EmailField(), required=False)
+    role = serializers.PrimaryKeyRelatedField(queryset=models.Role.objects.all(), required=False)
+
+    def validate(self, data):
+        listed = bool(data.get('user_ids') or data.get('emails'))
+        if listed == ('role' in data):
+            raise serializers.ValidationError("Pass user_ids and/or emails, or a role, not both.")
+        return data
+
+
 
 
 class LessonProgressSerializer(serializers.ModelSerializer):
@@ -240,42 +306,29 @@ class LessonProgressSerializer(serializers.ModelSerializer):
             return instance
 
        
-        score = 0
-        questions = instance.lesson.questions.prefetch_related('answers').all()
-        total_questions = questions.count()
-
-        for q in questions:
-            submitted = raw_answers.get(str(q.id)) if raw_answers.get(str(q.id)) is not None else raw_answers.get(q.id)
-
-            if q.allow_multiple_answers:
-                if submitted is None:
-                    submitted_ids = []
-                elif isinstance(submitted, list):
-                    submitted_ids = [int(x) for x in submitted]
-                else:
-             
-                    try:
-                        submitted_ids = [int(submitted)]
-                    except (TypeError, ValueError):
-                        submitted_ids = []
-                submitted_set = set(submitted_ids)
-                correct_set = set(q.answers.filter(is_correct=True).values_list('id', flat=True))
-             
-                if correct_set and submitted_set == correct_set:
-                    score += 1
-            else:
-                try:
-                    submitted_id = int(submitted) if submitted is not None else None
-                except (TypeError, ValueError):
-                    submitted_id = None
-                if submitted_id and q.answers.filter(id=submitted_id, is_correct=True).exists():
-                    score += 1
+        # compiled answer key, cached per lesson...grading is set comparison in memory
+        answer_key = grading.get_answer_key(instance.lesson_id)
+        total_questions = len(answer_key)
+        score = grading.grade(answer_key, raw_answers)
 
         percentage = (score / total_questions) * 100 if total_questions else 0
+        passed = percentage >= 75
         points = score  
 
         try:
-            instance.mark_completed(score=score, points=points)
+            with transaction.atomic():
+                previous = instance.mark_completed(score=score, points=points, total=total_questions)
+                # totals, badges and certificates move in the same transaction as the points they
+                # count, so a failure anywhere leaves none of them behind
+                first_completion = instance.completed and not previous['completed']
+                achievements.bump_summary(instance.user_id, lessons_completed=1 if first_completion else 0)
+                award_points(
+                    instance.user_id, points - previous['points_awarded'],
+                    models.PointsLedgerEntry.QUIZ_ATTEMPT, instance.lesson_id,
+                )
+                record_attempt(instance.user_id, instance.lesson_id, answer_key, raw_answers, score, passed)
+                if first_completion:
+                    rollup.record_lesson_completion(instance.user_id, instance.lesson)
         except ValueError as e:
            
             if instance.last_attempted:
@@ -290,12 +343,20 @@ class LessonProgressSerializer(serializers.ModelSerializer):
             return instance
 
         instance._percentage = percentage
-        instance._passed = (percentage >= 75)
-
-        next_lesson = instance.lesson.get_next_lesson() if hasattr(instance.lesson, "get_next_lesson") else None
-        if next_lesson:
-            instance._next_lesson_id = next_lesson.id
-            instance._next_lesson_title = next_lesson.title
+        instance._passed = passed
+
+        record_activity(
+            instance.user_id, 'pass_quiz' if instance._passed else 'fail_quiz', instance.lesson_id,
+            {'score': score, 'total': total_questions, 'percentage': percentage},
+        )
+        if first_completion:
+            record_activity(instance.user_id, 'complete_lesson', instance.lesson_id)
+
+        sequence = instance.lesson.get_sequence()
+        next_id = sequence.get(instance.lesson_id, {}).get('next')
+        if next_id is not None:
+            instance._next_lesson_id = next_id
+            instance._next_lesson_title = sequence[next_id]['title']
         else:
             instance._next_lesson_id = None
             instance._next_lesson_title = None
@@ -358,11 +419,27 @@ class LearningActivitySerializer(serializers.ModelSerializer):
         read_only_fields = ['timestamp']
 
 
+class QuizAttemptSerializer(serializers.ModelSerializer):
+    duration = serializers.DurationField(read_only=True)
+
+    class Meta:
+        model = models.QuizAttempt
+        fields = [
+            'id', 'lesson', 'answers', 'score', 'total_questions', 'passed',
+            'started_at', 'submitted_at', 'duration',
+        ]
+        read_only_fields = fields
+
+
 class UserEnrolledCourseSerializer(serializers.ModelSerializer):
-    course_id = serializers.IntegerField(source='course.id', read_only=True)
+    """modules come from context['modules'] (course id -> module list entries built from the outline snapshot)"""
+    course_id = serializers.IntegerField(read_only=True)
     course_title = serializers.CharField(source='course.title', read_only=True)
-    modules = ModuleListSerializer(many=True, source='course.modules', read_only=True)
+    modules = serializers.SerializerMethodField()
 
     class Meta:
         model = models.CourseEnrollment
         fields = ['course_id', 'course_title', 'enrolled_at', 'active', 'modules']
+
+    def get_modules(self, obj):
+        return self.context['modules'].get(obj.course_id, [])
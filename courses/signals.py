@@ -0,0 +1,372 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import achievements
+from . import activity
+from . import cache as course_cache
+from . import counters
+from . import grading
+from . import leaderboard
+from . import outline
+from . import points
+from . import search
+from articles.models import Post
+from core.images import variants_stored
+from .models import (
+    Course, Module, Lesson, LessonResource, Question, Answer, Badge, Role,
+    CourseEnrollment, LearningActivity, LeaderboardEntry, SearchDocument, User,
+)
+
+
+# catalog invalidation...anything shown in the course list bumps the catalog version.
+# the bump waits for the commit so a request can't cache rows (or counters) that are not visible yet
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Module)
+@receiver([post_save, post_delete], sender=Lesson)
+@receiver([post_save, post_delete], sender=Role)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(course_cache.bump_catalog_version)
+
+
+@receiver(m2m_changed, sender=Course.roles.through)
+def invalidate_catalog_on_roles(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        transaction.on_commit(course_cache.bump_catalog_version)
+
+
+# per-course content version (lesson sequence, outline snapshot)
+
+def _bump_content(*course_ids):
+    for course_id in set(course_ids):
+        if course_id is not None:
+            transaction.on_commit(lambda course_id=course_id: course_cache.bump_content_version(course_id))
+
+
+def _course_of_module(module_id):
+    return Module.objects.filter(pk=module_id).values_list('course_id', flat=True).first()
+
+
+def _course_of_lesson(lesson_id):
+    return Lesson.objects.filter(pk=lesson_id).values_list('module__course_id', flat=True).first()
+
+
+@receiver(post_save, sender=Course)
+def refresh_course_content(sender, instance, **kwargs):
+    _bump_content(instance.pk)
+    if instance.is_published:
+        # built at publish time so the first reader doesn't pay for it
+        transaction.on_commit(lambda: outline.build_course_outline(instance.pk), robust=True)
+
+
+@receiver(m2m_changed, sender=Course.roles.through)
+def invalidate_roles_content(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _bump_content(instance.pk)
+    elif action == 'pre_clear':
+        _bump_content(*instance.courses.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        _bump_content(*pk_set)
+
+
+@receiver(post_save, sender=Role)
+@receiver(pre_delete, sender=Role)
+def invalidate_role_content(sender, instance, **kwargs):
+    _bump_content(*instance.courses.values_list('pk', flat=True))
+
+
+@receiver([post_save, post_delete], sender=Module)
+def invalidate_module_content(sender, instance, **kwargs):
+    previous = getattr(instance, '_counter_previous', None) or {}
+    _bump_content(instance.course_id, previous.get('course_id'))
+
+
+@receiver([post_save, post_delete], sender=Lesson)
+def invalidate_lesson_content(sender, instance, **kwargs):
+    course_ids = [_course_of_module(instance.module_id)]
+    previous = getattr(instance, '_counter_previous', None) or {}
+    if previous.get('module_id') not in (None, instance.module_id):
+        course_ids.append(_course_of_module(previous['module_id']))
+    _bump_content(*course_ids)
+
+
+@receiver([post_save, post_delete], sender=Question)
+@receiver([post_save, post_delete], sender=LessonResource)
+def invalidate_lesson_child_content(sender, instance, **kwargs):
+    course_ids = [_course_of_lesson(instance.lesson_id)]
+    previous_lesson_id = getattr(instance, '_counter_previous', None)
+    if sender is Question and previous_lesson_id not in (None, instance.lesson_id):
+        course_ids.append(_course_of_lesson(previous_lesson_id))
+    _bump_content(*course_ids)
+
+
+@receiver([post_save, post_delete], sender=Badge)
+def invalidate_badge_content(sender, instance, **kwargs):
+    _bump_content(_course_of_module(instance.module_id))
+
+
+@receiver(variants_stored, sender=Badge)
+def invalidate_badge_icon_variants(sender, pk, **kwargs):
+    # the icon variants are listed with a plain update after the upload, outside save()
+    module_id = Badge.objects.filter(pk=pk).values_list('module_id', flat=True).first()
+    if module_id is not None:
+        _bump_content(_course_of_module(module_id))
+
+
+# stored counters on Course/Module. pre_save remembers where a row used to live so a move
+# can be applied as a decrement on the old parent and an increment on the new one
+
+def _duration(value):
+    return value or timedelta()
+
+
+@receiver(pre_save, sender=Module)
+def remember_module_parent(sender, instance, **kwargs):
+    instance._counter_previous = None
+    if not instance._state.adding:
+        instance._counter_previous = sender.objects.filter(pk=instance.pk).values(
+            'course_id', 'lesson_count', 'question_count', 'total_duration'
+        ).first()
+
+
+@receiver(post_save, sender=Module)
+def count_module(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_counter_previous', None)
+    if created or previous is None:
+        counters.shift_course_counters(instance.course_id, modules=1)
+    elif previous['course_id'] != instance.course_id:
+        moved = dict(
+            lessons=previous['lesson_count'],
+            questions=previous['question_count'],
+            duration=previous['total_duration'],
+        )
+        counters.shift_course_counters(
+            previous['course_id'], modules=-1, lessons=-moved['lessons'],
+            questions=-moved['questions'], duration=-_duration(moved['duration'])
+        )
+        counters.shift_course_counters(instance.course_id, modules=1, **moved)
+
+
+@receiver(post_delete, sender=Module)
+def uncount_module(sender, instance, **kwargs):
+    # the lessons (and their questions) delete in the same cascade and take their own counts with them
+    counters.shift_course_counters(instance.course_id, modules=-1)
+
+
+@receiver(pre_save, sender=Lesson)
+def remember_lesson_parent(sender, instance, **kwargs):
+    instance._counter_previous = None
+    if not instance._state.adding:
+        instance._counter_previous = sender.objects.filter(pk=instance.pk).values(
+            'module_id', 'estimated_duration'
+        ).first()
+
+
+@receiver(post_save, sender=Lesson)
+def count_lesson(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_counter_previous', None)
+    duration = _duration(instance.estimated_duration)
+    if created or previous is None:
+        counters.shift_module_counters(instance.module_id, lessons=1, duration=duration)
+        return
+
+    old_duration = _duration(previous['estimated_duration'])
+    if previous['module_id'] != instance.module_id:
+        questions = instance.questions.count()
+        counters.shift_module_counters(
+            previous['module_id'], lessons=-1, questions=-questions, duration=-old_duration
+        )
+        counters.shift_module_counters(
+            instance.module_id, lessons=1, questions=questions, duration=duration
+        )
+    elif duration != old_duration:
+        counters.shift_module_counters(instance.module_id, duration=duration - old_duration)
+
+
+@receiver(post_delete, sender=Lesson)
+def uncount_lesson(sender, instance, **kwargs):
+    counters.shift_module_counters(
+        instance.module_id, lessons=-1, duration=-_duration(instance.estimated_duration)
+    )
+
+
+@receiver(pre_save, sender=Question)
+def remember_question_parent(sender, instance, **kwargs):
+    instance._counter_previous = None
+    if not instance._state.adding:
+        instance._counter_previous = sender.objects.filter(pk=instance.pk).values_list(
+            'lesson_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Question)
+def count_question(sender, instance, created, **kwargs):
+    previous_lesson_id = getattr(instance, '_counter_previous', None)
+    if created or previous_lesson_id is None:
+        counters.shift_module_counters(counters.module_id_for_lesson(instance.lesson_id), questions=1)
+    elif previous_lesson_id != instance.lesson_id:
+        counters.shift_module_counters(counters.module_id_for_lesson(previous_lesson_id), questions=-1)
+        counters.shift_module_counters(counters.module_id_for_lesson(instance.lesson_id), questions=1)
+
+
+@receiver(post_delete, sender=Question)
+def uncount_question(sender, instance, **kwargs):
+    # in a cascade from a lesson the lesson row is still there at this point
+    counters.shift_module_counters(counters.module_id_for_lesson(instance.lesson_id), questions=-1)
+
+
+# compiled answer keys (grading.py)
+
+def _drop_answer_keys(*lesson_ids):
+    for lesson_id in set(lesson_ids):
+        if lesson_id is not None:
+            transaction.on_commit(lambda lesson_id=lesson_id: grading.invalidate_answer_key(lesson_id))
+
+
+@receiver([post_save, post_delete], sender=Question)
+def invalidate_question_answer_key(sender, instance, **kwargs):
+    _drop_answer_keys(instance.lesson_id, getattr(instance, '_counter_previous', None))
+
+
+@receiver(pre_save, sender=Answer)
+def remember_answer_question(sender, instance, **kwargs):
+    instance._previous_question_id = None
+    if not instance._state.adding:
+        instance._previous_question_id = sender.objects.filter(pk=instance.pk).values_list(
+            'question_id', flat=True
+        ).first()
+
+
+@receiver([post_save, post_delete], sender=Answer)
+def invalidate_answer_answer_key(sender, instance, **kwargs):
+    question_ids = {instance.question_id, getattr(instance, '_previous_question_id', None)} - {None}
+    _drop_answer_keys(*Question.objects.filter(pk__in=question_ids).values_list('lesson_id', flat=True))
+
+
+# achievement summary counters (achievements.py)
+
+@receiver(pre_save, sender=CourseEnrollment)
+def remember_enrollment_state(sender, instance, **kwargs):
+    instance._was_active = None
+    if not instance._state.adding:
+        instance._was_active = sender.objects.filter(pk=instance.pk).values_list('active', flat=True).first()
+
+
+@receiver(post_save, sender=CourseEnrollment)
+def count_enrollment(sender, instance, created, **kwargs):
+    was_active = False if created else bool(getattr(instance, '_was_active', None))
+    if instance.active != was_active:
+        achievements.bump_summary(instance.user_id, courses_enrolled=1 if instance.active else -1)
+
+
+@receiver(post_delete, sender=CourseEnrollment)
+def uncount_enrollment(sender, instance, **kwargs):
+    if instance.active:
+        achievements.bump_summary(instance.user_id, courses_enrolled=-1)
+
+
+# daily activity rollup and streaks (activity.py)
+
+@receiver(post_save, sender=LearningActivity)
+def count_learning_activity(sender, instance, created, **kwargs):
+    if created:
+        activity.record_daily_activity(instance)
+
+
+# county leaderboards (leaderboard.py)
+
+@receiver(pre_save, sender=User)
+def remember_user_county(sender, instance, **kwargs):
+    instance._previous_county_id = None
+    if not instance._state.adding:
+        instance._previous_county_id = sender.objects.filter(pk=instance.pk).values_list(
+            'county_id', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=User)
+def move_user_county(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_county_id', None)
+    if not created and previous != instance.county_id:
+        leaderboard.move_county(instance.pk, previous, instance.county_id)
+
+
+@receiver(pre_delete, sender=User)
+def uncount_user_scores(sender, instance, **kwargs):
+    # the entries go with the user (cascade), their scores have to leave the histogram too
+    leaderboard.remove_user(instance.pk)
+
+
+@receiver(pre_delete, sender=Lesson)
+def take_back_lesson_points(sender, instance, **kwargs):
+    # also sent for the lessons of a deleted module or course, while their progress still exists
+    points.remove_lesson_points(instance.pk)
+
+
+@receiver(post_delete, sender=Course)
+def drop_course_leaderboard(sender, instance, **kwargs):
+    leaderboard.drop_scope(LeaderboardEntry.course_scope(instance.pk))
+
+
+
+# search documents (search.py)...written in the same transaction as the change
+
+@receiver(pre_save, sender=Course)
+def remember_course_published(sender, instance, **kwargs):
+    instance._previous_published = None
+    if not instance._state.adding:
+        instance._previous_published = sender.objects.filter(pk=instance.pk).values_list(
+            'is_published', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=Course)
+def index_course(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        # lessons and resources are only visible while their course is published, they are
+        # reindexed when that changes (a new course has none yet)
+        previous = getattr(instance, '_previous_published', None)
+        search.reindex_course(instance.pk, children=not created and previous != instance.is_published)
+
+
+@receiver(post_save, sender=Module)
+def index_moved_module(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_counter_previous', None) or {}
+    if not raw and previous.get('course_id') not in (None, instance.course_id):
+        search.reindex_module(instance.pk)
+
+
+@receiver(post_save, sender=Lesson)
+def index_lesson(sender, instance, raw=False, **kwargs):
+    if not raw:
+        # the resources follow the lesson's visibility
+        search.reindex_lesson(instance)
+
+
+@receiver(post_save, sender=LessonResource)
+def index_lesson_resource(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_objects(SearchDocument.RESOURCE, [instance])
+
+
+@receiver(post_save, sender=Post)
+def index_article(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_objects(SearchDocument.ARTICLE, [instance])
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Lesson)
+@receiver(post_delete, sender=LessonResource)
+@receiver(post_delete, sender=Post)
+def unindex(sender, instance, **kwargs):
+    kind = {
+        Course: SearchDocument.COURSE, Lesson: SearchDocument.LESSON,
+        LessonResource: SearchDocument.RESOURCE, Post: SearchDocument.ARTICLE,
+    }[sender]
+    search.remove(kind, [instance.pk])
+
@@ -0,0 +1,25 @@
+from django import template
+from django.urls import reverse
+
+from courses import platform_stats
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('courses/admin/platform_stats.html', takes_context=True)
+def platform_stats_panel(context):
+    """numbers of the last 7 and DASHBOARD_DAYS days for the admin home page"""
+    request = context.get('request')
+    if request is None or not request.user.is_staff:
+        return {'rows': []}
+    rows = platform_stats.recent(platform_stats.DASHBOARD_DAYS)
+    peak = max((stats.active_users for stats in rows), default=0)
+    return {
+        'rows': rows,
+        'days': platform_stats.DASHBOARD_DAYS,
+        'week': platform_stats.totals(rows[-7:]),
+        'window': platform_stats.totals(rows),
+        'bars': [(stats, round(100 * stats.active_users / peak) if peak else 0) for stats in rows],
+        'changelist_url': reverse('admin:courses_platformdailystats_changelist'),
+    }
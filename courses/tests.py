@@ -1,3 +1,575 @@
-from django.test import TestCase
+import io
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection, OperationalError, reset_queries
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.timezone import localdate
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core import images
+from core.models import User
+from . import achievements, activity, counters, enrollment, leaderboard, points, rendering, search, transfer
+from .models import (
+    Answer, Badge, Certificate, Course, CourseEnrollment, CourseProgress, LeaderboardEntry, LearningActivity,
+    Lesson, LessonProgress, Module, ModuleProgress, PointsLedgerEntry, Question, SearchDocument, UserBadge,
+)
+from .regrade import regrade_lesson
 
 # Create your tests here.
+
+
+class LessonProgressConcurrencyTests(TransactionTestCase):
+    """many threads submitting for the same LessonProgress row at once (double taps, retries)"""
+
+    THREADS = 16
+    # sqlite refuses a concurrent writer outright (database is locked) instead of queueing it
+    # like postgres does, so a refused submission is tried again until it gets an answer
+    RETRIES = 200
+
+    def setUp(self):
+        user = User.objects.create(email='learner@example.com', username='learner')
+        course = Course.objects.create(title='Voter education')
+        module = Module.objects.create(course=course, title='Basics', order=1)
+        lesson = Lesson.objects.create(module=module, title='Registering', slug='registering', order=1)
+        self.progress = LessonProgress.objects.create(user=user, lesson=lesson)
+
+    def hammer(self, score):
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+        lock = threading.Lock()
+
+        def submit():
+            progress = LessonProgress.objects.get(pk=self.progress.pk)
+            barrier.wait()
+            outcome = 'refused'
+            try:
+                for _ in range(self.RETRIES):
+                    try:
+                        progress.mark_completed(score=score, points=score, total=4)
+                        outcome = 'recorded'
+                        break
+                    except ValueError:
+                        outcome = 'blocked'
+                        break
+                    except OperationalError:
+                        time.sleep(random.uniform(0.001, 0.02))
+            finally:
+                connection.close()
+            with lock:
+                outcomes.append(outcome)
+
+        threads = [threading.Thread(target=submit) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_attempts_never_lost_or_exceed_limit(self):
+        outcomes = self.hammer(score=1)
+        self.progress.refresh_from_db()
+
+        self.assertEqual(len(outcomes), self.THREADS)
+        self.assertEqual(outcomes.count('recorded'), LessonProgress.MAX_ATTEMPTS)
+        self.assertEqual(outcomes.count('blocked'), self.THREADS - LessonProgress.MAX_ATTEMPTS)
+        self.assertEqual(self.progress.attempts, LessonProgress.MAX_ATTEMPTS)
+        self.assertFalse(self.progress.completed)
+
+    def test_limit_holds_for_back_to_back_submissions(self):
+        for _ in range(self.THREADS):
+            try:
+                LessonProgress.objects.get(pk=self.progress.pk).mark_completed(score=4, points=4, total=4)
+            except ValueError:
+                pass
+        self.progress.refresh_from_db()
+
+        self.assertEqual(self.progress.attempts, LessonProgress.MAX_ATTEMPTS)
+        self.assertTrue(self.progress.completed)
+        self.assertEqual(self.progress.points_awarded, 4)
+
+
+def make_user(name):
+    return User.objects.create(email=f'{name}@example.com', username=name)
+
+
+def make_lesson(module, order, title=None, duration=None):
+    """a published lesson with one question, whose right answer is 'Yes'"""
+    lesson = Lesson.objects.create(
+        module=module, title=title or f'{module.title} lesson {order}', slug=f'lesson-{module.pk}-{order}',
+        order=order, is_published=True, estimated_duration=duration,
+    )
+    question = Question.objects.create(lesson=lesson, text='Is it true?', order=1)
+    Answer.objects.create(question=question, text='Yes', is_correct=True, order=1)
+    Answer.objects.create(question=question, text='No', order=2)
+    return lesson
+
+
+def make_course(title='Voter education', modules=2, lessons=1, published=True):
+    course = Course.objects.create(title=title, is_published=published)
+    for number in range(1, modules + 1):
+        module = Module.objects.create(course=course, title=f'Module {number}', order=number)
+        for order in range(1, lessons + 1):
+            make_lesson(module, order)
+    return course
+
+
+def answers(lesson, correct=True):
+    question = lesson.questions.get()
+    return {str(question.pk): question.answers.get(is_correct=correct).pk}
+
+
+class CourseTestCase(TestCase):
+    """the course caches outlive the rolled back test data (and its reused ids), so start empty"""
+
+    def setUp(self):
+        cache.clear()
+        # activity is written right away instead of waiting in the process wide buffer
+        patcher = mock.patch.object(activity.activity_buffer, 'size', 1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class ContentCounterTests(CourseTestCase):
+    def counts(self, obj):
+        obj.refresh_from_db()
+        return [getattr(obj, field) for field in obj.counter_fields]
+
+    def test_counters_follow_creates_moves_and_deletes(self):
+        course = Course.objects.create(title='Elections')
+        first = Module.objects.create(course=course, title='First', order=1)
+        second = Module.objects.create(course=course, title='Second', order=2)
+        lesson = make_lesson(first, 1, duration=timedelta(minutes=5))
+        make_lesson(first, 2, duration=timedelta(minutes=10))
+
+        self.assertEqual(self.counts(course), [2, 2, 2, timedelta(minutes=15)])
+        self.assertEqual(self.counts(first), [2, 2, timedelta(minutes=15)])
+
+        lesson.module = second
+        lesson.save()
+        self.assertEqual(self.counts(first), [1, 1, timedelta(minutes=10)])
+        self.assertEqual(self.counts(second), [1, 1, timedelta(minutes=5)])
+        self.assertEqual(self.counts(course), [2, 2, 2, timedelta(minutes=15)])
+
+        other = Course.objects.create(title='Budgets')
+        second.course = other
+        second.save()
+        self.assertEqual(self.counts(course), [1, 1, 1, timedelta(minutes=10)])
+        self.assertEqual(self.counts(other), [1, 1, 1, timedelta(minutes=5)])
+
+        lesson.questions.get().delete()
+        self.assertEqual(self.counts(other), [1, 1, 0, timedelta(minutes=5)])
+        second.delete()
+        self.assertEqual(self.counts(other), [0, 0, 0, timedelta()])
+
+    def test_rebuild_repairs_drifted_counters(self):
+        course = make_course(modules=2, lessons=2)
+        Course.objects.filter(pk=course.pk).update(module_count=0, lesson_count=7, question_count=0)
+        Module.objects.filter(course=course).update(lesson_count=0)
+
+        self.assertEqual(counters.rebuild_counters([course.pk]), 1)
+        self.assertEqual(self.counts(course)[:3], [2, 4, 4])
+        self.assertEqual(
+            list(Module.objects.filter(course=course).values_list('lesson_count', flat=True)), [2, 2]
+        )
+
+
+class QuizSubmissionTests(CourseTestCase):
+    """the submit endpoint: progress, rollup, badges, certificates and the user's summary"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('learner')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.course = make_course(modules=2, lessons=1)
+        self.modules = list(self.course.modules.order_by('order'))
+        self.badge = Badge.objects.create(name='Registered', module=self.modules[0])
+        self.lessons = [module.lessons.get() for module in self.modules]
+
+    def submit(self, lesson, correct=True):
+        response = self.client.patch(
+            '/api/lesson-progress/submit/', {'lesson_id': lesson.pk, 'answers': answers(lesson, correct)},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_module_badge_then_course_certificate(self):
+        self.submit(self.lessons[0])
+        self.assertTrue(UserBadge.objects.filter(user=self.user, badge=self.badge).exists())
+        self.assertTrue(ModuleProgress.objects.get(user=self.user, module=self.modules[0]).completed)
+        self.assertFalse(Certificate.objects.filter(user=self.user).exists())
+
+        self.submit(self.lessons[1])
+        progress = CourseProgress.objects.get(user=self.user, course=self.course)
+        self.assertTrue(progress.completed)
+        self.assertTrue(progress.certificate_issued)
+        certificate = Certificate.objects.get(user=self.user, course=self.course)
+        self.assertEqual(certificate.code, progress.certificate_code)
+
+        # passing again awards nothing twice
+        self.submit(self.lessons[1])
+        self.assertEqual(UserBadge.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Certificate.objects.filter(user=self.user).count(), 1)
+
+    def test_summary_matches_a_recount(self):
+        self.submit(self.lessons[0], correct=False)
+        self.submit(self.lessons[0])
+        self.submit(self.lessons[1])
+
+        summary = achievements.get_summary(self.user.pk)
+        self.assertEqual(
+            (summary.total_points, summary.lessons_completed, summary.modules_completed), (2, 2, 2)
+        )
+        recount = achievements.compute_summaries([self.user.pk])[self.user.pk]
+        for field in summary.COUNTER_FIELDS + summary.STREAK_FIELDS:
+            self.assertEqual(getattr(summary, field), recount[field], field)
+        self.assertEqual(summary.streak_on(localdate()), 1)
+        self.assertEqual(self.user.quiz_attempts.count(), 3)
+
+        response = self.client.get('/api/achievements/')
+        self.assertEqual(response.data['badges_count'], 1)
+        self.assertEqual(response.data['certificates_count'], 1)
+        self.assertEqual(response.data['streak_days'], 1)
+
+
+class StreakTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = make_user('learner')
+        self.today = localdate()
+
+    def active_on(self, *days_ago):
+        activity.apply_daily_activity({(self.user.pk, self.today - timedelta(days=n)): 1 for n in days_ago})
+        return achievements.get_summary(self.user.pk)
+
+    def test_consecutive_days_count_and_a_gap_restarts(self):
+        summary = self.active_on(6, 5)
+        self.assertEqual((summary.current_streak, summary.last_active_date), (2, self.today - timedelta(days=5)))
+        # not active today, so nothing to show
+        self.assertEqual(summary.streak_on(self.today), 0)
+
+        summary = self.active_on(2, 1, 0)
+        self.assertEqual(summary.current_streak, 3)
+        self.assertEqual(summary.streak_on(self.today), 3)
+
+        # a late event for an old day changes nothing
+        self.assertEqual(self.active_on(4).current_streak, 3)
+
+    def test_backfill_agrees_with_the_live_rollup(self):
+        for days_ago in (3, 1, 1, 0):
+            activity.write_activities([LearningActivity(
+                user=self.user, action='view_lesson', timestamp=timezone.now() - timedelta(days=days_ago),
+            )])
+        live = achievements.get_summary(self.user.pk)
+        self.assertEqual(live.current_streak, 2)
+
+        activity.backfill_daily_activity([self.user.pk])
+        rebuilt = achievements.get_summary(self.user.pk)
+        self.assertEqual((rebuilt.current_streak, rebuilt.last_active_date), (2, self.today))
+        calendar = activity.activity_calendar(self.user.pk, self.today - timedelta(days=7), self.today)
+        self.assertEqual([day['activity_count'] for day in calendar], [1, 2, 1])
+
+
+class PointsAndLeaderboardTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = make_course(modules=1, lessons=2)
+        self.lessons = list(Lesson.objects.filter(module__course=self.course).order_by('order'))
+        self.users = [make_user(name) for name in ('amina', 'brian', 'chebet', 'david')]
+        for user, score in zip(self.users, (30, 20, 20, 10)):
+            self.give(user, self.lessons[0], score)
+
+    def give(self, user, lesson, score):
+        LessonProgress.objects.update_or_create(user=user, lesson=lesson, defaults={'points_awarded': score})
+        points.award_points(user.pk, score, PointsLedgerEntry.QUIZ_ATTEMPT, lesson.pk)
+
+    def test_ledger_and_totals_agree(self):
+        points.award_points(self.users[3].pk, -4, PointsLedgerEntry.ADJUSTMENT)
+        totals = points.ledger_totals([user.pk for user in self.users])
+        self.assertEqual([totals[user.pk] for user in self.users], [30, 20, 20, 6])
+        self.assertEqual(
+            [achievements.get_summary(user.pk).total_points for user in self.users], [30, 20, 20, 6]
+        )
+        self.assertEqual(points.audit(), ([], 4))
+
+    def test_ties_share_a_competition_rank(self):
+        for scope in (LeaderboardEntry.GLOBAL, LeaderboardEntry.course_scope(self.course.pk)):
+            page = leaderboard.top(scope)
+            self.assertEqual([row['rank'] for row in page], [1, 2, 2, 4])
+            self.assertEqual([row['points'] for row in page], [30, 20, 20, 10])
+            self.assertEqual(leaderboard.user_rank(scope, self.users[3].pk), {'rank': 4, 'points': 10})
+        # the second page starts from the rank of its first row
+        self.assertEqual([row['rank'] for row in leaderboard.top(LeaderboardEntry.GLOBAL, limit=2, offset=2)], [2, 4])
+
+        self.give(self.users[3], self.lessons[1], 20)
+        self.assertEqual([row['rank'] for row in leaderboard.top(LeaderboardEntry.GLOBAL)], [1, 1, 3, 3])
+
+    def test_deleting_a_lesson_takes_its_points_back(self):
+        self.give(self.users[0], self.lessons[1], 5)
+        self.lessons[0].delete()
+
+        self.assertEqual([achievements.get_summary(user.pk).total_points for user in self.users], [5, 0, 0, 0])
+        self.assertEqual(points.audit(), ([], 4))
+        self.assertEqual(leaderboard.user_rank(LeaderboardEntry.GLOBAL, self.users[0].pk), {'rank': 1, 'points': 5})
+        self.assertEqual(leaderboard.rank_of(LeaderboardEntry.GLOBAL, 0), 2)
+
+        self.course.delete()
+        scope = LeaderboardEntry.course_scope(self.course.pk)
+        self.assertFalse(LeaderboardEntry.objects.filter(scope=scope).exists())
+        self.assertEqual([achievements.get_summary(user.pk).total_points for user in self.users], [0, 0, 0, 0])
+
+
+class RegradeTests(CourseTestCase):
+    def test_fixed_answer_key_flips_pass_and_fail(self):
+        lesson = make_course(modules=1, lessons=1).modules.get().lessons.get()
+        right, wrong = make_user('right'), make_user('wrong')
+        for user, correct in ((right, True), (wrong, False)):
+            client = APIClient()
+            client.force_authenticate(user)
+            client.patch(
+                '/api/lesson-progress/submit/', {'lesson_id': lesson.pk, 'answers': answers(lesson, correct)},
+                format='json',
+            )
+        self.assertTrue(LessonProgress.objects.get(user=right).completed)
+
+        # the key was the wrong way round
+        for answer in Answer.objects.filter(question__lesson=lesson):
+            answer.is_correct = not answer.is_correct
+            answer.save()
+        report = regrade_lesson(lesson.pk)
+
+        self.assertEqual(report, {
+            'attempts': 2, 'attempts_changed': 2, 'users': 2, 'progress_changed': 2,
+            'newly_passed': 1, 'newly_failed': 1,
+        })
+        progress = {p.user_id: p for p in LessonProgress.objects.filter(lesson=lesson)}
+        self.assertEqual((progress[right.pk].completed, progress[right.pk].points_awarded), (False, 0))
+        self.assertEqual((progress[wrong.pk].completed, progress[wrong.pk].points_awarded), (True, 1))
+        self.assertEqual(points.ledger_totals([right.pk, wrong.pk]), {right.pk: 0, wrong.pk: 1})
+
+
+class CourseTransferTests(CourseTestCase):
+    def tree(self, course):
+        return [
+            (lesson.module.title, lesson.title, lesson.content_html, question.text,
+             sorted(question.answers.values_list('text', 'is_correct')))
+            for lesson in Lesson.objects.filter(module__course=course).order_by('module__order', 'order')
+            for question in lesson.questions.all()
+        ]
+
+    def test_export_then_import_makes_the_same_tree(self):
+        course = make_course(title='Civic duties', modules=2, lessons=2)
+        lesson = Lesson.objects.filter(module__course=course).first()
+        lesson.content_text = '**Vote** early'
+        lesson.save()
+
+        stream = io.StringIO()
+        exported = transfer.export_course(course, stream)
+        stream.seek(0)
+        copy, imported, unknown_roles = transfer.import_course(stream, slug='civic-duties-copy')
+
+        self.assertEqual(exported, imported)
+        self.assertEqual(exported['answer'], 8)
+        self.assertEqual(unknown_roles, [])
+        self.assertEqual(self.tree(copy), self.tree(course))
+        copy.refresh_from_db()
+        self.assertEqual((copy.module_count, copy.lesson_count, copy.question_count), (2, 4, 4))
+        self.assertEqual(SearchDocument.objects.filter(kind=SearchDocument.LESSON, course_id=copy.pk).count(), 4)
+
+    def test_broken_file_imports_nothing(self):
+        lines = io.StringIO(
+            '{"type": "header", "format": "celve-course", "version": 1}\n'
+            '{"type": "course", "id": 1, "title": "Half", "slug": "half"}\n'
+            '{"type": "module", "id": 1, "title": "One", "order": 1}\n'
+            'not json\n'
+        )
+        with self.assertRaises(transfer.CourseImportError):
+            transfer.import_course(lines)
+        self.assertFalse(Course.objects.filter(slug='half').exists())
+
+
+class BulkEnrollmentTests(CourseTestCase):
+    def test_report_counts(self):
+        course = make_course(modules=1)
+        users = [make_user(f'learner{n}') for n in range(4)]
+        CourseEnrollment.objects.create(user=users[0], course=course)
+        CourseEnrollment.objects.create(user=users[1], course=course, active=False)
+        for user in users:
+            achievements.get_summary(user.pk)
+
+        report = enrollment.enroll_users(
+            course, user_ids=[users[0].pk, users[1].pk, users[2].pk, 999999],
+            emails=[users[3].email, 'nobody@example.com'],
+        )
+
+        self.assertEqual(report, {'requested': 6, 'enrolled': 3, 'already_enrolled': 1, 'unknown': 2})
+        self.assertEqual(CourseEnrollment.objects.filter(course=course, active=True).count(), 4)
+        self.assertEqual(
+            [achievements.get_summary(user.pk).courses_enrolled for user in users], [1, 1, 1, 1]
+        )
+        self.assertEqual(
+            enrollment.enroll_users(course, user_ids=[user.pk for user in users]),
+            {'requested': 4, 'enrolled': 0, 'already_enrolled': 4, 'unknown': 0},
+        )
+
+
+class ContentSearchTests(CourseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.course = Course.objects.create(title='Public finance', description='Budgets and taxes')
+        module = Module.objects.create(course=self.course, title='Counties', order=1)
+        self.lesson = make_lesson(module, 1, title='County revenue')
+        draft = make_lesson(module, 2, title='County draft')
+        draft.is_published = False
+        draft.save()
+
+    def titles(self, query):
+        return [result['title'] for result in search.search(query)[1]]
+
+    def test_only_published_content_is_found(self):
+        # the course isn't published, so neither are its lessons
+        self.assertEqual(self.titles('county'), [])
+
+        self.course.is_published = True
+        self.course.save()
+        self.assertEqual(self.titles('county'), ['County revenue'])
+        self.assertEqual(self.titles('budgets'), ['Public finance'])
+
+        self.course.is_published = False
+        self.course.save()
+        self.assertEqual(self.titles('county'), [])
+
+    def test_search_endpoint(self):
+        self.course.is_published = True
+        self.course.save()
+        client = APIClient()
+        client.force_authenticate(make_user('reader'))
+
+        response = client.get('/api/search/content/', {'q': 'revenue', 'type': 'lesson'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(response.data['results'][0]['id'], self.lesson.pk)
+        self.assertIn('<mark>', response.data['results'][0]['snippet'])
+        self.assertEqual(client.get('/api/search/content/', {'q': 'revenue', 'type': 'nothing'}).status_code, 400)
+
+
+class LessonRenderingTests(CourseTestCase):
+    def test_scripts_and_javascript_links_are_stripped(self):
+        html = rendering.render_content(
+            '**Read** [this](javascript:alert(1)) and [that](https://example.com)\n\n'
+            '<script>alert(1)</script><a href="JaVaScRiPt:alert(2)" onclick="x()">click</a>'
+        )
+        self.assertIn('<strong>Read</strong>', html)
+        self.assertIn('href="https://example.com"', html)
+        self.assertNotIn('<script', html)
+        self.assertNotIn('onclick', html)
+        self.assertNotIn('javascript:', html.lower())
+
+    def test_html_is_stored_on_save(self):
+        lesson = make_course(modules=1).modules.get().lessons.get()
+        lesson.content_text = '# Title\n<script>x()</script>'
+        lesson.save()
+        lesson.refresh_from_db()
+        self.assertEqual(lesson.content_hash, rendering.content_hash(lesson.content_text))
+        self.assertIn('<h1>Title</h1>', lesson.content_html)
+        self.assertNotIn('<script', lesson.content_html)
+
+        # written around save(), rendered on the spot
+        Lesson.objects.filter(pk=lesson.pk).update(content_text='*new*', content_html='', content_hash='')
+        lesson.refresh_from_db()
+        self.assertEqual(rendering.lesson_html(lesson), '<p><em>new</em></p>')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        self.storage = FileSystemStorage(location=location)
+
+    def store(self, size, orientation=None):
+        image = Image.new('RGB', size, 'navy')
+        exif = Image.Exif()
+        if orientation:
+            exif[0x0112] = orientation
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', exif=exif)
+        return self.storage.save('fixture.jpg', io.BytesIO(buffer.getvalue()))
+
+    def test_variants_are_upright_and_never_upscaled(self):
+        # stored sideways, 640x480 on disk is 480x640 upright
+        name = self.store((640, 480), orientation=6)
+        made = images.generate_variants(self.storage, name, (160, 320, 1280))
+
+        self.assertEqual(
+            sorted((variant['format'], variant['width'], variant['height']) for variant in made),
+            [('jpeg', 160, 213), ('jpeg', 320, 427), ('webp', 160, 213), ('webp', 320, 427)],
+        )
+        for variant in made:
+            with self.storage.open(variant['name']) as stored, Image.open(stored) as image:
+                self.assertEqual(image.size, (variant['width'], variant['height']))
+                self.assertEqual(image.format, variant['format'].upper())
+                self.assertFalse(image.getexif())
+
+    def test_same_image_is_encoded_once(self):
+        made = images.generate_variants(self.storage, self.store((200, 100)), (64, 400))
+        self.assertEqual([variant['width'] for variant in made if variant['format'] == 'webp'], [64])
+
+        copy = self.store((200, 100))
+        with mock.patch.object(self.storage, 'save', wraps=self.storage.save) as save:
+            again = images.generate_variants(self.storage, copy, (64, 400))
+        self.assertEqual([variant['name'] for variant in again], [variant['name'] for variant in made])
+        self.assertEqual(save.call_count, 0)
+
+    def test_unreadable_file_has_no_variants(self):
+        name = self.storage.save('broken.jpg', io.BytesIO(b'not an image'))
+        with self.assertLogs('core.images', 'WARNING'):
+            self.assertEqual(images.generate_variants(self.storage, name, (64,)), [])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'},
+})
+class EnrolledCoursesQueryTests(CourseTestCase):
+    """on the database cache, so a cache lookup per enrollment would show up as queries too"""
+
+    def setUp(self):
+        call_command('createcachetable', verbosity=0)
+        super().setUp()
+
+    def test_query_count_does_not_grow_with_enrollments(self):
+        user = make_user('learner')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        def enroll(title):
+            CourseEnrollment.objects.create(user=user, course=make_course(title=title, modules=2, lessons=2))
+            # the first read builds the new course's outline
+            client.get('/api/my-courses/')
+
+        enroll('Course one')
+        # a request empties the query log when it starts, so start counting from an empty one
+        reset_queries()
+        with CaptureQueriesContext(connection) as one:
+            response = client.get('/api/my-courses/')
+        self.assertEqual(len(response.data), 1)
+        baseline = len(one.captured_queries)
+
+        for number in range(2, 6):
+            enroll(f'Course {number}')
+        reset_queries()
+        with self.assertNumQueries(baseline):
+            response = client.get('/api/my-courses/')
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual([len(course['modules']) for course in response.data], [2] * 5)
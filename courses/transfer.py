@@ -0,0 +1,250 @@
+"""
+NDJSON export/import of a whole course tree (export_course / import_course commands).
+
+the file is one JSON object per line, level by level: a header, the course, then all its
+modules, lessons, lesson resources, questions and answers, each with its id in the source
+database and the source id of its parent. files (lesson resources, infographics) travel by
+reference: only their storage name is written, the target environment has to serve the same
+files. roles are linked by name.
+
+export streams every level with iterator(). import reads line by line, validates each row with
+clean_fields() and inserts it with bulk_create, batch_size rows at a time, all in one
+transaction. source ids are remapped through id maps of the parent levels still ahead in the
+file only (module ids are dropped once the lessons are in, and so on), so memory stays at one
+batch plus an int -> int map, whatever the size of the course.
+
+bulk_create skips the counter and search signals, so the course counters and search documents
+are rebuilt at the end; the catalog and content caches are bumped on commit by the course's
+own save.
+"""
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+
+from . import search
+from .counters import rebuild_counters
+from .rendering import render_lesson
+from .models import Answer, Course, Lesson, LessonResource, Module, Question, Role
+
+
+FORMAT = 'celve-course'
+FORMAT_VERSION = 1
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+
+# type -> (model, fields copied as they are, parent type)...the parent field has the parent type's name
+LEVELS = {
+    'course': (Course, ['title', 'slug', 'description', 'is_published', 'is_free', 'price'], None),
+    'module': (Module, ['title', 'description', 'order'], None),
+    'lesson': (Lesson, [
+        'title', 'slug', 'content_text', 'video_url', 'infographic', 'lesson_type',
+        'estimated_duration', 'has_quiz', 'is_published', 'order',
+    ], 'module'),
+    'resource': (LessonResource, ['file', 'description'], 'lesson'),
+    'question': (Question, ['text', 'allow_multiple_answers', 'order'], 'lesson'),
+    'answer': (Answer, ['text', 'is_correct', 'order'], 'question'),
+}
+ORDER = list(LEVELS)
+
+
+class CourseImportError(ValueError):
+    def __init__(self, line, message):
+        self.line = line
+        super().__init__(f"line {line}: {message}" if line else message)
+
+
+# export
+
+def _rows(course):
+    """(type, queryset of values) per level, in file order"""
+    lesson_order = ('lesson__module__order', 'lesson__order')
+    return [
+        ('module', Module.objects.filter(course=course).order_by('order', 'pk')),
+        ('lesson', Lesson.objects.filter(module__course=course).order_by('module__order', 'order', 'pk')),
+        ('resource', LessonResource.objects.filter(lesson__module__course=course).order_by(*lesson_order, 'pk')),
+        ('question', Question.objects.filter(lesson__module__course=course).order_by(*lesson_order, 'order', 'pk')),
+        ('answer', Answer.objects.filter(question__lesson__module__course=course).order_by(
+            *(f'question__{name}' for name in lesson_order), 'question__order', 'question_id', 'order', 'pk'
+        )),
+    ]
+
+
+def _line(record):
+    return json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def export_course(course, stream, chunk_size=EXPORT_CHUNK_SIZE):
+    """writes the course tree to a text stream. returns {type: rows written}"""
+    counts = dict.fromkeys(ORDER, 0)
+    stream.write(_line({'type': 'header', 'format': FORMAT, 'version': FORMAT_VERSION}))
+
+    _, fields, _ = LEVELS['course']
+    record = {'type': 'course', 'id': course.pk, **{name: getattr(course, name) for name in fields}}
+    record['roles'] = list(course.roles.order_by('name').values_list('name', flat=True))
+    stream.write(_line(record))
+    counts['course'] = 1
+
+    for kind, queryset in _rows(course):
+        _, fields, parent = LEVELS[kind]
+        columns = ['id', *([f'{parent}_id'] if parent else []), *fields]
+        for row in queryset.values(*columns).iterator(chunk_size=chunk_size):
+            if parent:
+                row[parent] = row.pop(f'{parent}_id')
+            stream.write(_line({'type': kind, **row}))
+            counts[kind] += 1
+    return counts
+
+
+# import
+
+class _Importer:
+    def __init__(self, slug=None, batch_size=IMPORT_BATCH_SIZE):
+        self.slug = slug
+        self.batch_size = batch_size
+        self.header = False
+        self.course = None
+        self.level = 0
+        self.pending = []
+        self.ids = {kind: {} for kind in ORDER if any(parent == kind for _, _, parent in LEVELS.values())}
+        self.has_correct = {}
+        self.unknown_roles = []
+        self.counts = dict.fromkeys(ORDER, 0)
+
+    def feed(self, line_no, line):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise CourseImportError(line_no, "not valid JSON.")
+        if not isinstance(record, dict):
+            raise CourseImportError(line_no, "expected a JSON object.")
+
+        kind = record.get('type')
+        if not self.header:
+            if kind != 'header' or record.get('format') != FORMAT:
+                raise CourseImportError(line_no, f"not a {FORMAT} file.")
+            if record.get('version') != FORMAT_VERSION:
+                raise CourseImportError(line_no, f"unsupported version {record.get('version')!r}.")
+            self.header = True
+            return
+        if kind not in LEVELS:
+            raise CourseImportError(line_no, f"unknown type {kind!r}.")
+
+        level = ORDER.index(kind)
+        if level < self.level or (kind == 'course') == (self.course is not None):
+            raise CourseImportError(line_no, f"unexpected {kind} row here, rows go level by level after one course.")
+        if level > self.level:
+            self._advance(level)
+
+        if kind == 'course':
+            self._create_course(line_no, record)
+        else:
+            self._add(line_no, kind, record)
+
+    def _build(self, line_no, kind, record):
+        model, fields, parent = LEVELS[kind]
+        obj = model()
+        for name in fields:
+            if name not in record:
+                continue
+            field = model._meta.get_field(name)
+            try:
+                setattr(obj, field.attname, field.to_python(record[name]))
+            except ValidationError as error:
+                raise CourseImportError(line_no, {name: error.messages})
+        try:
+            obj.clean_fields(exclude=[parent or 'course'])
+        except ValidationError as error:
+            raise CourseImportError(line_no, error.message_dict)
+        return obj
+
+    def _create_course(self, line_no, record):
+        course = self._build(line_no, 'course', record)
+        course.slug = self.slug or course.slug
+        if Course.objects.filter(slug=course.slug).exists():
+            raise CourseImportError(line_no, f"a course with the slug {course.slug!r} exists already.")
+        course.save()
+
+        names = record.get('roles') or []
+        roles = list(Role.objects.filter(name__in=names))
+        course.roles.set(roles)
+        found = {role.name for role in roles}
+        self.unknown_roles = [name for name in names if name not in found]
+        self.course = course
+        self.counts['course'] = 1
+
+    def _add(self, line_no, kind, record):
+        _, _, parent = LEVELS[kind]
+        obj = self._build(line_no, kind, record)
+        if parent is None:
+            obj.course = self.course
+        else:
+            parent_id = self.ids[parent].get(record.get(parent))
+            if parent_id is None:
+                raise CourseImportError(line_no, f"unknown {parent} {record.get(parent)!r}.")
+            setattr(obj, f'{parent}_id', parent_id)
+
+        if kind in self.ids and record.get('id') is None:
+            raise CourseImportError(line_no, f"a {kind} needs its id.")
+        if kind == 'lesson':
+            # bulk_create skips Lesson.save(), which renders the content
+            render_lesson(obj)
+        if kind == 'answer':
+            question = record['question']
+            self.has_correct[question] = self.has_correct.get(question, False) or obj.is_correct
+
+        self.pending.append((line_no, record.get('id'), obj))
+        if len(self.pending) >= self.batch_size:
+            self._flush(kind)
+
+    def _flush(self, kind):
+        if not self.pending:
+            return
+        model = LEVELS[kind][0]
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([obj for _, _, obj in self.pending])
+        except IntegrityError as error:
+            raise CourseImportError(
+                self.pending[0][0], f"{kind} rows up to line {self.pending[-1][0]} don't fit: {error}"
+            )
+        if kind in self.ids:
+            self.ids[kind].update((source_id, obj.pk) for _, source_id, obj in self.pending)
+        self.counts[kind] += len(self.pending)
+        self.pending = []
+
+    def _advance(self, level):
+        self._flush(ORDER[self.level])
+        self.level = level
+        # only the parents of the levels still ahead have to be remembered
+        needed = {LEVELS[kind][2] for kind in ORDER[level:]}
+        for kind, ids in self.ids.items():
+            if kind not in needed:
+                ids.clear()
+
+    def finish(self):
+        if self.course is None:
+            raise CourseImportError(None, "the file has no course.")
+        self._flush(ORDER[self.level])
+        wrong = [question for question, correct in self.has_correct.items() if not correct]
+        if wrong:
+            raise CourseImportError(None, f"question(s) {wrong[:10]} have answers but none of them is correct.")
+        rebuild_counters([self.course.pk])
+        search.reindex_course(self.course.pk)
+
+
+def import_course(lines, slug=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    creates a new course from an iterable of NDJSON lines (an open file), everything or nothing.
+    returns (course, {type: rows created}, [role names not found here])
+    """
+    importer = _Importer(slug, batch_size)
+    with transaction.atomic():
+        for line_no, line in enumerate(lines, 1):
+            importer.feed(line_no, line)
+        importer.finish()
+    return importer.course, importer.counts, importer.unknown_roles
@@ -7,7 +7,10 @@ urlpatterns = [
     path('courses/', views.CourseListView.as_view(), name='course-list'),
     path('my-courses/', views.UserEnrolledCoursesView.as_view(), name='my-courses'),
     path('courses/<int:pk>/', views.CourseDetailView.as_view(), name='course-detail'),
+    path('courses/<int:pk>/outline/', views.CourseOutlineView.as_view(), name='course-outline'),
     path('courses/<int:pk>/enroll/', views.CourseEnrollmentView.as_view(), name='course-enroll'),
+    path('courses/<int:pk>/enroll/bulk/', views.BulkEnrollmentView.as_view(), name='course-enroll-bulk'),
+    path('courses/<int:pk>/progress/export/', views.CourseProgressExportView.as_view(), name='course-progress-export'),
     path('courses/<int:course_id>/modules/', views.ModuleListView.as_view(), name='module-list'),
     path('modules/<int:pk>/', views.ModuleDetailView.as_view(), name='module-detail'),
     path('modules/<int:module_id>/lessons/', views.LessonListView.as_view(), name='lesson-list'),
@@ -15,5 +18,13 @@ urlpatterns = [
     path('lesson-progress/<int:pk>/', views.LessonProgressUpdateView.as_view(), name='lesson-progress-update'),
     path('lesson-progress/by-lesson/<int:lesson_id>/',views.LessonProgressByLessonView.as_view(),name='lesson-progress-by-lesson'),
     path('lesson-progress/submit/', views.LessonProgressSubmitView.as_view()),
+    path('quiz-attempts/', views.QuizAttemptListView.as_view(), name='quiz-attempts'),
+    path('analytics/items/', views.ItemAnalysisView.as_view(), name='item-analysis'),
+    path('analytics/courses/<int:pk>/funnel/', views.CourseFunnelView.as_view(), name='course-funnel'),
+    path('analytics/retention/', views.CohortRetentionView.as_view(), name='cohort-retention'),
+    path('analytics/platform/', views.PlatformStatsView.as_view(), name='platform-stats'),
     path("achievements/", views.AchievementView.as_view(), name="achievements"),
+    path("achievements/activity/", views.ActivityCalendarView.as_view(), name="activity-calendar"),
+    path("leaderboard/", views.LeaderboardView.as_view(), name="leaderboard"),
+    path('search/content/', views.ContentSearchView.as_view(), name='content-search'),
 ]
@@ -1,9 +1,12 @@
 from django.shortcuts import render,get_object_or_404
-from django.db.models import Count, Prefetch,OuterRef,Exists,Sum
+from django.http import Http404, HttpResponse
+from django.db.models import Count, Prefetch,OuterRef,Exists
+from django.utils.http import parse_etags
 from django.utils.timezone import localdate, timedelta
+from datetime import date
 
 from rest_framework import generics, permissions,status
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 
 
@@ -12,43 +15,88 @@ from rest_framework.response import Response
 
 
 from . import models, serializers
+from . import cache as course_cache
+from . import outline
+from . import analytics
+from . import attempts
+from . import cohorts
+from . import enrollment
+from . import exports
+from . import leaderboard
+from . import platform_stats
+from . import search
+from .progress import completed_lessons_by_module
+from .achievements import get_summary
+from .activity import activity_calendar, record_activity
 
 # Create your views here.
 
 class CourseListView(generics.ListAPIView):
-    """Lists all courses...also their module count and number of lessons"""
+    """Lists all courses...also their module count and number of lessons
+    the serialized catalog is cached per catalog version (and per ?role=<id>), so a hit runs no sql"""
 
     serializer_class=serializers.CourseListSerializer
     permission_classes=[permissions.IsAuthenticated]
 
+    def get_role_id(self):
+        role_id = self.request.query_params.get('role')
+        if not role_id:
+            return None
+        try:
+            return int(role_id)
+        except ValueError:
+            raise ValidationError({"role": "role must be an integer id."})
+
+    def list(self, request, *args, **kwargs):
+        role_id = self.get_role_id()
+        version, data = course_cache.get_catalog(role_id)
+        if data is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            data = list(self.get_serializer(queryset, many=True).data)
+            course_cache.set_catalog(role_id, version, data)
+        return Response(data)
+
     def get_queryset(self):
-        return (
-            models.Course.objects.filter(is_published=True)
-            .annotate(total_modules=Count('modules', distinct=True),total_lessons=Count('modules__lessons',distinct=True))
-            .select_related('created_by')
-            .prefetch_related('roles', Prefetch('modules',queryset=models.Module.objects.only('id','course','order')))
-            .order_by('created_at')
-           
-        )
+        queryset = models.Course.objects.filter(is_published=True)
+        role_id = self.get_role_id()
+        if role_id:
+            queryset = queryset.filter(roles=role_id)
+        return queryset.prefetch_related('roles').order_by('created_at')
     
 
 class CourseDetailView(generics.RetrieveAPIView):
-    """Retrieves a single sourse with a list of its module and also lesson counts"""
+    """Retrieves a single sourse with a list of its module and also lesson counts
+    the course/module part comes from the outline snapshot, only the user's completed lessons are queried"""
 
     serializer_class=serializers.CourseDetailSerializer
     permission_classes=[permissions.IsAuthenticated]
 
+    def retrieve(self, request, *args, **kwargs):
+        course_outline = outline.get_course_outline(kwargs['pk'])
+        if course_outline is None or not course_outline['data']['is_published']:
+            raise Http404
+        completed = completed_lessons_by_module(request.user, course_ids=[course_outline['data']['id']])
+        return Response(outline.course_detail(course_outline, completed))
+
+
+class CourseOutlineView(generics.GenericAPIView):
+    """the outline snapshot of a published course, with its content hash as ETag (answers 304 to If-None-Match)"""
+    permission_classes=[permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        course_outline = outline.get_course_outline(kwargs['pk'])
+        if course_outline is None or not course_outline['data']['is_published']:
+            raise Http404
+        etag = f'"{course_outline["hash"]}"'
+        # weak comparison like django.utils.cache: a list of tags, W/ prefixes ignored, * matches any
+        tags = parse_etags(request.headers.get('If-None-Match', ''))
+        if '*' in tags or etag in (tag.removeprefix('W/') for tag in tags):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(course_outline['data'])
+        response['ETag'] = etag
+        return response
 
-    def get_queryset(self):
-        return(
-            models.Course.objects.filter(is_published=True).select_related('created_by').prefetch_related(
-                'roles', Prefetch('modules', queryset=(
-                    models.Module.objects.annotate(lesson_count=Count('lessons')).order_by('order')
-                    .only('id','course_id','title','order')
-                ))
-            )
-        )
-    
 
 
 class CourseEnrollmentView(generics.CreateAPIView):
@@ -77,18 +125,41 @@ class CourseEnrollmentView(generics.CreateAPIView):
         )
 
 
+class BulkEnrollmentView(generics.GenericAPIView):
+    """
+    staff only. enrolls {"user_ids": [...], "emails": [...]} or {"role": <id>} in the course and
+    reports how many were newly enrolled, enrolled already or not found
+    """
+    serializer_class = serializers.BulkEnrollmentSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, pk, *args, **kwargs):
+        course = get_object_or_404(models.Course, pk=pk)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = enrollment.enroll_users(course, **serializer.validated_data)
+        return Response({'course_id': course.id, **report})
+
+
 
 class ModuleListView(generics.ListAPIView):
     """listing modules within a oarticular course"""
     serializer_class=serializers.ModuleListSerializer
     permission_classes=[permissions.IsAuthenticated]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request is not None and self.request.user.is_authenticated:
+            context['completed_lessons'] = completed_lessons_by_module(
+                self.request.user, course_ids=[self.kwargs.get('course_id')]
+            )
+        return context
+
     def get_queryset(self):
         course_id=self.kwargs.get('course_id')
         return (
-            models.Module.objects.filter(course_id=course_id).select_related('course')
-            .annotate(lesson_count=Count('lessons',distinct=True))
-            .only('id','title','order','course_id').order_by('order')
+            models.Module.objects.filter(course_id=course_id)
+            .only('id','title','description','order','course_id','lesson_count').order_by('order')
         )
 
 
@@ -98,15 +169,13 @@ class ModuleDetailView(generics.RetrieveAPIView):
     serializer_class=serializers.ModuleDetailSerializer
     permission_classes=[permissions.IsAuthenticated]
 
-    def get_queryset(self):
-        return (
-            models.Module.objects.select_related('course', 'badge')
-            .prefetch_related(Prefetch('lessons', queryset=(
-                models.Lesson.objects.annotate(questions_count=Count('questions', distinct=True))
-                .only('id','title','order','module_id')
-                .order_by('order')
-            )))
-        )
+    def retrieve(self, request, *args, **kwargs):
+        course_id = models.Module.objects.filter(pk=kwargs['pk']).values_list('course_id', flat=True).first()
+        course_outline = outline.get_course_outline(course_id) if course_id is not None else None
+        module = outline.find_module(course_outline, int(kwargs['pk'])) if course_outline else None
+        if module is None:
+            raise Http404
+        return Response(outline.module_detail(module, request))
     
 
 
@@ -154,22 +223,18 @@ class LessonDetailView(generics.RetrieveAPIView):
             user=user, lesson=lesson, completed=True
         ).exists()
 
-        # If not completed, enforce prerequisite: previous lesson must be completed
+        # If not completed, enforce prerequisite: previous lesson (same module) must be completed
         if not completed:
-            previous_lessons = (
-                models.Lesson.objects
-                .filter(module=lesson.module, order__lt=lesson.order)
-                .order_by('-order')
-            )
-            if previous_lessons.exists():
-                last_prev = previous_lessons.first()
+            previous_id = lesson.get_previous_lesson_id()
+            if previous_id is not None:
                 prev_completed = models.LessonProgress.objects.filter(
-                    user=user, lesson=last_prev, completed=True
+                    user=user, lesson_id=previous_id, completed=True
                 ).exists()
                 if not prev_completed:
                     raise PermissionDenied("You must complete the previous lesson before accessing this one.")
 
         # If completed or previous completed -> allow
+        record_activity(user, 'view_lesson', lesson)
         return lesson
     
     def get_queryset(self):
@@ -192,8 +257,19 @@ class UserEnrolledCoursesView(generics.ListAPIView):
     def get_queryset(self):
         user = self.request.user
         return models.CourseEnrollment.objects.filter(user=user, active=True)\
-            .select_related('course')\
-            .prefetch_related('course__modules__lessons')
+            .select_related('course').only('id', 'course_id', 'course__title', 'enrolled_at', 'active')
+
+    def list(self, request, *args, **kwargs):
+        enrollments = list(self.get_queryset())
+        outlines = outline.get_course_outlines([enrollment.course_id for enrollment in enrollments])
+        completed = completed_lessons_by_module(request.user, course_ids=list(outlines))
+        modules = {
+            course_id: [outline.module_entry(module, completed) for module in course_outline['data']['modules']]
+            if course_outline else []
+            for course_id, course_outline in outlines.items()
+        }
+        serializer = self.get_serializer(enrollments, many=True, context={**self.get_serializer_context(), 'modules': modules})
+        return Response(serializer.data)
     
 
 
@@ -224,6 +300,8 @@ class LessonProgressByLessonView(generics.RetrieveAPIView):
             user=self.request.user,
             lesson_id=lesson_id
         )
+        record_activity(self.request.user, 'start_quiz', lesson_id)
+        attempts.mark_quiz_started(self.request.user.id, lesson_id)
         return progress
 
 class LessonProgressUpdateView(generics.UpdateAPIView):
@@ -236,7 +314,7 @@ class LessonProgressUpdateView(generics.UpdateAPIView):
 
         if lesson_progress_id and lesson_progress_id != "null":
             # Try fetching by ID
-            return models.LessonProgress.objects.get(
+            return models.LessonProgress.objects.select_related('lesson__module').get(
                 id=lesson_progress_id,
                 user=self.request.user
             )
@@ -258,16 +336,11 @@ class LessonProgressUpdateView(generics.UpdateAPIView):
         progress = serializer.instance
         user = self.request.user
 
-        # Check if previous lesson is completed
-        previous_lessons = (
-            models.Lesson.objects
-            .filter(module=progress.lesson.module, order__lt=progress.lesson.order)
-            .order_by('-order')
-        )
-        if previous_lessons.exists():
-            last_prev = previous_lessons.first()
+        # Check if previous lesson (same module) is completed
+        previous_id = progress.lesson.get_previous_lesson_id()
+        if previous_id is not None:
             prev_completed = models.LessonProgress.objects.filter(
-                user=user, lesson=last_prev, completed=True
+                user=user, lesson_id=previous_id, completed=True
             ).exists()
             if not prev_completed:
                 raise PermissionDenied("You must complete the previous lesson first.")
@@ -285,78 +358,226 @@ class AchievementView(generics.GenericAPIView):
 
     def get(self, request, *args, **kwargs):
         user = request.user
+        summary = get_summary(user.id)
 
-        total_points = models.LessonProgress.objects.filter(
-            user=user
-        ).aggregate(points=Sum("points_awarded"))["points"] or 0
+        # AchievementSerializer serializes these itself (BadgeSerializer / CertificateSerializer)
+        badges = [
+            user_badge.badge
+            for user_badge in models.UserBadge.objects.filter(user=user).select_related("badge")
+        ]
+        certificates = list(models.Certificate.objects.filter(user=user))
 
-      
-        user_badges = models.UserBadge.objects.filter(user=user).select_related("badge")
-        badges_data = serializers.UserBadgeSerializer(user_badges, many=True).data
-      
+        # kept up to date from the DailyActivity rollup (activity.py)
+        streak_days = summary.streak_on(localdate())
 
+        # per-course module completion lives on CourseProgress.modules_completed (rollup.py)
+        data = {
+            "total_points": summary.total_points,
+            "badges_count": len(badges),
+            "badges": badges,
+            "certificates_count": len(certificates),
+            "certificates": certificates,
+            "lessons_completed": summary.lessons_completed,
+            "modules_completed": summary.modules_completed,
+            "courses_enrolled": summary.courses_enrolled,
+            "streak_days": streak_days,
+        }
 
-        certificates = models.Certificate.objects.filter(user=user).select_related("course")
-        certificates_data = serializers.CertificateSerializer(certificates, many=True).data
+        serializer = self.get_serializer(data)
+        return Response(serializer.data)
 
 
-        lessons_completed = models.LessonProgress.objects.filter(
-            user=user, completed=True
-        ).count()
+class ActivityCalendarView(generics.GenericAPIView):
+    """per-day activity counts for a calendar heatmap, ?start=YYYY-MM-DD&end=YYYY-MM-DD (default: the last year)"""
+    permission_classes = [permissions.IsAuthenticated]
 
+    def _date_param(self, name, default):
+        value = self.request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: "Use the YYYY-MM-DD format."})
 
-        modules_completed = models.ModuleProgress.objects.filter(
-            user=user, completed=True
-        ).count()
+    def get(self, request, *args, **kwargs):
+        end = self._date_param('end', localdate())
+        start = self._date_param('start', end - timedelta(days=364))
+        if start > end:
+            raise ValidationError({'start': "start must not be after end."})
+
+        return Response({
+            'start': start,
+            'end': end,
+            'days': activity_calendar(request.user.id, start, end),
+        })
+
+
+def _int_param(request, name, default=None):
+    value = request.query_params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer."})
+
+
+class LeaderboardView(generics.GenericAPIView):
+    """
+    ?scope=global|course|county (with ?course=<id>, or ?county=<id> to look at another county
+    than your own), paged with ?limit= and ?offset=. 'me' is the caller's own rank on the board
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
-      
+    def get_scope(self):
+        scope = self.request.query_params.get('scope', 'global')
+        if scope == 'global':
+            return models.LeaderboardEntry.GLOBAL
+        if scope == 'course':
+            course_id = _int_param(self.request, 'course')
+            if course_id is None:
+                raise ValidationError({'course': "Required for the course leaderboard."})
+            return models.LeaderboardEntry.course_scope(course_id)
+        if scope == 'county':
+            county_id = _int_param(self.request, 'county', self.request.user.county_id)
+            if county_id is None:
+                raise ValidationError({'county': "Set a county on your profile or pass one."})
+            return models.LeaderboardEntry.county_scope(county_id)
+        raise ValidationError({'scope': "Use global, course or county."})
 
-        courses_enrolled = models.CourseEnrollment.objects.filter(
-            user=user, active=True
-        ).count()
+    def get(self, request, *args, **kwargs):
+        scope = self.get_scope()
+        limit = min(max(_int_param(self.request, 'limit', leaderboard.PAGE_SIZE), 1), leaderboard.MAX_PAGE_SIZE)
+        offset = max(_int_param(self.request, 'offset', 0), 0)
 
- 
-        days = models.LearningActivity.objects.filter(
-            user=user
-        ).values_list("timestamp", flat=True)
+        return Response({
+            'scope': scope,
+            'results': leaderboard.top(scope, limit, offset),
+            'me': leaderboard.user_rank(scope, request.user.id),
+        })
 
-        active_days = {ts.date() for ts in days}
-     
-        streak_days = 0
-        if active_days:
-            today = localdate()
-            while today in active_days:
-                streak_days += 1
-                today -= timedelta(days=1)
 
-        courses_data = []
-        enrollments = models.CourseEnrollment.objects.filter(user=user, active=True).select_related("course")
+class QuizAttemptListView(generics.ListAPIView):
+    """the caller's last attempts, newest first. ?lesson=<id> for one lesson, ?limit= (default 10)"""
+    serializer_class = serializers.QuizAttemptSerializer
+    permission_classes = [permissions.IsAuthenticated]
 
-        for enrollment in enrollments:
-            course = enrollment.course
-            total_modules = course.modules.count()  
-            completed_modules = models.ModuleProgress.objects.filter(
-                user=user, module__course=course, completed=True
-            ).count()
+    def get_queryset(self):
+        limit = _int_param(self.request, 'limit', attempts.RECENT_ATTEMPTS)
+        limit = min(max(limit, 1), attempts.MAX_RECENT_ATTEMPTS)
+        return attempts.recent_attempts(self.request.user.id, _int_param(self.request, 'lesson'), limit)
 
-            courses_data.append({
-                "course_name": course.title,
-                "modules_total": total_modules,
-                "modules_completed": completed_modules,
-            })
 
+class ItemAnalysisView(generics.GenericAPIView):
+    """
+    staff only. question/answer statistics over the stored quiz attempts of ?lesson=, ?module=
+    or ?course=. ?output=csv returns one row per answer instead of json
+    """
+    permission_classes = [permissions.IsAdminUser]
 
-        data = {
-            "total_points": total_points,
-            "badges_count": user_badges.count(),
-            "badges": badges_data,
-            "certificates_count": certificates.count(),
-            "certificates": certificates_data,
-            "lessons_completed": lessons_completed,
-            "modules_completed": modules_completed,
-            "courses_enrolled": courses_enrolled,
-            "streak_days": streak_days,
+    def get(self, request, *args, **kwargs):
+        scope = {
+            f'{name}_id': _int_param(request, name) for name in ('lesson', 'module', 'course')
         }
+        if not any(value is not None for value in scope.values()):
+            raise ValidationError({'detail': "Pass a lesson, module or course id."})
+        analysis = analytics.item_analysis(**scope)
+
+        if request.query_params.get('output') == 'csv':
+            response = HttpResponse(content_type='text/csv')
+            name = '-'.join(f'{key[:-3]}-{value}' for key, value in scope.items() if value is not None)
+            response['Content-Disposition'] = f'attachment; filename="item-analysis-{name}.csv"'
+            analytics.write_item_analysis_csv(analysis, response)
+            return response
+        return Response(analysis)
+
+
+def _snapshot_response(snapshot, **payload):
+    data = {key: value for key, value in snapshot['data'].items() if key != 'state'}
+    return Response({**data, **payload, 'computed_at': snapshot['computed_at']})
+
+
+class CourseFunnelView(generics.GenericAPIView):
+    """staff only. drop-off funnel of a course, ?refresh=1 recomputes it from scratch"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk, *args, **kwargs):
+        get_object_or_404(models.Course, pk=pk)
+        snapshot = cohorts.get_funnel(pk, refresh=request.query_params.get('refresh') == '1')
+        return _snapshot_response(snapshot)
+
+
+class CohortRetentionView(generics.GenericAPIView):
+    """
+    staff only. weekly cohort retention of the platform, or of ?course=<id>.
+    ?refresh=1 recomputes it from scratch
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        course_id = _int_param(request, 'course')
+        if course_id is not None:
+            get_object_or_404(models.Course, pk=course_id)
+        snapshot = cohorts.get_retention(course_id, refresh=request.query_params.get('refresh') == '1')
+        return _snapshot_response(snapshot)
+
+
+
+class PlatformStatsView(generics.GenericAPIView):
+    """staff only. platform wide numbers per day for the last ?days= days (default 90), oldest first"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        days = min(max(_int_param(request, 'days', platform_stats.DASHBOARD_DAYS), 1), platform_stats.MAX_DAYS)
+        rows = platform_stats.recent(days)
+        return Response({
+            'days': [platform_stats.as_dict(stats) for stats in rows],
+            'totals': platform_stats.totals(rows),
+        })
+
+
+
+class CourseProgressExportView(generics.GenericAPIView):
+    """
+    staff only. every learner's lesson progress in the course as a streamed download,
+    ?output=csv (default) or ?output=ndjson
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, pk, *args, **kwargs):
+        course = get_object_or_404(models.Course, pk=pk)
+        output = request.query_params.get('output', 'csv')
+        if output not in exports.OUTPUT_FORMATS:
+            raise ValidationError({'output': f"Use one of: {', '.join(exports.OUTPUT_FORMATS)}."})
+        return exports.progress_response(output, f'progress-{course.slug}', course_id=course.pk)
+
+
+
+class ContentSearchView(generics.GenericAPIView):
+    """
+    full-text search over published courses, lessons, lesson resources and articles, best
+    matches first. ?q= (every word must match), ?type=course,lesson,resource,article to narrow
+    it down, paged with ?limit= and ?offset=. snippets mark the matches with <mark>
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': "Enter something to search for."})
+        kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+        unknown = set(kinds) - set(search.KINDS)
+        if unknown:
+            raise ValidationError({'type': f"Use any of: {', '.join(search.KINDS)}."})
+        limit = min(max(_int_param(request, 'limit', search.PAGE_SIZE), 1), search.MAX_PAGE_SIZE)
+        offset = max(_int_param(request, 'offset', 0), 0)
+
+        total, results = search.search(query, kinds, limit, offset)
+        return Response({
+            'count': total,
+            'limit': limit,
+            'offset': offset,
+            'results': results,
+        })
 
-        serializer = self.get_serializer(data)
-        return Response(serializer.data)
@@ -14,6 +14,7 @@ from pathlib import Path
 from datetime import timedelta
 from dotenv import load_dotenv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -79,7 +80,7 @@ ROOT_URLCONF = "djbackend.urls"
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
-        "DIRS": [],
+        "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
             "context_processors": [
@@ -103,6 +104,25 @@ DATABASES = {
     )
 }
 
+# Cache
+# the course caches (courses/cache.py) are invalidated by bumping version keys, so every worker
+# process has to see the same cache. CACHE_URL is redis://host:6379/0, db (the django_cache table,
+# made by createcachetable...every hit is a sql query, only for small deployments) or locmem (this
+# process only, for local development and tests). there's no default outside DEBUG
+CACHE_URL = os.environ.get("CACHE_URL", "locmem" if DEBUG else None)
+
+if CACHE_URL is None:
+    raise ImproperlyConfigured("CACHE_URL must be set when DEBUG is off, e.g. redis://host:6379/0")
+
+if CACHE_URL.startswith(("redis://", "rediss://", "unix://")):
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}}
+elif CACHE_URL == "db":
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "django_cache"}}
+elif CACHE_URL == "locmem":
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+else:
+    raise ImproperlyConfigured(f"CACHE_URL {CACHE_URL!r} is not redis://..., db or locmem")
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -195,6 +215,28 @@ SIMPLE_JWT.update({
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'  
 
+# learning activity events are buffered per worker and written in batches (courses/activity.py)
+ACTIVITY_BUFFER_SIZE = int(os.environ.get("ACTIVITY_BUFFER_SIZE", 200))
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get("ACTIVITY_FLUSH_INTERVAL", 5))
+# months of raw events kept in the database, older ones go to gzipped NDJSON files
+ACTIVITY_RETENTION_MONTHS = int(os.environ.get("ACTIVITY_RETENTION_MONTHS", 12))
+ACTIVITY_ARCHIVE_DIR = os.environ.get("ACTIVITY_ARCHIVE_DIR", BASE_DIR / 'archive' / 'learning_activity')
+
+# staff analytics snapshots older than this (seconds) are brought up to date on read (courses/cohorts.py)
+ANALYTICS_MAX_AGE = int(os.environ.get("ANALYTICS_MAX_AGE", 15 * 60))
+
+# text search configuration of the PostgreSQL content search (courses/search.py)
+SEARCH_CONFIG = os.environ.get("SEARCH_CONFIG", "english")
+
+# resized WebP/JPEG copies of uploaded images (core/images.py): 'app_label.Model' -> {image field: widths}
+IMAGE_VARIANT_FIELDS = {
+    'core.User': {'profile_picture': (96, 192, 384)},
+    'courses.Lesson': {'infographic': (480, 960, 1600)},
+    'courses.Badge': {'icon': (64, 128, 256)},
+}
+# threads per process making the variants after an upload, 0 makes them in the request
+IMAGE_VARIANT_WORKERS = int(os.environ.get("IMAGE_VARIANT_WORKERS", 2))
+
 
 
 JAZZMIN_SETTINGS = {